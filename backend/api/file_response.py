@@ -0,0 +1,182 @@
+"""Datei-Auslieferung mit HTTP-Range, ETag/Last-Modified und bedingten Anfragen
+
+Für große Archive auf mobilen Verbindungen: abgebrochene Downloads lassen sich mit
+``Range``/``If-Range`` fortsetzen. Öffnen, ``fstat`` und das blockweise Lesen
+(``os.pread``) laufen im Threadpool, nicht im Event-Loop. Die ASGI-Erweiterung
+``http.response.zerocopysend`` (sendfile) bietet uvicorn nicht an und wird daher
+nicht verwendet.
+"""
+import os
+import re
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from typing import BinaryIO, Mapping, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def make_etag(stat_result: os.stat_result) -> str:
+    """Starkes ETag aus Inode, Größe und Änderungszeit (ohne den Inhalt zu lesen)"""
+    return f'"{stat_result.st_ino:x}-{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def _etag_matches(header: str, etag: str, weak: bool) -> bool:
+    if header.strip() == '*':
+        return True
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if weak and candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def _not_modified_since(header: str, mtime: float) -> Optional[bool]:
+    """True, wenn die Datei seit dem Datum im Header nicht geändert wurde (None bei ungültigem Datum)"""
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return int(mtime) <= since
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Einzelnen Byte-Bereich als (Start, Ende inklusive) auswerten
+
+    None bedeutet: ganze Datei ausliefern (kein oder nicht unterstützter Header,
+    z.B. mehrere Bereiche). ``ValueError`` bei einem nicht erfüllbaren Bereich.
+    """
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix-Bereich: die letzten N Bytes
+        length = int(end)
+        if length == 0 or size == 0:
+            raise ValueError('Bereich nicht erfüllbar')
+        return max(0, size - length), size - 1
+    first = int(start)
+    last = min(int(end), size - 1) if end else size - 1
+    if first >= size or first > last:
+        raise ValueError('Bereich nicht erfüllbar')
+    return first, last
+
+
+class RangeFileResponse(Response):
+    chunk_size = 256 * 1024
+
+    def __init__(self, path: str, request: Request, filename: Optional[str] = None,
+                 media_type: str = 'application/octet-stream', headers: Optional[Mapping[str, str]] = None):
+        self.path = path
+        self.request = request
+        self.filename = filename
+        self.media_type = media_type
+        self.background = None
+        self.status_code = 200
+        self.init_headers(headers)
+
+    def _prepare(self, stat_result: os.stat_result) -> Optional[Tuple[int, int]]:
+        """Setzt Status und Header; gibt den zu sendenden Bereich zurück (None: kein Inhalt)"""
+        size = stat_result.st_size
+        etag = make_etag(stat_result)
+        request_headers = self.request.headers
+        self.headers['etag'] = etag
+        self.headers['last-modified'] = formatdate(stat_result.st_mtime, usegmt=True)
+        self.headers['accept-ranges'] = 'bytes'
+        self.headers.setdefault('cache-control', 'private, no-cache')
+        if self.filename:
+            quoted = quote(self.filename)
+            if quoted != self.filename:
+                self.headers['content-disposition'] = f"attachment; filename*=utf-8''{quoted}"
+            else:
+                self.headers['content-disposition'] = f'attachment; filename="{self.filename}"'
+
+        # Vorbedingungen nach RFC 9110, Abschnitt 13.2.2
+        if 'if-match' in request_headers:
+            if not _etag_matches(request_headers['if-match'], etag, weak=False):
+                return self._empty(412)
+        elif 'if-unmodified-since' in request_headers:
+            if _not_modified_since(request_headers['if-unmodified-since'], stat_result.st_mtime) is False:
+                return self._empty(412)
+
+        if 'if-none-match' in request_headers:
+            if _etag_matches(request_headers['if-none-match'], etag, weak=True):
+                return self._empty(304)
+        elif 'if-modified-since' in request_headers:
+            if _not_modified_since(request_headers['if-modified-since'], stat_result.st_mtime):
+                return self._empty(304)
+
+        byte_range = None
+        range_header = request_headers.get('range')
+        if_range = request_headers.get('if-range')
+        # If-Range: Bereich nur, wenn die Datei noch dieselbe ist, sonst vollständig neu senden
+        if range_header and (if_range is None or if_range.strip() == etag
+                             or (not if_range.strip().startswith(('"', 'W/'))
+                                 and _not_modified_since(if_range, stat_result.st_mtime))):
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError:
+                self.headers['content-range'] = f'bytes */{size}'
+                return self._empty(416)
+
+        if byte_range is None:
+            self.status_code = 200
+            byte_range = (0, size - 1)
+        else:
+            self.status_code = 206
+            self.headers['content-range'] = f'bytes {byte_range[0]}-{byte_range[1]}/{size}'
+        self.headers['content-length'] = str(byte_range[1] - byte_range[0] + 1)
+        self.headers['content-type'] = self.media_type
+        return byte_range
+
+    def _empty(self, status_code: int) -> None:
+        self.status_code = status_code
+        self.headers['content-length'] = '0'
+        return None
+
+    @staticmethod
+    def _open(path: str) -> Tuple[BinaryIO, os.stat_result]:
+        """Öffnet die Datei und liest ihre Metadaten (blockiert, läuft im Threadpool)"""
+        file = open(path, 'rb')
+        try:
+            stat_result = os.fstat(file.fileno())
+            if not stat.S_ISREG(stat_result.st_mode):
+                raise RuntimeError(f'{path} ist keine Datei')
+        except BaseException:
+            file.close()
+            raise
+        return file, stat_result
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        file, stat_result = await anyio.to_thread.run_sync(self._open, self.path)
+        with file:
+            byte_range = self._prepare(stat_result)
+            await send({'type': 'http.response.start', 'status': self.status_code, 'headers': self.raw_headers})
+            if byte_range is None or scope.get('method') == 'HEAD' or byte_range[1] < byte_range[0]:
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+                return
+
+            offset, remaining = byte_range[0], byte_range[1] - byte_range[0] + 1
+            fd = file.fileno()
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(os.pread, fd, min(self.chunk_size, remaining), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': remaining > 0})
+            if remaining > 0:
+                # Datei wurde während der Übertragung gekürzt
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
@@ -0,0 +1,146 @@
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from backend.auth import get_current_mandant
+from backend.services.ai_classification import AIClassificationService
+from backend.services.analysis_cache import AnalysisCache
+from backend.services.jobs import Job, JobManager
+from backend.services.search_index import SearchIndexService
+
+# Gleichzeitige Klassifikationen: insgesamt und je Mandant (jeder Auftrag startet einen eigenen Prozess-Pool)
+CLASSIFICATION_MAX_WORKERS = 2
+CLASSIFICATION_MAX_PER_MANDANT = 1
+
+router = APIRouter()
+classification_service = AIClassificationService()
+search_index = SearchIndexService(extractor=classification_service)
+job_manager = JobManager(max_workers=CLASSIFICATION_MAX_WORKERS, max_per_mandant=CLASSIFICATION_MAX_PER_MANDANT)
+
+DATA_DIR = '/tmp/bestnote_data'
+
+
+# Pydantic-Modelle für API
+class ClassificationJobResponse(BaseModel):
+    job_id: str
+    status: str
+    total: int
+
+
+def _resolve_stored_file(mandant_id: int, file_id: str) -> str:
+    """Löst eine Datei-ID (relativer Pfad im Mandanten-Verzeichnis) sicher auf"""
+    mandant_dir = os.path.realpath(os.path.join(DATA_DIR, f'mandant_{mandant_id}'))
+    file_path = os.path.realpath(os.path.join(mandant_dir, file_id))
+    if not file_path.startswith(mandant_dir + os.sep):
+        raise HTTPException(status_code=400, detail=f"Ungültige Datei-ID: {file_id}")
+    if not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail=f"Datei nicht gefunden: {file_id}")
+    return file_path
+
+
+def _save_uploads(files: List[UploadFile], upload_dir: str) -> Dict[str, str]:
+    """Speichert hochgeladene PDFs (läuft im Threadpool, nicht im Event-Loop)"""
+    paths = {}
+    for index, upload in enumerate(files):
+        name = os.path.basename(upload.filename or f'upload_{index}.pdf')
+        path = os.path.join(upload_dir, f'{index}_{name}')
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(upload.file, f, 1024 * 1024)
+        paths[path] = name
+    return paths
+
+
+def _run_classification(job: Job, paths: Dict[str, str], upload_dir: Optional[str]):
+    """Klassifiziert die Dateien und meldet jedes Ergebnis als Fortschritt
+
+    Gespeicherte Dateien werden dabei im Suchindex des Mandanten aktualisiert.
+    """
+    try:
+        # Noch nicht (aktuell) indizierte gespeicherte Dateien: Text gleich aus der Analyse übernehmen
+        hashes = {}
+        for pdf_path, file_id in paths.items():
+            if upload_dir and pdf_path.startswith(upload_dir):
+                continue
+            try:
+                content_hash = AnalysisCache.hash_file(pdf_path)
+            except OSError:
+                continue
+            if not search_index.is_indexed(job.mandant_id, file_id, content_hash):
+                hashes[pdf_path] = content_hash
+
+        for result in classification_service.iter_batch_analyze(list(paths), include_text=hashes):
+            pdf_path = result['file_path']
+            content = result.pop('text', None)
+            result['file_path'] = paths.get(pdf_path, pdf_path)
+            if 'error' not in result and not (upload_dir and pdf_path.startswith(upload_dir)):
+                try:
+                    search_index.index_pdf(job.mandant_id, result['file_path'], pdf_path,
+                                           result.get('title'), result.get('composer'),
+                                           content=content, content_hash=hashes.get(pdf_path))
+                except Exception:
+                    pass
+            job.advance(result)
+    finally:
+        if upload_dir:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+@router.post("/jobs", response_model=ClassificationJobResponse, status_code=202)
+async def create_classification_job(
+    files: List[UploadFile] = File(None),
+    file_ids: List[str] = Form(None),
+    current_mandant: int = Depends(get_current_mandant)
+):
+    """Klassifikations-Auftrag für hochgeladene PDFs und/oder gespeicherte Dateien anlegen"""
+    if not files and not file_ids:
+        raise HTTPException(status_code=400, detail="Keine Dateien angegeben")
+
+    paths = {_resolve_stored_file(current_mandant, file_id): file_id for file_id in file_ids or []}
+    upload_dir = None
+    if files:
+        upload_dir = tempfile.mkdtemp(prefix=f'bestnote_classify_{current_mandant}_')
+        try:
+            paths.update(await run_in_threadpool(_save_uploads, files, upload_dir))
+        except Exception as e:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            raise HTTPException(status_code=500, detail=f"Upload-Fehler: {str(e)}")
+
+    job = job_manager.submit(
+        current_mandant, 'classification',
+        lambda job: _run_classification(job, paths, upload_dir),
+        total=len(paths)
+    )
+    return {'job_id': job.id, 'status': job.status, 'total': job.total}
+
+
+def _get_job(job_id: str, mandant_id: int) -> Job:
+    job = job_manager.get(job_id, mandant_id)
+    if job is None or job.kind != 'classification':
+        raise HTTPException(status_code=404, detail="Auftrag nicht gefunden")
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def get_classification_job(job_id: str, current_mandant: int = Depends(get_current_mandant)):
+    """Status und bisherige Ergebnisse eines Auftrags abrufen"""
+    return _get_job(job_id, current_mandant).to_dict()
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_classification_job(job_id: str, current_mandant: int = Depends(get_current_mandant)):
+    """Fortschritt eines Auftrags als Server-Sent Events"""
+    job = _get_job(job_id, current_mandant)
+
+    async def event_stream():
+        async for event in job.events():
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -6,8 +6,13 @@ from pydantic import BaseModel
 import csv
 from fastapi.responses import StreamingResponse
 from io import StringIO
+from backend.services.file_catalog import FileCatalog
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+file_catalog = FileCatalog()
+
+# Speicherkontingent je Mandant
+STORAGE_QUOTA_BYTES = 10 * 1024 ** 3
 
 # Mock-Daten für Demo-Zwecke
 mock_dashboard_data = {
@@ -121,23 +126,29 @@ async def get_recent_activity(mandant_id: int) -> List[Dict[str, Any]]:
 
     return activities
 
+def _format_bytes(size: int) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} GB'
+
 @router.get("/{mandant_id}/storage-stats")
-async def get_storage_stats(mandant_id: int) -> Dict[str, Any]:
-    """Gibt Speicherstatistiken zurück"""
+def get_storage_stats(mandant_id: int) -> Dict[str, Any]:
+    """Gibt Speicherstatistiken aus dem Dateikatalog zurück"""
+    stats = file_catalog.stats(mandant_id)
+    files_by_type = {'PDF': 0, 'MIDI': 0, 'XML': 0, 'Other': 0}
+    for file_type, count in stats['files_by_type'].items():
+        label = {'pdf': 'PDF', 'mid': 'MIDI', 'midi': 'MIDI', 'xml': 'XML', 'musicxml': 'XML'}.get(file_type, 'Other')
+        files_by_type[label] += count
     return {
-        'total_used': '2.4 GB',
-        'total_available': '10 GB',
-        'usage_percentage': 24,
-        'files_by_type': {
-            'PDF': 145,
-            'MIDI': 23,
-            'XML': 12,
-            'Other': 8
-        },
+        'total_used': _format_bytes(stats['total_size']),
+        'total_available': _format_bytes(STORAGE_QUOTA_BYTES),
+        'usage_percentage': round(100 * stats['total_size'] / STORAGE_QUOTA_BYTES),
+        'files_by_type': files_by_type,
         'largest_files': [
-            {'name': 'Beethoven_Symphonie_9.pdf', 'size': '45 MB'},
-            {'name': 'Wagner_Ring_Zyklus.zip', 'size': '120 MB'},
-            {'name': 'Bach_Kantaten_Sammlung.pdf', 'size': '78 MB'}
+            {'name': entry['path'], 'size': _format_bytes(entry['size'])}
+            for entry in stats['largest_files']
         ]
     }
 
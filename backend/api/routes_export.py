@@ -1,22 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import Dict, List, Optional
+import os
+import re
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from typing import Dict, Iterator, List, Optional
 from pydantic import BaseModel
+from backend.api.file_response import RangeFileResponse
 from backend.auth import get_current_mandant
+from backend.services.backup import BackupService
 from backend.services.export import ExportService
+from backend.services.jobs import Job, JobManager
+from backend.services.part_booklets import GROUP_BY
+
+# Gleichzeitige Exporte: insgesamt und je Mandant
+EXPORT_MAX_WORKERS = 2
+EXPORT_MAX_PER_MANDANT = 1
+
+# Archivnamen enthalten den besitzenden Mandanten
+ARCHIVE_FILENAME = re.compile(r'(export|backup)_mandant_(\d+)_[\w.-]+\.zip')
 
 router = APIRouter()
 export_service = ExportService()
+backup_service = BackupService()
+job_manager = JobManager(max_workers=EXPORT_MAX_WORKERS, max_per_mandant=EXPORT_MAX_PER_MANDANT)
 
 # Pydantic-Modelle für API
 class ExportRequest(BaseModel):
     layout: str = 'standard'
     include_pdfs: bool = True
     include_metadata: bool = True
+    streaming: bool = False
+    since_export: Optional[str] = None
+
+class ProgramPart(BaseModel):
+    name: str
+    file_path: str
+
+class ProgramPiece(BaseModel):
+    title: str
+    directory: Optional[str] = None
+    parts: List[ProgramPart] = []
+
+class BookletRequest(BaseModel):
+    program: List[ProgramPiece]
+    group_by: str = 'part'
 
 class ExportResponse(BaseModel):
     export_id: str
+    job_id: Optional[str] = None
     filename: str
-    download_url: str
+    # Bei Hintergrund-Aufträgen erst im Ergebnis des fertigen Auftrags (ein Cache-Treffer liefert ein anderes Archiv)
+    download_url: Optional[str] = None
     status: str
 
 class LayoutInfo(BaseModel):
@@ -25,10 +59,66 @@ class LayoutInfo(BaseModel):
 
 class ExportHistoryItem(BaseModel):
     id: int
+    export_id: str
     date: str
     layout: str
+    since_export: Optional[str] = None
     file_size: str
+    size_bytes: Optional[int] = None
+    duration_seconds: float
     status: str
+    error: Optional[str] = None
+
+def _run_export(job: Job, mandant_id: int, request: ExportRequest, filename: str) -> Dict[str, object]:
+    """Erstellt den Export im Worker-Thread und meldet den Fortschritt je PDF"""
+    zip_path = export_service.create_export_zip(
+        mandant_id=mandant_id,
+        layout=request.layout,
+        include_pdfs=request.include_pdfs,
+        include_metadata=request.include_metadata,
+        since_export=request.since_export,
+        filename=filename,
+        progress=job.set_progress
+    )
+    # Bei einem Cache-Treffer (gleicher Export lief vorher in der Warteschlange) liefert der Service ein älteres Archiv
+    result_filename = os.path.basename(zip_path)
+    return {
+        'export_id': os.path.splitext(result_filename)[0],
+        'filename': result_filename,
+        'download_url': f'/export/download/{result_filename}',
+        'size': os.path.getsize(zip_path),
+        'cached': result_filename != filename
+    }
+
+def _run_booklets(job: Job, mandant_id: int, request: BookletRequest, filename: str) -> Dict[str, object]:
+    """Erstellt die Stimmenhefte im Worker-Thread und meldet den Fortschritt je Heft"""
+    summary = export_service.create_booklet_zip(
+        mandant_id=mandant_id,
+        program=[piece.dict() for piece in request.program],
+        group_by=request.group_by,
+        filename=filename,
+        progress=job.set_progress
+    )
+    return {
+        'export_id': summary['export_id'],
+        'filename': filename,
+        'download_url': f'/export/download/{filename}',
+        'size': os.path.getsize(summary['path']),
+        'booklets': [{'name': b['name'], 'pages': b['pages'], 'skipped': len(b['skipped'])} for b in summary['booklets']],
+        'missing': summary['missing']
+    }
+
+def _release_when_done(content: Iterator[bytes], mandant_id: int) -> Iterator[bytes]:
+    """Gibt den Export-Platz des Mandanten frei, sobald der Strom beendet oder abgebrochen ist
+
+    Der erste (leere) Block wird vom Aufrufer abgeholt; erst ein gestarteter
+    Generator führt beim Schließen oder Aufräumen sein ``finally`` aus.
+    """
+    try:
+        yield b''
+        yield from content
+    finally:
+        job_manager.release(mandant_id)
 
 @router.get("/layouts", response_model=Dict[str, LayoutInfo])
 async def get_export_layouts(current_mandant: int = Depends(get_current_mandant)):
@@ -48,46 +138,129 @@ async def get_export_layouts(current_mandant: int = Depends(get_current_mandant)
         }
     }
 
-@router.post("/", response_model=ExportResponse)
+@router.post("/", response_model=ExportResponse, status_code=202)
 async def create_export(
     request: ExportRequest,
+    response: Response,
     current_mandant: int = Depends(get_current_mandant)
 ):
-    """Neuen Export erstellen"""
-    try:
-        result = export_service.create_export_zip(
-            mandant_id=current_mandant,
-            layout=request.layout,
-            include_pdfs=request.include_pdfs,
-            include_metadata=request.include_metadata
-        )
+    """Neuen Export als Hintergrund-Auftrag starten
 
+    Mit ``streaming`` wird der ZIP stattdessen direkt als Download erzeugt, ohne Zwischendatei.
+    Mit ``since_export`` enthält der Export nur Änderungen seit dem angegebenen Export.
+    Existiert bereits ein identisches Archiv (gleiche Optionen, unveränderte Dateien),
+    wird es sofort zurückgegeben.
+    """
+    if request.since_export:
+        try:
+            await run_in_threadpool(export_service.load_manifest, current_mandant, request.since_export)
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+
+    cached_path = await run_in_threadpool(
+        export_service.find_cached_export, current_mandant, request.layout,
+        request.include_pdfs, request.include_metadata, request.since_export
+    )
+    if cached_path is not None:
+        filename = os.path.basename(cached_path)
+        if request.streaming:
+            return FileResponse(cached_path, media_type='application/zip', filename=filename,
+                                headers={'X-Export-Id': os.path.splitext(filename)[0]})
+        response.status_code = 200
         return {
-            'export_id': f'export_{current_mandant}_{request.layout}',
-            'filename': result,
-            'download_url': f'/exports/{result}',
+            'export_id': os.path.splitext(filename)[0],
+            'filename': filename,
+            'download_url': f'/export/download/{filename}',
             'status': 'completed'
         }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Export-Fehler: {str(e)}")
+
+    if request.streaming:
+        # Gestreamte Exporte zählen wie Hintergrund-Aufträge gegen das Mandanten-Limit, warten aber nicht
+        if not job_manager.acquire(current_mandant):
+            raise HTTPException(status_code=429, detail="Zu viele gleichzeitige Exporte, bitte später erneut versuchen")
+        filename = export_service.export_filename(current_mandant, request.layout, delta=bool(request.since_export))
+        try:
+            content = export_service.iter_export_zip(
+                mandant_id=current_mandant,
+                layout=request.layout,
+                include_pdfs=request.include_pdfs,
+                include_metadata=request.include_metadata,
+                since_export=request.since_export,
+                filename=filename
+            )
+        except FileNotFoundError as e:
+            job_manager.release(current_mandant)
+            raise HTTPException(status_code=404, detail=str(e))
+        except Exception:
+            job_manager.release(current_mandant)
+            raise
+        content = _release_when_done(content, current_mandant)
+        next(content)
+        return StreamingResponse(
+            content,
+            media_type='application/zip',
+            headers={
+                'Content-Disposition': f'attachment; filename="{filename}"',
+                'X-Export-Id': os.path.splitext(filename)[0]
+            }
+        )
+
+    filename = export_service.export_filename(current_mandant, request.layout, delta=bool(request.since_export))
+    job = job_manager.submit(current_mandant, 'export', lambda job: _run_export(job, current_mandant, request, filename))
+    return {
+        'export_id': os.path.splitext(filename)[0],
+        'job_id': job.id,
+        'filename': filename,
+        'status': job.status
+    }
+
+@router.post("/booklets", response_model=ExportResponse, status_code=202)
+async def create_booklets(request: BookletRequest, current_mandant: int = Depends(get_current_mandant)):
+    """Stimmenhefte je Musiker für ein Konzertprogramm als Hintergrund-Auftrag erstellen
+
+    Die Stimmen der Werke werden nach Stimme (``part``) oder Instrument
+    (``instrument``) gruppiert und je Gruppe zu einem PDF mit Lesezeichen zusammengefügt.
+    """
+    if not request.program:
+        raise HTTPException(status_code=400, detail="Das Programm enthält keine Werke")
+    if request.group_by not in GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"Unbekannte Gruppierung: {request.group_by}")
+    filename = export_service.export_filename(current_mandant, 'booklets')
+    job = job_manager.submit(current_mandant, 'export', lambda job: _run_booklets(job, current_mandant, request, filename))
+    return {
+        'export_id': os.path.splitext(filename)[0],
+        'job_id': job.id,
+        'filename': filename,
+        'status': job.status
+    }
+
+@router.get("/jobs")
+async def list_export_jobs(current_mandant: int = Depends(get_current_mandant)):
+    """Laufende und kürzlich beendete Export-Aufträge des Mandanten"""
+    return [job.to_dict(include_results=False) for job in job_manager.list_jobs(current_mandant, 'export')]
+
+@router.get("/jobs/{job_id}")
+async def get_export_job(job_id: str, current_mandant: int = Depends(get_current_mandant)):
+    """Status und Fortschritt eines Export-Auftrags abrufen"""
+    job = job_manager.get(job_id, current_mandant)
+    if job is None or job.kind != 'export':
+        raise HTTPException(status_code=404, detail="Auftrag nicht gefunden")
+    return job.to_dict()
 
 @router.get("/history", response_model=List[ExportHistoryItem])
-async def get_export_history(current_mandant: int = Depends(get_current_mandant)):
+def get_export_history(current_mandant: int = Depends(get_current_mandant)):
     """Export-Historie abrufen"""
-    # In einer realen Implementierung würde hier die Datenbank abgefragt
-    return [
-        {
-            'id': 1,
-            'date': '2024-01-15T10:30:00',
-            'layout': 'standard',
-            'file_size': '2.5 MB',
-            'status': 'completed'
-        },
-        {
-            'id': 2,
-            'date': '2024-01-10T14:20:00',
-            'layout': 'compact',
-            'file_size': '1.8 MB',
-            'status': 'completed'
-        }
-    ]
\ No newline at end of file
+    return export_service.get_export_history(current_mandant)
+
+@router.api_route("/download/{filename}", methods=["GET", "HEAD"])
+async def download_archive(filename: str, request: Request, current_mandant: int = Depends(get_current_mandant)):
+    """Export- oder Backup-Archiv herunterladen (fortsetzbar über Range, bedingte Anfragen über ETag)"""
+    match = ARCHIVE_FILENAME.fullmatch(filename)
+    # Fremde Archive sind für den Mandanten nicht vorhanden
+    if not match or int(match.group(2)) != current_mandant:
+        raise HTTPException(status_code=404, detail="Archiv nicht gefunden")
+    directory = export_service.export_dir if match.group(1) == 'export' else str(backup_service.backup_dir)
+    path = os.path.join(directory, filename)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Archiv nicht gefunden")
+    return RangeFileResponse(path, request, filename=filename, media_type='application/zip')
@@ -1,19 +1,80 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from typing import List, Dict, Optional
+import anyio
+import base64
+import binascii
+import os
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from typing import AsyncIterator, Iterator, List, Dict, Optional
 from pydantic import BaseModel
 from backend.auth import get_current_mandant
 
 router = APIRouter()
 
 from backend.services.import_softnote import ImportFileService
+from backend.services.resumable_upload import CHECKSUM_ALGORITHMS, ResumableUploadStore
 
 import_service = ImportFileService()
+upload_store = ResumableUploadStore()
+
+def _iter_in_thread(stream: AsyncIterator[bytes]) -> Iterator[bytes]:
+    """Liest einen asynchronen Strom stückweise aus einem Worker-Thread von ``run_in_threadpool``"""
+    while True:
+        try:
+            yield anyio.from_thread.run(stream.__anext__)
+        except StopAsyncIteration:
+            return
+
+@asynccontextmanager
+async def _spool_upload(file: UploadFile) -> AsyncIterator[str]:
+    """Pfad einer temporären Datei im Upload-Verzeichnis mit dem Inhalt des Uploads
+
+    Der Upload wird blockweise kopiert und die Datei nach der Verarbeitung gelöscht.
+    """
+    suffix = os.path.splitext(file.filename or '')[1]
+    with tempfile.NamedTemporaryFile(dir=upload_store.upload_dir, prefix='spool-', suffix=suffix) as target:
+        await run_in_threadpool(shutil.copyfileobj, file.file, target, 1024 * 1024)
+        target.flush()
+        yield target.name
+
+def _import_csv_file(path: str, mandant_id: int) -> Dict:
+    with open(path, 'rb') as source:
+        return import_service.import_csv_stream(source, mandant_id)
+
+def _preview_csv_file(path: str) -> Dict:
+    with open(path, 'rb') as source:
+        return import_service.preview_csv_stream(source)
 
 # Pydantic-Modelle für API
 class ImportPreviewResponse(BaseModel):
     works: List[Dict]
     parts: List[Dict]
     warnings: List[str]
+    type: Optional[str] = None
+    valid: bool = True
+    error: Optional[str] = None
+    # CSV: geprüfte Stichprobe und Gesamtzahl der Zeilen
+    sampled_rows: Optional[int] = None
+    total_rows: Optional[int] = None
+    total_rows_exact: Optional[bool] = None
+    # ZIP: Einträge laut zentralem Verzeichnis
+    files: Optional[List[str]] = None
+    entries: Optional[List[Dict]] = None
+    entries_truncated: Optional[bool] = None
+    total_files: Optional[int] = None
+    importable_files: Optional[int] = None
+    total_size: Optional[int] = None
+    compressed_size: Optional[int] = None
+    file_types: Optional[Dict[str, int]] = None
+
+class UploadCreateRequest(BaseModel):
+    filename: str
+    length: int
+
+class UploadCompleteRequest(BaseModel):
+    sha256: Optional[str] = None
 
 class CalendarEvent(BaseModel):
     id: int
@@ -28,19 +89,27 @@ async def preview_import(
     file: UploadFile = File(...),
     current_mandant: int = Depends(get_current_mandant)
 ):
-    """Vorschau für Import-Datei generieren"""
+    """Vorschau für Import-Datei generieren
+
+    CSV: die ersten Zeilen geprüft plus Gesamtzahl der Zeilen, gelesen von Platte.
+    ZIP: nur das zentrale Verzeichnis (Namen, Größen, Kompressionsraten,
+    Werke/Stimmen), direkt aus der von Starlette gepufferten Upload-Datei.
+    """
     try:
-        content = await file.read()
         filename = file.filename or ""
 
         if filename.endswith('.csv'):
-            result = import_service.preview_csv(content.decode('utf-8'))
+            # Wie beim Import über eine echte Datei (TextIOWrapper, siehe execute_import)
+            async with _spool_upload(file) as csv_path:
+                result = await run_in_threadpool(_preview_csv_file, csv_path)
         elif filename.endswith('.zip'):
-            result = import_service.preview_zip(content)
+            result = await run_in_threadpool(import_service.preview_zip, file.file)
         else:
             raise HTTPException(status_code=400, detail="Nicht unterstütztes Dateiformat")
 
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Import-Vorschau-Fehler: {str(e)}")
 
@@ -49,21 +118,190 @@ async def execute_import(
     file: UploadFile = File(...),
     current_mandant: int = Depends(get_current_mandant)
 ):
-    """Import ausführen"""
+    """Import ausführen
+
+    Beide Formate werden von Platte gelesen (ab 1 MB direkt aus Starlettes
+    Auslagerungsdatei, sonst aus einer Kopie). CSV-Dateien werden zeilenweise
+    gelesen, blockweise gespeichert und mit einer Zusammenfassung aus Zählern und
+    Zeilenfehlern beantwortet. ZIP-Archive werden gegen die Grenzen (Größe,
+    Anzahl, Kompressionsrate) geprüft und parallel in den Speicher des Mandanten
+    entpackt.
+    """
     try:
-        content = await file.read()
         filename = file.filename or ""
 
         if filename.endswith('.csv'):
-            result = import_service.import_csv(content.decode('utf-8'), current_mandant)
+            # Nicht direkt aus ``file.file``: TextIOWrapper braucht bis Python 3.10 ein echtes
+            # Dateiobjekt, SpooledTemporaryFile bietet dort weder readable() noch seekable()
+            async with _spool_upload(file) as csv_path:
+                result = await run_in_threadpool(_import_csv_file, csv_path, current_mandant)
         elif filename.endswith('.zip'):
-            result = import_service.import_zip(content, current_mandant)
+            async with _spool_upload(file) as zip_path:
+                result = await run_in_threadpool(import_service.import_zip_file, zip_path, current_mandant)
         else:
             raise HTTPException(status_code=400, detail="Nicht unterstütztes Dateiformat")
 
         return result
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Import-Fehler: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Import-Fehler: {str(e)}")
+
+def _upload_headers(upload: Dict) -> Dict[str, str]:
+    return {
+        'Upload-Offset': str(upload['offset']),
+        'Upload-Length': str(upload['length']),
+        'Upload-Expires': str(int(upload['expires_at'])),
+        'Cache-Control': 'no-store',
+    }
+
+def _get_upload(mandant_id: int, upload_id: str) -> Dict:
+    upload = upload_store.get(mandant_id, upload_id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload nicht gefunden")
+    return upload
+
+@router.post("/uploads", status_code=201)
+async def create_upload(request: UploadCreateRequest, response: Response,
+                        current_mandant: int = Depends(get_current_mandant)):
+    """Fortsetzbaren Upload anlegen; die Daten folgen in Teilstücken per PATCH"""
+    try:
+        upload = await run_in_threadpool(upload_store.create, current_mandant, request.filename, request.length)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers.update(_upload_headers(upload))
+    response.headers['Location'] = f"/import/uploads/{upload['id']}"
+    return upload
+
+@router.head("/uploads/{upload_id}")
+async def get_upload_offset(upload_id: str, current_mandant: int = Depends(get_current_mandant)):
+    """Aktuellen Stand abfragen (Header ``Upload-Offset``), z.B. nach einem Verbindungsabbruch"""
+    return Response(status_code=200, headers=_upload_headers(_get_upload(current_mandant, upload_id)))
+
+@router.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str, response: Response, current_mandant: int = Depends(get_current_mandant)):
+    upload = _get_upload(current_mandant, upload_id)
+    response.headers.update(_upload_headers(upload))
+    return upload
+
+@router.patch("/uploads/{upload_id}")
+async def append_upload_chunk(upload_id: str, request: Request, current_mandant: int = Depends(get_current_mandant)):
+    """Teilstück an der Position aus ``Upload-Offset`` anhängen
+
+    ``Upload-Checksum: <algorithmus> <base64-digest>`` (sha256, sha1, md5) ist
+    optional; stimmt sie nicht, wird das Teilstück verworfen (Status 460).
+    Bei abweichendem Offset antwortet der Server mit 409 und dem aktuellen Stand.
+    """
+    upload = _get_upload(current_mandant, upload_id)
+    try:
+        offset = int(request.headers['Upload-Offset'])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="Header Upload-Offset fehlt oder ist ungültig")
+    if offset != upload['offset']:
+        raise HTTPException(status_code=409, detail=f"Offset {offset} passt nicht zum Stand {upload['offset']}",
+                            headers=_upload_headers(upload))
+
+    checksum = None
+    if request.headers.get('Upload-Checksum'):
+        try:
+            algorithm, encoded = request.headers['Upload-Checksum'].split(' ', 1)
+            checksum = (algorithm.lower(), base64.b64decode(encoded.strip(), validate=True))
+        except (ValueError, binascii.Error) as e:
+            raise HTTPException(status_code=400, detail=f"Ungültige Upload-Checksum: {str(e)}")
+        if checksum[0] not in CHECKSUM_ALGORITHMS:
+            raise HTTPException(status_code=400, detail=f"Nicht unterstützter Prüfsummen-Algorithmus: {checksum[0]}")
+
+    def body() -> Iterator[bytes]:
+        # Der Body geht blockweise in die Datei, statt vorher im Speicher gesammelt zu werden
+        size = 0
+        for chunk in _iter_in_thread(request.stream()):
+            size += len(chunk)
+            if offset + size > upload['length']:
+                raise HTTPException(status_code=413, detail="Teilstück zu groß")
+            yield chunk
+
+    try:
+        upload = await run_in_threadpool(upload_store.append, current_mandant, upload_id, offset, body(), checksum)
+    except ValueError as e:
+        # Parallel gesendetes Teilstück oder inzwischen abgeschlossener Upload
+        raise HTTPException(status_code=409, detail=str(e))
+    if upload is None:
+        raise HTTPException(status_code=460, detail="Prüfsumme des Teilstücks stimmt nicht")
+    return Response(status_code=204, headers=_upload_headers(upload))
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, request: UploadCompleteRequest,
+                          current_mandant: int = Depends(get_current_mandant)):
+    """Upload abschließen, optional mit SHA-256 der ganzen Datei"""
+    _get_upload(current_mandant, upload_id)
+    try:
+        return await run_in_threadpool(upload_store.complete, current_mandant, upload_id, request.sha256)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def delete_upload(upload_id: str, current_mandant: int = Depends(get_current_mandant)):
+    try:
+        deleted = await run_in_threadpool(upload_store.delete, current_mandant, upload_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Upload nicht gefunden")
+    return Response(status_code=204)
+
+def _import_upload(upload: Dict, mandant_id: int) -> Dict:
+    path = upload_store.path(upload['id'])
+    if upload['filename'].lower().endswith('.csv'):
+        return _import_csv_file(path, mandant_id)
+    return import_service.import_zip_file(path, mandant_id)
+
+def _preview_upload(upload: Dict) -> Dict:
+    path = upload_store.path(upload['id'])
+    if upload['filename'].lower().endswith('.csv'):
+        return _preview_csv_file(path)
+    return import_service.preview_zip(path)
+
+@router.post("/uploads/{upload_id}/preview", response_model=ImportPreviewResponse)
+async def preview_upload(upload_id: str, current_mandant: int = Depends(get_current_mandant)):
+    """Vorschau aus einem abgeschlossenen Upload (das zentrale Verzeichnis liegt am Ende des Archivs)"""
+    upload = _get_upload(current_mandant, upload_id)
+    if not upload['completed']:
+        raise HTTPException(status_code=409, detail="Upload ist noch nicht abgeschlossen")
+    return await run_in_threadpool(_preview_upload, upload)
+
+@router.post("/uploads/{upload_id}/import")
+async def import_upload(upload_id: str, current_mandant: int = Depends(get_current_mandant)):
+    """Import aus einem abgeschlossenen Upload; die Upload-Datei wird danach gelöscht
+
+    Während des Imports ist der Upload gesperrt: ein zweiter Aufruf erhält 409,
+    Löschen und Speicherbereinigung warten bis zum Ende.
+    """
+    _get_upload(current_mandant, upload_id)
+    try:
+        upload = await run_in_threadpool(upload_store.begin_import, current_mandant, upload_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    success = False
+    try:
+        result = await run_in_threadpool(_import_upload, upload, current_mandant)
+        success = True
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Import-Fehler: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Import-Fehler: {str(e)}")
+    finally:
+        await run_in_threadpool(upload_store.end_import, current_mandant, upload_id, success)
+    return result
+
+@router.get("/jobs/{job_id}")
+async def get_index_job(job_id: str, current_mandant: int = Depends(get_current_mandant)):
+    """Stand der Volltextindizierung nach einem ZIP-Import (``index_job_id`` der Import-Antwort)"""
+    job = import_service.index_jobs.get(job_id, current_mandant)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Auftrag nicht gefunden")
+    return job.to_dict(include_results=True)
 
 @router.get("/calendar", response_model=List[CalendarEvent])
 async def get_calendar_events(current_mandant: int = Depends(get_current_mandant)):
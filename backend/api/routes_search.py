@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional
+from pydantic import BaseModel
+from backend.auth import get_current_mandant
+from backend.services.ai_classification import AIClassificationService
+from backend.services.jobs import JobManager
+from backend.services.search_index import SearchIndexService
+
+router = APIRouter()
+# Extraktor mit dem gemeinsamen Analyse-Cache: bereits importierte oder klassifizierte PDFs werden nicht erneut gelesen
+search_service = SearchIndexService(extractor=AIClassificationService())
+job_manager = JobManager(max_workers=1)
+
+# Pydantic-Modelle für API
+class SearchHit(BaseModel):
+    file_id: str
+    title: Optional[str] = None
+    composer: Optional[str] = None
+    score: float
+    snippet: str
+
+class SearchResponse(BaseModel):
+    query: str
+    total: int
+    page: int
+    page_size: int
+    results: List[SearchHit]
+
+@router.get("/", response_model=SearchResponse)
+def search_scores(
+    q: str = Query(..., min_length=1),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    current_mandant: int = Depends(get_current_mandant)
+):
+    """Volltextsuche im Notenarchiv (Liedtexte, Satzbezeichnungen, Verlagshinweise)"""
+    try:
+        return search_service.search(current_mandant, q, page, page_size)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Suche fehlgeschlagen: {str(e)}")
+
+@router.post("/reindex", status_code=202)
+async def reindex_scores(current_mandant: int = Depends(get_current_mandant)):
+    """Suchindex mit den gespeicherten PDFs des Mandanten abgleichen (Hintergrund-Auftrag)"""
+    job = job_manager.submit(current_mandant, 'search_reindex',
+                             lambda job: search_service.reindex_mandant(current_mandant))
+    return {'job_id': job.id, 'status': job.status}
+
+@router.get("/reindex/{job_id}")
+async def get_reindex_job(job_id: str, current_mandant: int = Depends(get_current_mandant)):
+    """Status eines Reindex-Auftrags abrufen"""
+    job = job_manager.get(job_id, current_mandant)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Auftrag nicht gefunden")
+    return job.to_dict()
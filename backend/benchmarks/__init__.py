@@ -0,0 +1 @@
+# Benchmarks für BestNote-Services
\ No newline at end of file
@@ -0,0 +1,90 @@
+"""Benchmark: vektorisierte Batch-Klassifikation vs. Einzel-Dokument-Pfad
+
+Aufruf aus dem Projektverzeichnis:
+
+    python -m backend.benchmarks.bench_batch_scoring --docs 5000
+
+Gemessen werden die Bewertung aus vorhandenen Treffer-Zählungen (reiner
+Scoring-Schritt) sowie der Gesamtweg ab extrahiertem Text.
+"""
+import argparse
+import json
+import random
+import time
+from typing import Any, Dict, List
+
+from backend.services.ai_classification import AIClassificationService
+from backend.services.batch_scoring import BatchScoringEngine
+
+
+def make_corpus(docs: int, words: int = 400, seed: int = 7) -> List[str]:
+    """Erzeugt reproduzierbare Texte mit Schlüsselwörtern und Fülltext"""
+    rng = random.Random(seed)
+    service = AIClassificationService(cache_path=None)
+    keywords = service.matcher.keywords
+    filler = ['und', 'der', 'die', 'takt', 'seite', 'stimme', 'ausgabe', 'verlag', 'nr.', 'satz']
+    return [' '.join(rng.choice(keywords) if rng.random() < 0.05 else rng.choice(filler) for _ in range(words))
+            for _ in range(docs)]
+
+
+def _per_document(service: AIClassificationService, hits_list) -> List[Dict[str, Any]]:
+    return [{
+        'genre': service._classify_genre('', hits),
+        'difficulty': service._classify_difficulty('', hits),
+        'instruments': service._extract_instruments('', hits)
+    } for hits in hits_list]
+
+
+def run(docs: int = 5000) -> Dict[str, Any]:
+    texts = make_corpus(docs)
+    engine = BatchScoringEngine()
+    service = engine.service
+
+    start = time.perf_counter()
+    hits_list = [service.matcher.count(text) for text in texts]
+    count_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = _per_document(service, hits_list)
+    per_doc_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = engine.classify_hits(hits_list)
+    batch_seconds = time.perf_counter() - start
+
+    if actual != expected:
+        raise AssertionError('Batch-Ergebnisse weichen vom Einzel-Pfad ab')
+
+    return {
+        'docs': docs,
+        'keyword_count_s': count_seconds,
+        'per_document_scoring_s': per_doc_seconds,
+        'batch_scoring_s': batch_seconds,
+        'scoring_speedup': per_doc_seconds / batch_seconds if batch_seconds else None,
+        'end_to_end_per_document_docs_per_s': docs / (count_seconds + per_doc_seconds),
+        'end_to_end_batch_docs_per_s': docs / (count_seconds + batch_seconds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch-Scoring-Benchmark')
+    parser.add_argument('--docs', type=int, default=5000)
+    parser.add_argument('--json', action='store_true', help='Ergebnis als JSON ausgeben')
+    args = parser.parse_args()
+
+    report = run(args.docs)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{report['docs']} Dokumente (Ergebnisse identisch)")
+    print(f"Schlüsselwort-Zählung:    {report['keyword_count_s'] * 1000:8.1f} ms")
+    print(f"Scoring Einzel-Pfad:      {report['per_document_scoring_s'] * 1000:8.1f} ms")
+    print(f"Scoring Batch (Matrix):   {report['batch_scoring_s'] * 1000:8.1f} ms "
+          f"({report['scoring_speedup']:.1f}x)")
+    print(f"Gesamt Einzel/Batch:      {report['end_to_end_per_document_docs_per_s']:8.0f} / "
+          f"{report['end_to_end_batch_docs_per_s']:.0f} Dok./s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark: CSV-Vorschau mit Einzel-Modellen vs. einmaligem Lesen mit Block-Validierung
+
+Aufruf aus dem Projektverzeichnis:
+
+    python -m backend.benchmarks.bench_csv_import --rows 100000
+
+Verglichen wird der bisherige Weg (``validate_csv`` und ``parse_csv`` lesen die
+Datei je einmal mit ``DictReader``, ein ``Score`` plus ``.dict()`` je Zeile) mit
+``CsvScoreParser`` (Kopfzeile einmal, ``TypeAdapter`` je Block). Beide Wege
+müssen dieselben Werke liefern.
+"""
+import argparse
+import csv
+import io
+import json
+import random
+import time
+from typing import Any, Dict, List
+
+from backend.models import Score
+from backend.services.csv_import import CsvScoreParser
+
+COMPOSERS = ['Beethoven', 'Mozart', 'Bach', 'Strauß', 'Verdi', 'Brahms', 'Fučík', 'Sousa']
+
+
+def make_softnote_csv(rows: int, seed: int = 7) -> str:
+    """Erzeugt einen reproduzierbaren SoftNote-Export mit ``rows`` Werken"""
+    rng = random.Random(seed)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['Titel', 'Komponist', 'Jahr', 'Metadaten'])
+    for index in range(rows):
+        writer.writerow([f'Werk {index} "{rng.choice(["Marsch", "Polka", "Choral"])}"', rng.choice(COMPOSERS),
+                         str(rng.randint(1700, 2020)), f'Verlag {rng.randint(1, 50)}, Nr. {index}'])
+    return out.getvalue()
+
+
+def _legacy(csv_content: str) -> List[Dict[str, Any]]:
+    """Bisheriger Weg aus ImportFileService.preview_csv (ohne Zeilenprüfung)"""
+    reader = csv.DictReader(csv_content.splitlines())
+    headers = reader.fieldnames
+    if headers is None or not all(field in headers for field in ['Titel', 'Komponist']):
+        return []
+    reader = csv.DictReader(csv_content.splitlines())
+    return [Score(title=row.get('Titel', ''), composer=row.get('Komponist', ''), year=row.get('Jahr', ''),
+                  metadata=row.get('Metadaten', '')).dict() for row in reader]
+
+
+def _single_pass(csv_content: str) -> List[Dict[str, Any]]:
+    scores, _, _ = CsvScoreParser(io.StringIO(csv_content, newline='')).parse()
+    return scores
+
+
+def _best_of(func, content: str, repeat: int):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(content)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(rows: int = 100000, repeat: int = 3) -> Dict[str, Any]:
+    content = make_softnote_csv(rows)
+    legacy_seconds, legacy = _best_of(_legacy, content, repeat)
+    single_seconds, single = _best_of(_single_pass, content, repeat)
+    if [{key: score[key] for key in ('title', 'composer', 'year', 'metadata')} for score in legacy] != single:
+        raise AssertionError('Einmaliges Lesen liefert andere Werke als der bisherige Weg')
+    return {
+        'rows': rows,
+        'csv_bytes': len(content.encode('utf-8')),
+        'legacy_s': legacy_seconds,
+        'single_pass_s': single_seconds,
+        'legacy_rows_per_s': rows / legacy_seconds,
+        'single_pass_rows_per_s': rows / single_seconds,
+        'speedup': legacy_seconds / single_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CSV-Import-Benchmark')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help='Ergebnis als JSON ausgeben')
+    args = parser.parse_args()
+
+    report = run(args.rows, args.repeat)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{report['rows']} Zeilen, {report['csv_bytes'] / (1024 * 1024):.1f} MB (Ergebnisse identisch)")
+    print(f"Bisher (2x DictReader, Score je Zeile): {report['legacy_s'] * 1000:8.1f} ms "
+          f"({report['legacy_rows_per_s']:9.0f} Zeilen/s)")
+    print(f"Einmal lesen, Block-Validierung:        {report['single_pass_s'] * 1000:8.1f} ms "
+          f"({report['single_pass_rows_per_s']:9.0f} Zeilen/s, {report['speedup']:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
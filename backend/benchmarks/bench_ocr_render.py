@@ -0,0 +1,120 @@
+"""Benchmark: Seiten-Rendering für OCR (PNG-Umweg vs. Graustufen-Pixmap ohne Kopie)
+
+Aufruf aus dem Projektverzeichnis:
+
+    python -m backend.benchmarks.bench_ocr_render --pages 5 --dpi 144 [--ocr]
+
+Jede Variante läuft in einem eigenen Prozess, damit der Spitzen-Speicher (RSS)
+getrennt gemessen werden kann. Mit ``--ocr`` wird zusätzlich pytesseract
+aufgerufen (nur wenn tesseract installiert ist).
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+from typing import Dict, Any
+
+from backend.benchmarks.corpus import create_scanned_pdf
+
+
+def _render_png_roundtrip(page, dpi: int):
+    """Bisheriger Pfad: RGB-Pixmap -> PNG kodieren -> PNG dekodieren"""
+    import fitz
+    from PIL import Image
+
+    pix = page.get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72))
+    img = Image.open(io.BytesIO(pix.tobytes('png')))
+    img.load()
+    return pix, img
+
+
+def _render_zero_copy(page, dpi: int):
+    from backend.services.ai_classification import AIClassificationService
+    return AIClassificationService._render_page_gray(page, dpi)
+
+
+VARIANTS = {
+    'png_roundtrip': _render_png_roundtrip,
+    'zero_copy_gray': _render_zero_copy,
+}
+
+
+def _run_variant(variant: str, pdf_path: str, dpi: int, ocr: bool, results):
+    import fitz
+
+    render = VARIANTS[variant]
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timings = []
+    ocr_timings = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            start = time.perf_counter()
+            pix, img = render(page, dpi)
+            timings.append(time.perf_counter() - start)
+            if ocr:
+                import pytesseract
+                start = time.perf_counter()
+                pytesseract.image_to_string(img, lang='deu+eng')
+                ocr_timings.append(time.perf_counter() - start)
+            del img, pix
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put({
+        'variant': variant,
+        'pages': len(timings),
+        'render_ms_per_page': 1000 * sum(timings) / len(timings),
+        'ocr_ms_per_page': 1000 * sum(ocr_timings) / len(ocr_timings) if ocr_timings else None,
+        'peak_rss_delta_kb': peak_rss - baseline_rss,
+    })
+
+
+def run(pages: int = 5, dpi: int = 144, ocr: bool = False) -> Dict[str, Any]:
+    ctx = multiprocessing.get_context('spawn')
+    tmp_dir = tempfile.mkdtemp(prefix='bestnote_bench_')
+    try:
+        pdf_path = os.path.join(tmp_dir, 'scan.pdf')
+        create_scanned_pdf(pdf_path, pages)
+        results = ctx.Queue()
+        report = {'pages': pages, 'dpi': dpi, 'ocr': ocr, 'variants': {}}
+        for variant in VARIANTS:
+            process = ctx.Process(target=_run_variant, args=(variant, pdf_path, dpi, ocr, results))
+            process.start()
+            result = results.get()
+            process.join()
+            report['variants'][variant] = result
+        return report
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OCR-Rendering-Benchmark')
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--dpi', type=int, default=144)
+    parser.add_argument('--ocr', action='store_true', help='zusätzlich pytesseract ausführen')
+    parser.add_argument('--json', action='store_true', help='Ergebnis als JSON ausgeben')
+    args = parser.parse_args()
+
+    if args.ocr and shutil.which('tesseract') is None:
+        print('tesseract nicht gefunden - OCR wird übersprungen')
+        args.ocr = False
+
+    report = run(args.pages, args.dpi, args.ocr)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{report['pages']} Seiten, {report['dpi']} dpi")
+    for name, result in report['variants'].items():
+        line = f"{name:16s} Rendering {result['render_ms_per_page']:7.1f} ms/Seite, Spitzen-RSS +{result['peak_rss_delta_kb'] / 1024:6.1f} MB"
+        if result['ocr_ms_per_page'] is not None:
+            line += f", OCR {result['ocr_ms_per_page']:7.1f} ms/Seite"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Reproduzierbarer synthetischer PDF-Korpus für Benchmarks (PyMuPDF)"""
+import io
+import os
+import random
+from typing import Dict, List
+
+FILLER = ['und', 'der', 'die', 'das', 'seite', 'stimme', 'ausgabe', 'verlag', 'satz', 'takt', 'nr.', 'für']
+MUSIC_WORDS = ['sinfonie', 'violine', 'viola', 'violoncello', 'flöte', 'oboe', 'klarinette', 'horn', 'trompete',
+               'pauke', 'allegro', 'andante', 'crescendo', 'divisi', 'tutti', 'messe', 'kantate', 'walzer',
+               'marsch', 'beethoven', 'mozart', 'bach', 'brahms', 'orchester', 'quartett', 'op.']
+
+
+def _page_text(rng: random.Random, words: int = 350) -> str:
+    return ' '.join(rng.choice(MUSIC_WORDS) if rng.random() < 0.08 else rng.choice(FILLER) for _ in range(words))
+
+
+def create_text_pdf(path: str, pages: int, seed: int = 1):
+    """Erzeugt ein PDF mit eingebettetem Text (Titel/Komponist auf Seite 1)"""
+    import fitz
+
+    rng = random.Random(seed)
+    with fitz.open() as doc:
+        for page_num in range(pages):
+            page = doc.new_page(width=595, height=842)
+            text = _page_text(rng)
+            if page_num == 0:
+                text = f'Titel: Sinfonie Nr. {seed % 9 + 1} in c-Moll\nKomponist: Beethoven\n\n' + text
+            page.insert_textbox(fitz.Rect(50, 50, 545, 792), text, fontsize=9)
+        doc.save(path, garbage=3, deflate=True)
+
+
+def create_scanned_pdf(path: str, pages: int, seed: int = 42):
+    """Erzeugt ein reines Bild-PDF (wie ein Scan) mit verrauschten Notenzeilen"""
+    import fitz
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    with fitz.open() as doc:
+        for _ in range(pages):
+            img = Image.new('L', (1240, 1754), 255)
+            draw = ImageDraw.Draw(img)
+            for staff in range(12):
+                top = 150 + staff * 130
+                for line in range(5):
+                    draw.line((80, top + line * 12, 1160, top + line * 12), fill=0, width=2)
+                for _ in range(40):
+                    x = rng.randint(90, 1150)
+                    y = top + rng.randint(-10, 58)
+                    draw.ellipse((x, y, x + 14, y + 10), fill=0)
+            draw.text((420, 60), 'Sinfonie Nr. 5 - Violine I', fill=0)
+            buffer = io.BytesIO()
+            img.save(buffer, format='PNG')
+            page = doc.new_page(width=595, height=842)
+            page.insert_image(page.rect, stream=buffer.getvalue())
+        doc.save(path)
+
+
+# Korpus-Fälle: Art, Anzahl Dokumente, Seiten pro Dokument
+CORPUS_CASES: Dict[str, Dict[str, object]] = {
+    'text_small': {'kind': 'text', 'docs': 40, 'pages': 2},
+    'text_large': {'kind': 'text', 'docs': 2, 'pages': 400},
+    'scanned_small': {'kind': 'scanned', 'docs': 4, 'pages': 2},
+    'scanned_large': {'kind': 'scanned', 'docs': 1, 'pages': 40},
+}
+
+
+def build_case(directory: str, name: str, kind: str, docs: int, pages: int) -> List[str]:
+    """Erzeugt die PDFs eines Falls (deterministisch über den Seed) und gibt die Pfade zurück"""
+    os.makedirs(directory, exist_ok=True)
+    create = create_text_pdf if kind == 'text' else create_scanned_pdf
+    paths = []
+    for index in range(docs):
+        path = os.path.join(directory, f'{name}_{index:03d}.pdf')
+        create(path, pages, seed=index + 1)
+        paths.append(path)
+    return paths
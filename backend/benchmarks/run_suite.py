@@ -0,0 +1,238 @@
+"""Benchmark-Suite für die PDF-Klassifikation
+
+Aufruf aus dem Projektverzeichnis:
+
+    python -m backend.benchmarks.run_suite --output bench_results.json [--compare alt.json] [--scale 0.5]
+
+Für jeden Korpus-Fall (siehe ``corpus.CORPUS_CASES``) wird ``analyze_pdf`` in
+einem eigenen Prozess ausgeführt und gemessen:
+
+- Durchsatz in Dokumenten pro Sekunde
+- Latenz je Stufe (Textextraktion, OCR, Klassifikation) und gesamt (Mittel, p50, p95)
+- Spitzen-RSS des Prozesses
+
+Zusätzlich misst ``batch_parallel`` den Durchsatz von ``batch_analyze(parallel=True)``.
+Der Ergebnis-Cache ist deaktiviert. Fälle mit OCR werden ohne tesseract übersprungen.
+Das JSON-Ergebnis lässt sich mit ``--compare`` gegen einen früheren Lauf vergleichen.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from backend.benchmarks.corpus import CORPUS_CASES, build_case
+from backend.services.ai_classification import AIClassificationService
+
+RESULT_FORMAT_VERSION = 1
+
+
+class InstrumentedClassificationService(AIClassificationService):
+    """Misst die Zeit in Textextraktion und OCR; der Rest von analyze_pdf ist Klassifikation"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.timings: Dict[str, float] = defaultdict(float)
+
+    def _iter_page_texts(self, *args, **kwargs):
+        pages = super()._iter_page_texts(*args, **kwargs)
+        while True:
+            start = time.perf_counter()
+            try:
+                page_text = next(pages)
+            except StopIteration:
+                self.timings['extract_and_ocr'] += time.perf_counter() - start
+                return
+            self.timings['extract_and_ocr'] += time.perf_counter() - start
+            yield page_text
+
+    def _ocr_pdf(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super()._ocr_pdf(*args, **kwargs)
+        finally:
+            self.timings['ocr'] += time.perf_counter() - start
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    if not values:
+        return {'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0}
+    p95 = values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))]
+    return {
+        'mean_ms': 1000 * statistics.fmean(values),
+        'p50_ms': 1000 * statistics.median(values),
+        'p95_ms': 1000 * p95,
+    }
+
+
+def _run_case(paths: List[str], results):
+    """Analysiert alle Dokumente eines Falls sequentiell (im eigenen Prozess)"""
+    service = InstrumentedClassificationService(cache_path=None)
+    stages = defaultdict(list)
+    start_all = time.perf_counter()
+    errors = 0
+    for path in paths:
+        service.timings.clear()
+        start = time.perf_counter()
+        analysis = service.analyze_pdf(path)
+        total = time.perf_counter() - start
+        errors += 'error' in analysis
+        ocr = service.timings['ocr']
+        extract = service.timings['extract_and_ocr'] - ocr
+        stages['extract'].append(extract)
+        stages['ocr'].append(ocr)
+        stages['classify'].append(max(0.0, total - extract - ocr))
+        stages['total'].append(total)
+    elapsed = time.perf_counter() - start_all
+    results.put({
+        'docs': len(paths),
+        'errors': errors,
+        'elapsed_s': elapsed,
+        'throughput_docs_per_s': len(paths) / elapsed if elapsed else None,
+        'latency': {stage: _summary(values) for stage, values in stages.items()},
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    })
+
+
+def _run_batch(paths: List[str], results):
+    """Durchsatz der parallelen Batch-Analyse (Prozess-Pool)"""
+    service = AIClassificationService(cache_path=None)
+    start = time.perf_counter()
+    analyses = service.batch_analyze(paths, parallel=True)
+    elapsed = time.perf_counter() - start
+    service.close()
+    results.put({
+        'docs': len(paths),
+        'errors': sum('error' in analysis for analysis in analyses),
+        'elapsed_s': elapsed,
+        'throughput_docs_per_s': len(paths) / elapsed if elapsed else None,
+        'pool_size': service.pool_size,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'peak_rss_children_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    })
+
+
+def _in_subprocess(target, paths: List[str]) -> Dict[str, Any]:
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    process = ctx.Process(target=target, args=(paths, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(scale: float = 1.0, cases: Optional[List[str]] = None) -> Dict[str, Any]:
+    import fitz
+
+    has_tesseract = shutil.which('tesseract') is not None
+    report: Dict[str, Any] = {
+        'format_version': RESULT_FORMAT_VERSION,
+        'created_at': datetime.now().isoformat(),
+        'git_revision': _git_revision(),
+        'python': platform.python_version(),
+        'pymupdf': fitz.VersionBind,
+        'cpu_count': os.cpu_count(),
+        'tesseract': has_tesseract,
+        'scale': scale,
+        'cases': {},
+    }
+    tmp_dir = tempfile.mkdtemp(prefix='bestnote_bench_')
+    try:
+        corpora = {}
+        for name, case in CORPUS_CASES.items():
+            if cases and name not in cases and not (name == 'text_small' and 'batch_parallel' in cases):
+                continue
+            docs = max(1, int(round(case['docs'] * scale)))
+            if case['kind'] == 'scanned' and not has_tesseract:
+                report['cases'][name] = {'skipped': 'tesseract nicht gefunden'}
+                continue
+            corpora[name] = build_case(os.path.join(tmp_dir, name), name, case['kind'], docs, case['pages'])
+            if not cases or name in cases:
+                report['cases'][name] = dict(case, **_in_subprocess(_run_case, corpora[name]))
+
+        if (not cases or 'batch_parallel' in cases) and 'text_small' in corpora:
+            report['cases']['batch_parallel'] = _in_subprocess(_run_batch, corpora['text_small'])
+        return report
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Vergleicht Durchsatz, Gesamtlatenz und Spitzen-RSS mit einem früheren Lauf"""
+    lines = []
+    for name, result in current['cases'].items():
+        old = baseline.get('cases', {}).get(name)
+        if not old or 'skipped' in result or 'skipped' in old:
+            continue
+        metrics = [('Durchsatz', result.get('throughput_docs_per_s'), old.get('throughput_docs_per_s'), True),
+                   ('RSS', result.get('peak_rss_kb'), old.get('peak_rss_kb'), False)]
+        if 'latency' in result and 'latency' in old:
+            metrics.append(('p50 gesamt', result['latency']['total']['p50_ms'], old['latency']['total']['p50_ms'], False))
+        for label, new_value, old_value, higher_is_better in metrics:
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value * 100
+            better = change > 0 if higher_is_better else change < 0
+            lines.append(f'{name:15s} {label:11s} {old_value:12.1f} -> {new_value:12.1f} '
+                         f'({change:+6.1f}% {"besser" if better else "schlechter"})')
+    return lines
+
+
+def _print_report(report: Dict[str, Any]):
+    print(f"Revision {report['git_revision']}, Python {report['python']}, PyMuPDF {report['pymupdf']}, "
+          f"{report['cpu_count']} CPUs, tesseract: {'ja' if report['tesseract'] else 'nein'}")
+    for name, result in report['cases'].items():
+        if 'skipped' in result:
+            print(f'{name:15s} übersprungen ({result["skipped"]})')
+            continue
+        line = (f"{name:15s} {result['docs']:4d} Dok. {result['throughput_docs_per_s']:8.2f} Dok./s "
+                f"RSS {result['peak_rss_kb'] / 1024:7.1f} MB")
+        if 'latency' in result:
+            latency = result['latency']
+            line += ''.join(f" {stage} {latency[stage]['p50_ms']:8.1f} ms"
+                            for stage in ('extract', 'ocr', 'classify', 'total'))
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark-Suite für die PDF-Klassifikation')
+    parser.add_argument('--output', help='Ergebnis als JSON in diese Datei schreiben')
+    parser.add_argument('--compare', help='früheres JSON-Ergebnis zum Vergleich')
+    parser.add_argument('--scale', type=float, default=1.0, help='Faktor für die Anzahl der Dokumente je Fall')
+    parser.add_argument('--case', action='append', dest='cases',
+                        choices=list(CORPUS_CASES) + ['batch_parallel'], help='nur bestimmte Fälle ausführen')
+    args = parser.parse_args()
+
+    report = run(args.scale, args.cases)
+    _print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        for line in compare(report, baseline):
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -41,6 +41,8 @@ from backend.api.routes_hardware import router as hardware_router
 from backend.api.routes_health import router as health_router
 from backend.api.routes_dashboard import router as dashboard_router
 from backend.api.routes_calendar import router as calendar_router
+from backend.api.routes_classification import router as classification_router
+from backend.api.routes_search import router as search_router
 from backend.auth import mandant_isolation_middleware
 
 app = FastAPI(title="BestNote API")
@@ -67,6 +69,8 @@ app.include_router(hardware_router)
 app.include_router(health_router)
 app.include_router(dashboard_router, prefix="/dashboard", tags=["dashboard"])
 app.include_router(calendar_router, tags=["calendar"])
+app.include_router(classification_router, prefix="/classification", tags=["classification"])
+app.include_router(search_router, prefix="/search", tags=["search"])
 from fastapi import FastAPI
 
 from backend.api.routes_mandant import router as mandant_router
@@ -100,3 +104,41 @@ app.include_router(import_router, prefix="/import", tags=["import"])
 app.include_router(hardware_router)
 app.include_router(health_router)
 app.include_router(dashboard_router, prefix="/dashboard", tags=["dashboard"])
+
+# Dateikatalog im Hintergrund mit dem Speicher abgleichen (fängt Änderungen außerhalb der Import-Pfade auf)
+from backend.api.routes_dashboard import file_catalog
+
+@app.on_event("startup")
+def start_file_catalog_reconciler():
+	file_catalog.start_reconciler()
+
+@app.on_event("shutdown")
+def stop_file_catalog_reconciler():
+	file_catalog.stop_reconciler()
+
+# Gemeinsamer Prozess-Pool der PDF-Dienste: Worker beim Herunterfahren beenden
+from backend.services.process_pool import process_pool
+
+@app.on_event("shutdown")
+def stop_process_pool():
+	process_pool.shutdown()
+
+# Klassifikations-Dienste: Prozess-Pools laufender Batch-Analysen beim Herunterfahren beenden
+from backend.api.routes_classification import classification_service
+from backend.api.routes_import import import_service
+
+@app.on_event("shutdown")
+def stop_classification_pools():
+	classification_service.close()
+	import_service.search_index.extractor.close()
+
+# Liegen gebliebene fortsetzbare Uploads auch ohne neue Uploads regelmäßig löschen
+from backend.api.routes_import import upload_store
+
+@app.on_event("startup")
+def start_upload_collector():
+	upload_store.start_collector()
+
+@app.on_event("shutdown")
+def stop_upload_collector():
+	upload_store.stop_collector()
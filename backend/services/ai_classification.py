@@ -1,10 +1,100 @@
 import os
 import re
-from typing import Dict, List, Any, Optional
-from pathlib import Path
+import json
+import hashlib
+import queue
+import sqlite3
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from collections import Counter, deque
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Tuple
+from backend.services.analysis_cache import AnalysisCache
+from backend.services.process_pool import start_method
+
+# Bei Änderungen an der Klassifikationslogik erhöhen, damit gespeicherte Ergebnisse verfallen
+CLASSIFIER_VERSION = 1
+
+# Meldungen, die _ocr_pdf anstelle eines erkannten Texts zurückgibt
+OCR_ERROR_PREFIXES = ("OCR-Abhängigkeiten fehlen", "OCR fehlgeschlagen")
+# Sprachen für tesseract
+OCR_LANGUAGES = 'deu+eng'
+
+
+class KeywordMatcher:
+    """Zählt Vorkommen vieler Schlüsselwörter in einem einzigen Durchlauf über den Text.
+
+    Die Schlüsselwörter werden zu einem Trie zusammengefasst und als ein einziger
+    regulärer Ausdruck kompiliert (Aho-Corasick-ähnlich). An jeder Textposition
+    liefert der Ausdruck das längste dort beginnende Schlüsselwort; alle kürzeren
+    Schlüsselwörter an derselben Position sind dessen Präfixe und werden mitgezählt.
+    Damit entsprechen die Treffer exakt der Semantik von ``keyword in text``.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = sorted(set(k for k in keywords if k))
+        # Für jedes Schlüsselwort alle Schlüsselwörter, die Präfix davon sind (inkl. sich selbst)
+        self._prefixes = {
+            keyword: [other for other in self.keywords if keyword.startswith(other)]
+            for keyword in self.keywords
+        }
+        trie: Dict[str, Any] = {}
+        for keyword in self.keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = True
+        self._pattern = re.compile('(?=(' + self._trie_to_regex(trie) + '))') if self.keywords else None
+
+    def _trie_to_regex(self, node: Dict[str, Any]) -> str:
+        """Wandelt einen Trie-Knoten in einen regulären Ausdruck um (längster Treffer zuerst)"""
+        branches = [re.escape(char) + self._trie_to_regex(child)
+                    for char, child in sorted(node.items()) if char != '']
+        if not branches:
+            return ''
+        if len(branches) == 1 and '' not in node:
+            return branches[0]
+        body = '(?:' + '|'.join(branches) + ')'
+        return body + '?' if '' in node else body
+
+    def count(self, text: str) -> Counter:
+        """Gibt die Anzahl der (überlappenden) Vorkommen je Schlüsselwort zurück"""
+        hits: Counter = Counter()
+        if not text or self._pattern is None:
+            return hits
+        for longest, occurrences in Counter(self._pattern.findall(text)).items():
+            for keyword in self._prefixes[longest]:
+                hits[keyword] += occurrences
+        return hits
+
 
 class AIClassificationService:
-    def __init__(self):
+    def __init__(self, pool_size: Optional[int] = None, file_timeout: float = 120.0,
+                 cache_path: Optional[str] = '/tmp/bestnote_data/analysis_cache.sqlite3',
+                 ocr_dpi: int = 144, ocr_max_pages: int = 5, ocr_workers: Optional[int] = None,
+                 ocr_confidence_threshold: Optional[float] = 0.9, max_text_chars: Optional[int] = 2_000_000,
+                 max_text_pages: Optional[int] = None, head_pages: int = 2, mp_context: Optional[str] = None):
+        # Text wird seitenweise gestreamt und nach max_text_chars/max_text_pages abgeschnitten;
+        # Titel- und Komponisten-Heuristiken sehen nur die ersten head_pages Seiten
+        self.max_text_chars = max_text_chars
+        self.max_text_pages = max_text_pages
+        self.head_pages = head_pages
+        # Render-Auflösung für OCR (144 dpi entspricht der bisherigen 2x-Skalierung)
+        self.ocr_dpi = ocr_dpi
+        # Seiten-OCR läuft parallel in Threads (tesseract ist ein eigener Prozess) und stoppt,
+        # sobald die bisher erkannten Seiten die Konfidenzschwelle erreichen (None: alle Seiten)
+        self.ocr_max_pages = ocr_max_pages
+        self.ocr_workers = max(1, ocr_workers or min(ocr_max_pages, os.cpu_count() or 1))
+        self.ocr_confidence_threshold = ocr_confidence_threshold
+        # Prozess-Pool je paralleler Batch-Analyse (höchstens pool_size Worker)
+        self.pool_size = max(1, pool_size or os.cpu_count() or 1)
+        self.file_timeout = file_timeout
+        self.mp_context = mp_context or start_method()
+        # Pools laufender Batch-Analysen (jede Analyse hat ihren eigenen, siehe _iter_parallel)
+        self._pools = set()
+        self._pool_lock = threading.Lock()
+
         # Genre-Klassifikation basierend auf Schlüsselwörtern
         self.genre_keywords = {
             'klassisch': ['symphonie', 'konzert', 'sonate', 'quartett', 'sinfonie', 'op.', 'opus', 'beethoven', 'mozart', 'bach', 'haydn', 'schubert'],
@@ -31,24 +121,138 @@ class AIClassificationService:
             'zupfinstrumente': ['gitarre', 'harfe', 'mandoline', 'guitar', 'harp']
         }
 
-    def analyze_pdf(self, pdf_path: str) -> Dict[str, Any]:
-        """Analysiert ein PDF und extrahiert Metadaten mittels OCR und KI-Klassifikation"""
+        # Bekannte Komponisten (Reihenfolge bestimmt die Priorität)
+        self.composers = [
+            'beethoven', 'mozart', 'bach', 'haydn', 'schubert', 'brahms', 'wagner',
+            'chopin', 'liszt', 'schumann', 'handel', 'vivaldi', 'telemann', 'debussy',
+            'ravel', 'strauss', 'mahler', 'bruckner', 'dvorak', 'tschaikowsky'
+        ]
+
+        # Technische Begriffe als Fallback für den Schwierigkeitsgrad
+        self.complex_indicators = ['divisi', 'soli', 'tutti', 'accelerando', 'ritardando', 'crescendo', 'diminuendo']
+
+        # Besetzungsgrößen (Reihenfolge bestimmt die Priorität)
+        self.size_indicators = {
+            'solo': ['solo', 'solist'],
+            'kammerensemble': ['duo', 'trio', 'quartett', 'quintett', 'sextett'],
+            'kleines_orchester': ['kleines orchester', 'kammerorchester', 'sinfonietta'],
+            'großes_orchester': ['orchester', 'sinfonie', 'philharmonie', 'symphony']
+        }
+
+        # Musikbegriffe, die die Konfidenz erhöhen
+        self.music_terms = ['noten', 'takt', 'tonart', 'tempo', 'andante', 'allegro', 'piano', 'forte']
+
+        # Ein gemeinsamer Matcher für alle Schlüsselwort-Tabellen: ein Textdurchlauf pro Analyse
+        self.matcher = KeywordMatcher(self._all_keywords())
+
+        # Persistenter Ergebnis-Cache, Schlüssel: Inhalts-Hash + Regel-Version
+        self.rules_version = self._compute_rules_version()
+        self.cache_path = cache_path
+        self.cache: Optional[AnalysisCache] = None
+        if cache_path:
+            try:
+                self.cache = AnalysisCache(cache_path)
+            except (OSError, sqlite3.Error):
+                self.cache = None
+
+    def _compute_rules_version(self) -> str:
+        """Version der Klassifikationsregeln (ändert sich mit jeder Schlüsselwort-Tabelle)"""
+        rules = {
+            'classifier_version': CLASSIFIER_VERSION,
+            'genre_keywords': self.genre_keywords,
+            'difficulty_indicators': self.difficulty_indicators,
+            'instrument_keywords': self.instrument_keywords,
+            'composers': self.composers,
+            'complex_indicators': self.complex_indicators,
+            'size_indicators': self.size_indicators,
+            'music_terms': self.music_terms,
+            'text_budget': [self.max_text_chars, self.max_text_pages, self.head_pages],
+            # OCR-Einstellungen bestimmen den erkannten Text gescannter PDFs
+            'ocr': [OCR_LANGUAGES, self.ocr_dpi, self.ocr_max_pages, self.ocr_confidence_threshold]
+        }
+        encoded = json.dumps(rules, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()[:16]
+
+    def invalidate_cache(self, all_entries: bool = False) -> int:
+        """Entfernt Cache-Einträge veralteter Regel-Versionen (oder alle)"""
+        if self.cache is None:
+            return 0
+        return self.cache.invalidate(None if all_entries else self.rules_version)
+
+    def _all_keywords(self) -> List[str]:
+        """Sammelt alle Schlüsselwörter aus den Klassifikations-Tabellen"""
+        keywords = list(self.composers) + list(self.complex_indicators) + list(self.music_terms)
+        for table in (self.genre_keywords, self.difficulty_indicators,
+                      self.instrument_keywords, self.size_indicators):
+            for words in table.values():
+                keywords.extend(words)
+        return keywords
+
+    def analyze_pdf(self, pdf_path: str, ocr_dpi: Optional[int] = None, include_text: bool = False) -> Dict[str, Any]:
+        """Analysiert ein PDF und extrahiert Metadaten mittels OCR und KI-Klassifikation
+
+        Der Cache wird nur mit der Standard-Auflösung ``self.ocr_dpi`` verwendet. Mit
+        ``include_text`` enthält das Ergebnis zusätzlich den extrahierten Text
+        (``text``, Originalschreibung, leer bei fehlgeschlagener OCR) für den
+        Suchindex; gelesen wird dann nicht aus dem Cache, geschrieben schon.
+        """
+        content_hash = None
+        if self.cache is not None and ocr_dpi in (None, self.ocr_dpi):
+            try:
+                content_hash = self.cache.hash_file(pdf_path)
+                cached = None if include_text else self.cache.get(content_hash, self.rules_version)
+                if cached is not None:
+                    return cached
+            except (OSError, sqlite3.Error):
+                pass
+
         try:
-            # PDF-Text extrahieren
-            text = self._extract_text_from_pdf(pdf_path)
+            # PDF-Text seitenweise verarbeiten: ein Durchlauf pro Seite liefert die Treffer
+            # für alle Klassifikatoren, nur die ersten Seiten werden für Titel/Komponist behalten
+            hits: Counter = Counter()
+            head_hits: Counter = Counter()
+            head = []
+            sample = ''
+            text_length = 0
+            pages = []
+            for page_num, original in enumerate(self._iter_page_texts(pdf_path, ocr_dpi, lowercase=False)):
+                if include_text:
+                    pages.append(original)
+                page_text = original.lower()
+                page_hits = self.matcher.count(page_text)
+                hits.update(page_hits)
+                text_length += len(page_text)
+                if page_num < self.head_pages:
+                    head.append(page_text)
+                    head_hits.update(page_hits)
+                if len(sample) < 500:
+                    sample += page_text[:500 - len(sample)]
+            head_text = ''.join(head)
+
+            composer = self._extract_composer(head_text, head_hits)
+            instruments = self._extract_instruments(head_text, hits)
 
             # Metadaten analysieren
             analysis = {
-                'title': self._extract_title(text),
-                'composer': self._extract_composer(text),
-                'genre': self._classify_genre(text),
-                'difficulty': self._classify_difficulty(text),
-                'instruments': self._extract_instruments(text),
-                'ensemble_size': self._estimate_ensemble_size(text),
-                'confidence': self._calculate_confidence(text),
-                'raw_text_sample': text[:500] if text else ''
+                'title': self._extract_title(head_text),
+                'composer': composer,
+                'genre': self._classify_genre(head_text, hits),
+                'difficulty': self._classify_difficulty(head_text, hits),
+                'instruments': instruments,
+                'ensemble_size': self._estimate_ensemble_size(head_text, hits, instruments),
+                'confidence': self._calculate_confidence(head_text, hits, composer is not None, text_length),
+                'raw_text_sample': sample
             }
 
+            # Fehlgeschlagene OCR (z.B. tesseract vorübergehend nicht verfügbar) nicht dauerhaft speichern
+            if content_hash is not None and not self._is_ocr_error(sample):
+                try:
+                    self.cache.put(content_hash, self.rules_version, analysis)
+                except sqlite3.Error:
+                    pass
+
+            if include_text:
+                analysis = dict(analysis, text='' if self._is_ocr_error(sample) else ''.join(pages))
             return analysis
 
         except Exception as e:
@@ -57,62 +261,141 @@ class AIClassificationService:
                 'confidence': 0
             }
 
-    def _extract_text_from_pdf(self, pdf_path: str) -> str:
+    @staticmethod
+    def _is_ocr_error(text: str) -> bool:
+        """Erkennt eine Fehlermeldung von ``_ocr_pdf`` (auch kleingeschrieben) statt eines Texts"""
+        return text.lower().startswith(tuple(prefix.lower() for prefix in OCR_ERROR_PREFIXES))
+
+    def _extract_text_from_pdf(self, pdf_path: str, ocr_dpi: Optional[int] = None) -> str:
         """Extrahiert Text aus PDF mittels PyMuPDF und OCR als Fallback"""
+        return "".join(self._iter_page_texts(pdf_path, ocr_dpi))
+
+    def _iter_page_texts(self, pdf_path: str, ocr_dpi: Optional[int] = None, lowercase: bool = True) -> Iterator[str]:
+        """Liefert den Text seitenweise (kleingeschrieben) innerhalb des Text-Budgets
+
+        Seiten werden zurückgehalten, bis feststeht, dass das Dokument genug Text enthält
+        (mindestens 100 Zeichen); andernfalls wird stattdessen der OCR-Text geliefert.
+        """
         try:
             import fitz  # PyMuPDF für PDF-Verarbeitung
         except ImportError:
             raise ImportError("PyMuPDF (fitz) ist nicht installiert. Installieren Sie es mit: pip install PyMuPDF")
 
-        text = ""
+        convert = str.lower if lowercase else str
+        budget = self.max_text_chars
+        pending = []
+        streaming = False
 
         try:
             # Versuche zuerst direkte Textextraktion
             with fitz.open(pdf_path) as doc:
-                for page in doc:
-                    page_text = page.get_text()
-                    text += page_text + "\n"
-
-            # Wenn wenig Text gefunden wurde, verwende OCR
-            if len(text.strip()) < 100:
-                text = self._ocr_pdf(pdf_path)
-
-        except Exception as e:
-            # Fallback auf OCR
-            text = self._ocr_pdf(pdf_path)
-
-        return text.lower()
-
-    def _ocr_pdf(self, pdf_path: str) -> str:
-        """Führt OCR auf PDF-Seiten durch"""
+                for page_num, page in enumerate(doc):
+                    if self.max_text_pages is not None and page_num >= self.max_text_pages:
+                        break
+                    page_text = page.get_text() + "\n"
+                    if budget is not None:
+                        page_text = page_text[:budget]
+                        budget -= len(page_text)
+
+                    if streaming:
+                        yield convert(page_text)
+                    else:
+                        pending.append(page_text)
+                        if len("".join(pending).strip()) >= 100:
+                            streaming = True
+                            for text in pending:
+                                yield convert(text)
+                            pending = []
+
+                    if budget is not None and budget <= 0:
+                        break
+
+        except Exception:
+            # Bereits gelieferte Seiten bleiben gültig, sonst Fallback auf OCR
+            if streaming:
+                return
+
+        # Wenn wenig Text gefunden wurde, verwende OCR
+        if not streaming:
+            text = convert(self._ocr_pdf(pdf_path, ocr_dpi))
+            yield text if self.max_text_chars is None else text[:self.max_text_chars]
+
+    def _ocr_pdf(self, pdf_path: str, dpi: Optional[int] = None) -> str:
+        """Führt OCR auf PDF-Seiten durch
+
+        Die Seiten werden nacheinander gerendert und parallel erkannt. Sobald die Seiten
+        1..k vollständig vorliegen und ihre Konfidenz ``ocr_confidence_threshold`` erreicht,
+        werden keine weiteren Seiten mehr erkannt.
+        """
         try:
             import fitz  # PyMuPDF für PDF-Verarbeitung
             import pytesseract
-            from PIL import Image
-            import io
         except ImportError as e:
             return f"OCR-Abhängigkeiten fehlen: {str(e)}"
 
-        text = ""
+        page_texts: Dict[int, str] = {}
+        executor = ThreadPoolExecutor(max_workers=self.ocr_workers)
 
         try:
             with fitz.open(pdf_path) as doc:
-                for page_num in range(min(5, len(doc))):  # Nur erste 5 Seiten
-                    page = doc[page_num]
-                    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x Auflösung
-
-                    # Konvertiere zu PIL Image
-                    img_data = pix.tobytes("png")
-                    img = Image.open(io.BytesIO(img_data))
-
-                    # OCR durchführen
-                    page_text = pytesseract.image_to_string(img, lang='deu+eng')
-                    text += page_text + "\n"
+                page_count = min(self.ocr_max_pages, len(doc))  # Nur die ersten Seiten
+                futures = {}
+                next_page = 0
+                while next_page < page_count or futures:
+                    # Höchstens ocr_workers gerenderte Seiten gleichzeitig im Speicher
+                    while next_page < page_count and len(futures) < self.ocr_workers:
+                        pix, img = self._render_page_gray(doc[next_page], dpi or self.ocr_dpi)
+                        futures[executor.submit(self._ocr_image, pytesseract, pix, img)] = next_page
+                        next_page += 1
+
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        page_texts[futures.pop(future)] = future.result()
+
+                    if self._ocr_confident(page_texts):
+                        break
 
         except Exception as e:
             return f"OCR fehlgeschlagen: {str(e)}"
-
-        return text
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return self._join_pages(page_texts)
+
+    @staticmethod
+    def _ocr_image(pytesseract, pix, img) -> str:
+        """OCR einer gerenderten Seite (``pix`` hält den Bildpuffer am Leben)"""
+        return pytesseract.image_to_string(img, lang=OCR_LANGUAGES)
+
+    @staticmethod
+    def _join_pages(page_texts: Dict[int, str]) -> str:
+        """Fügt die zusammenhängend erkannten Seiten ab Seite 1 zusammen"""
+        text = []
+        page_num = 0
+        while page_num in page_texts:
+            text.append(page_texts[page_num] + "\n")
+            page_num += 1
+        return "".join(text)
+
+    def _ocr_confident(self, page_texts: Dict[int, str]) -> bool:
+        """Prüft, ob die bisher erkannten Seiten die Konfidenzschwelle erreichen"""
+        if self.ocr_confidence_threshold is None:
+            return False
+        text = self._join_pages(page_texts).lower()
+        return self._calculate_confidence(text) >= self.ocr_confidence_threshold
+
+    @staticmethod
+    def _render_page_gray(page, dpi: int):
+        """Rendert eine Seite als Graustufen-Pixmap und bindet deren Puffer ohne Kopie als PIL-Bild ein
+
+        Das Bild verweist auf den Speicher der Pixmap; beide müssen bis nach der OCR leben.
+        """
+        import fitz
+        from PIL import Image
+
+        pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+        img = Image.frombuffer('L', (pix.width, pix.height), pix.samples_mv, 'raw', 'L', pix.stride, 1)
+        return pix, img
 
     def _extract_title(self, text: str) -> Optional[str]:
         """Extrahiert den Titel aus dem Text"""
@@ -133,17 +416,14 @@ class AIClassificationService:
 
         return None
 
-    def _extract_composer(self, text: str) -> Optional[str]:
+    def _extract_composer(self, text: str, hits: Optional[Counter] = None) -> Optional[str]:
         """Extrahiert den Komponisten aus dem Text"""
-        # Bekannte Komponisten
-        composers = [
-            'beethoven', 'mozart', 'bach', 'haydn', 'schubert', 'brahms', 'wagner',
-            'chopin', 'liszt', 'schumann', 'handel', 'vivaldi', 'telemann', 'debussy',
-            'ravel', 'strauss', 'mahler', 'bruckner', 'dvorak', 'tschaikowsky'
-        ]
+        if hits is None:
+            hits = self.matcher.count(text)
 
-        for composer in composers:
-            if composer in text:
+        # Bekannte Komponisten
+        for composer in self.composers:
+            if hits[composer]:
                 return composer.title()
 
         # Suche nach "von" oder "by" Pattern
@@ -159,12 +439,14 @@ class AIClassificationService:
 
         return None
 
-    def _classify_genre(self, text: str) -> str:
+    def _classify_genre(self, text: str, hits: Optional[Counter] = None) -> str:
         """Klassifiziert das Genre basierend auf Schlüsselwörtern"""
+        if hits is None:
+            hits = self.matcher.count(text)
         scores = {}
 
         for genre, keywords in self.genre_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in text)
+            score = sum(1 for keyword in keywords if hits[keyword])
             if score > 0:
                 scores[genre] = score
 
@@ -173,12 +455,14 @@ class AIClassificationService:
 
         return 'unbekannt'
 
-    def _classify_difficulty(self, text: str) -> str:
+    def _classify_difficulty(self, text: str, hits: Optional[Counter] = None) -> str:
         """Klassifiziert den Schwierigkeitsgrad"""
+        if hits is None:
+            hits = self.matcher.count(text)
         scores = {}
 
         for difficulty, indicators in self.difficulty_indicators.items():
-            score = sum(1 for indicator in indicators if indicator in text)
+            score = sum(1 for indicator in indicators if hits[indicator])
             if score > 0:
                 scores[difficulty] = score
 
@@ -186,8 +470,7 @@ class AIClassificationService:
             return max(scores, key=lambda x: scores[x])
 
         # Fallback: basierend auf technischer Komplexität
-        complex_indicators = ['divisi', 'soli', 'tutti', 'accelerando', 'ritardando', 'crescendo', 'diminuendo']
-        complex_score = sum(1 for indicator in complex_indicators if indicator in text)
+        complex_score = sum(1 for indicator in self.complex_indicators if hits[indicator])
 
         if complex_score > 3:
             return 'schwer'
@@ -196,32 +479,33 @@ class AIClassificationService:
 
         return 'unbekannt'
 
-    def _extract_instruments(self, text: str) -> List[str]:
+    def _extract_instruments(self, text: str, hits: Optional[Counter] = None) -> List[str]:
         """Extrahiert erwähnte Instrumente"""
+        if hits is None:
+            hits = self.matcher.count(text)
         instruments = []
 
         for category, keywords in self.instrument_keywords.items():
             for keyword in keywords:
-                if keyword in text and keyword not in instruments:
+                if hits[keyword] and keyword not in instruments:
                     instruments.append(keyword)
 
         return instruments[:10]  # Begrenze auf 10 Instrumente
 
-    def _estimate_ensemble_size(self, text: str) -> str:
+    def _estimate_ensemble_size(self, text: str, hits: Optional[Counter] = None,
+                                instruments: Optional[List[str]] = None) -> str:
         """Schätzt die Ensemble-Größe"""
-        size_indicators = {
-            'solo': ['solo', 'solist'],
-            'kammerensemble': ['duo', 'trio', 'quartett', 'quintett', 'sextett'],
-            'kleines_orchester': ['kleines orchester', 'kammerorchester', 'sinfonietta'],
-            'großes_orchester': ['orchester', 'sinfonie', 'philharmonie', 'symphony']
-        }
+        if hits is None:
+            hits = self.matcher.count(text)
 
-        for size, indicators in size_indicators.items():
-            if any(indicator in text for indicator in indicators):
+        for size, indicators in self.size_indicators.items():
+            if any(hits[indicator] for indicator in indicators):
                 return size
 
         # Fallback basierend auf Instrumenten-Anzahl
-        instrument_count = len(self._extract_instruments(text))
+        if instruments is None:
+            instruments = self._extract_instruments(text, hits)
+        instrument_count = len(instruments)
         if instrument_count == 1:
             return 'solo'
         elif instrument_count <= 5:
@@ -231,45 +515,189 @@ class AIClassificationService:
         else:
             return 'großes_orchester'
 
-    def _calculate_confidence(self, text: str) -> float:
-        """Berechnet die Konfidenz der Analyse"""
-        if not text:
+    def _calculate_confidence(self, text: str, hits: Optional[Counter] = None,
+                              composer_found: Optional[bool] = None, text_length: Optional[int] = None) -> float:
+        """Berechnet die Konfidenz der Analyse (``text_length``: Länge des gesamten Texts)"""
+        if text_length is None:
+            text_length = len(text)
+        if not text_length:
             return 0.0
+        if hits is None:
+            hits = self.matcher.count(text)
 
         # Faktoren für Konfidenz
         confidence = 0.5  # Basis-Konfidenz
 
         # Mehr Text = höhere Konfidenz
-        if len(text) > 1000:
+        if text_length > 1000:
             confidence += 0.2
-        elif len(text) > 500:
+        elif text_length > 500:
             confidence += 0.1
 
         # Spezifische Musik-Begriffe erhöhen Konfidenz
-        music_terms = ['noten', 'takt', 'tonart', 'tempo', 'andante', 'allegro', 'piano', 'forte']
-        music_score = sum(1 for term in music_terms if term in text)
+        music_score = sum(1 for term in self.music_terms if hits[term])
         confidence += min(music_score * 0.05, 0.2)
 
         # Bekannte Komponisten erhöhen Konfidenz
-        composer_found = self._extract_composer(text) is not None
+        if composer_found is None:
+            composer_found = self._extract_composer(text, hits) is not None
         if composer_found:
             confidence += 0.1
 
         return min(confidence, 1.0)
 
-    def batch_analyze(self, pdf_paths: List[str]) -> List[Dict[str, Any]]:
-        """Analysiert mehrere PDFs auf einmal"""
+    def batch_analyze(self, pdf_paths: List[str], parallel: bool = False, ordered: bool = True,
+                      timeout: Optional[float] = None, include_text: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """Analysiert mehrere PDFs auf einmal
+
+        Mit ``parallel=True`` werden die Dateien auf den Prozess-Pool verteilt. Jede Datei
+        hat ein hartes Zeitlimit (``timeout`` bzw. ``file_timeout``); blockierte Worker werden
+        beendet. Mit ``ordered=False`` kommen die Ergebnisse in Fertigstellungsreihenfolge.
+        Für die Pfade in ``include_text`` enthält das Ergebnis auch den Text (siehe ``analyze_pdf``).
+        """
+        include_text = set(include_text)
+        if parallel:
+            results = self._iter_parallel(pdf_paths, timeout, include_text)
+            if ordered:
+                return [result for _, result in sorted(results, key=lambda item: item[0])]
+            return [result for _, result in results]
+
         results = []
         for pdf_path in pdf_paths:
             try:
-                analysis = self.analyze_pdf(pdf_path)
+                analysis = self.analyze_pdf(pdf_path, include_text=pdf_path in include_text)
                 analysis['file_path'] = pdf_path
                 results.append(analysis)
             except Exception as e:
-                results.append({
-                    'file_path': pdf_path,
-                    'error': str(e),
-                    'confidence': 0
-                })
+                results.append(self._error_result(pdf_path, str(e)))
+
+        return results
+
+    def iter_batch_analyze(self, pdf_paths: List[str], timeout: Optional[float] = None,
+                           include_text: Iterable[str] = ()) -> Iterator[Dict[str, Any]]:
+        """Analysiert PDFs parallel und liefert die Ergebnisse, sobald sie fertig sind"""
+        for _, result in self._iter_parallel(pdf_paths, timeout, set(include_text)):
+            yield result
+
+    def close(self):
+        """Beendet die Prozess-Pools laufender Batch-Analysen"""
+        with self._pool_lock:
+            pools, self._pools = self._pools, set()
+        for pool in pools:
+            pool.terminate()
+            pool.join()
+
+    def _error_result(self, pdf_path: str, error: str) -> Dict[str, Any]:
+        return {
+            'file_path': pdf_path,
+            'error': error,
+            'confidence': 0
+        }
+
+    def _open_pool(self, size: int):
+        """Startet einen Pool für eine Batch-Analyse"""
+        context = multiprocessing.get_context(self.mp_context)
+        pool = context.Pool(size, initializer=_init_worker, initargs=(self._worker_options(),))
+        with self._pool_lock:
+            self._pools.add(pool)
+        return pool
+
+    def _close_pool(self, pool):
+        """Beendet einen Pool samt blockierter Worker"""
+        with self._pool_lock:
+            self._pools.discard(pool)
+        pool.terminate()
+        pool.join()
+
+    def _worker_options(self) -> Dict[str, Any]:
+        """Konfiguration der Service-Instanzen in den Worker-Prozessen"""
+        return {
+            'cache_path': self.cache_path,
+            'ocr_dpi': self.ocr_dpi,
+            'ocr_max_pages': self.ocr_max_pages,
+            # Die Prozesse nutzen bereits alle Kerne; Seiten-OCR pro Datei daher nicht zusätzlich parallel
+            'ocr_workers': 1,
+            'ocr_confidence_threshold': self.ocr_confidence_threshold,
+            'max_text_chars': self.max_text_chars,
+            'max_text_pages': self.max_text_pages,
+            'head_pages': self.head_pages
+        }
+
+    def _iter_parallel(self, pdf_paths: List[str], timeout: Optional[float],
+                       include_text: Optional[set] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Verteilt die Analysen auf einen eigenen Pool und liefert (Index, Ergebnis) in Fertigstellungsreihenfolge
+
+        Der Pool gehört nur diesem Aufruf: läuft eine Datei in das Zeitlimit, wird er beendet
+        und neu gestartet, ohne gleichzeitige Analysen anderer Aufrufer zu treffen.
+        """
+        timeout = timeout or self.file_timeout
+        size = max(1, min(self.pool_size, len(pdf_paths)))
+        pending = deque(enumerate(pdf_paths))
+        in_flight: Dict[int, Tuple[str, float]] = {}  # index -> (pfad, deadline)
+        done: queue.Queue = queue.Queue()
+        pool = None
+        generation = 0  # zählt Neustarts, damit Meldungen eines beendeten Pools verworfen werden
 
-        return results
\ No newline at end of file
+        try:
+            while pending or in_flight:
+                if pool is None:
+                    pool = self._open_pool(size)
+                # Höchstens size Aufgaben gleichzeitig, damit die Deadline ab Arbeitsbeginn zählt
+                while pending and len(in_flight) < size:
+                    index, pdf_path = pending.popleft()
+                    pool.apply_async(
+                        _analyze_in_worker, (pdf_path, bool(include_text) and pdf_path in include_text),
+                        callback=lambda result, i=index, g=generation: done.put((i, g, result, None)),
+                        error_callback=lambda exc, i=index, g=generation: done.put((i, g, None, exc))
+                    )
+                    in_flight[index] = (pdf_path, time.monotonic() + timeout)
+
+                remaining = min(deadline for _, deadline in in_flight.values()) - time.monotonic()
+                try:
+                    index, task_generation, result, exc = done.get(timeout=max(0.0, min(remaining, 1.0)))
+                except queue.Empty:
+                    index = None
+
+                if index is not None:
+                    if task_generation == generation and index in in_flight:
+                        pdf_path = in_flight.pop(index)[0]
+                        yield index, result if exc is None else self._error_result(pdf_path, str(exc))
+                    continue
+
+                now = time.monotonic()
+                expired = [i for i, (_, deadline) in in_flight.items() if deadline <= now]
+                if not expired:
+                    continue
+
+                # Blockierten Pool beenden und die übrigen laufenden Aufgaben erneut einreihen
+                timed_out = [(i, in_flight.pop(i)[0]) for i in expired]
+                self._close_pool(pool)
+                pool = None
+                generation += 1
+                for i in sorted(in_flight, reverse=True):
+                    pending.appendleft((i, in_flight.pop(i)[0]))
+                for i, pdf_path in timed_out:
+                    yield i, self._error_result(pdf_path, f'Zeitüberschreitung nach {timeout:g}s')
+        finally:
+            if pool is not None:
+                self._close_pool(pool)
+
+
+# Service-Instanz im Worker-Prozess (wird vom Pool-Initializer gesetzt)
+_worker_service: Optional[AIClassificationService] = None
+
+
+def _init_worker(options: Dict[str, Any]):
+    global _worker_service
+    _worker_service = AIClassificationService(**options)
+
+
+def _analyze_in_worker(pdf_path: str, include_text: bool = False) -> Dict[str, Any]:
+    """Analysiert ein PDF im Worker-Prozess"""
+    service = _worker_service or AIClassificationService()
+    try:
+        analysis = service.analyze_pdf(pdf_path, include_text=include_text)
+        analysis['file_path'] = pdf_path
+        return analysis
+    except Exception as e:
+        return service._error_result(pdf_path, str(e))
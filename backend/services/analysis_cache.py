@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Dict, Any, Optional
+
+
+class AnalysisCache:
+    """Persistenter Cache für PDF-Analyseergebnisse (SQLite)
+
+    Schlüssel ist der SHA-256 des PDF-Inhalts zusammen mit der Version der
+    Klassifikationsregeln. Überschreitet der Cache ``max_bytes``, werden die am
+    längsten nicht genutzten Einträge entfernt.
+    """
+
+    def __init__(self, db_path: str = '/tmp/bestnote_data/analysis_cache.sqlite3', max_bytes: int = 64 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS analysis_cache (
+                    content_hash TEXT NOT NULL,
+                    rules_version TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (content_hash, rules_version)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_analysis_cache_access ON analysis_cache (last_access)')
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    @staticmethod
+    def hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+        """Berechnet den SHA-256 des Dateiinhalts"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get(self, content_hash: str, rules_version: str) -> Optional[Dict[str, Any]]:
+        """Liefert ein gespeichertes Ergebnis oder None"""
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                'SELECT result FROM analysis_cache WHERE content_hash = ? AND rules_version = ?',
+                (content_hash, rules_version)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                'UPDATE analysis_cache SET last_access = ? WHERE content_hash = ? AND rules_version = ?',
+                (time.time(), content_hash, rules_version)
+            )
+        return json.loads(row[0])
+
+    def put(self, content_hash: str, rules_version: str, result: Dict[str, Any]):
+        """Speichert ein Ergebnis und verdrängt bei Bedarf alte Einträge"""
+        payload = json.dumps(result, ensure_ascii=False)
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO analysis_cache VALUES (?, ?, ?, ?, ?, ?)',
+                (content_hash, rules_version, payload, len(payload.encode('utf-8')), now, now)
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Entfernt die am längsten nicht genutzten Einträge, bis max_bytes eingehalten ist"""
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM analysis_cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        victims = []
+        for rowid, size in conn.execute('SELECT rowid, size FROM analysis_cache ORDER BY last_access'):
+            victims.append((rowid,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany('DELETE FROM analysis_cache WHERE rowid = ?', victims)
+
+    def invalidate(self, keep_version: Optional[str] = None) -> int:
+        """Löscht alle Einträge (bzw. alle außer ``keep_version``) und gibt die Anzahl zurück"""
+        with closing(self._connect()) as conn, conn:
+            if keep_version is None:
+                cursor = conn.execute('DELETE FROM analysis_cache')
+            else:
+                cursor = conn.execute('DELETE FROM analysis_cache WHERE rules_version != ?', (keep_version,))
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Gibt Anzahl und Gesamtgröße der Einträge zurück"""
+        with closing(self._connect()) as conn:
+            entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analysis_cache').fetchone()
+        return {'entries': entries, 'size': size, 'max_bytes': self.max_bytes}
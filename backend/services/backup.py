@@ -5,11 +5,20 @@ import shutil
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 from pathlib import Path
+from backend.services.file_catalog import FileCatalog
+from backend.services.zip_compression import CompressionPolicy
+
+# Pfade mit bereits gesichertem Inhalt -> Pfad des gesicherten Exemplars (relativ zu files/mandant_<id>/)
+DUPLICATES_FILE = 'duplicates.json'
 
 class BackupService:
-    def __init__(self, backup_dir: str = '/tmp/bestnote_backups'):
+    def __init__(self, backup_dir: str = '/tmp/bestnote_backups', data_dir: str = '/tmp/bestnote_data',
+                 compression: Optional[CompressionPolicy] = None, catalog: Optional[FileCatalog] = None):
         self.backup_dir = Path(backup_dir)
         self.backup_dir.mkdir(exist_ok=True)
+        self.data_dir = Path(data_dir)
+        self.compression = compression or CompressionPolicy()
+        self.catalog = catalog or FileCatalog(data_dir)
 
     def create_backup(self, mandant_id: int, include_files: bool = True, include_database: bool = True) -> Dict[str, Any]:
         """Erstellt ein vollständiges Backup für einen Mandanten"""
@@ -18,15 +27,15 @@ class BackupService:
         backup_path = self.backup_dir / backup_filename
 
         try:
-            with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            with self.compression.open_zip(backup_path) as zipf:
                 # Metadaten hinzufügen
                 metadata = self._create_backup_metadata(mandant_id, timestamp, include_files, include_database)
-                zipf.writestr('backup_metadata.json', json.dumps(metadata, indent=2, ensure_ascii=False))
+                self.compression.write_bytes(zipf, 'backup_metadata.json', json.dumps(metadata, indent=2, ensure_ascii=False).encode('utf-8'))
 
                 if include_database:
                     # Datenbank-Dump (simuliert)
                     db_data = self._export_database_data(mandant_id)
-                    zipf.writestr('database_export.json', json.dumps(db_data, indent=2, ensure_ascii=False))
+                    self.compression.write_bytes(zipf, 'database_export.json', json.dumps(db_data, indent=2, ensure_ascii=False).encode('utf-8'))
 
                 if include_files:
                     # Dateien hinzufügen (simuliert)
@@ -213,11 +222,31 @@ class BackupService:
         }
 
     def _add_files_to_backup(self, zipf: zipfile.ZipFile, mandant_id: int):
-        """Fügt Dateien zum Backup hinzu (simuliert)"""
-        # Hier würden echte Dateien hinzugefügt werden
-        # Für Demo: Platzhalter-Dateien erstellen
-        placeholder_content = f'Platzhalter für Mandant {mandant_id}'
-        zipf.writestr(f'files/mandant_{mandant_id}/readme.txt', placeholder_content)
+        """Fügt die Dateien des Mandanten laut Dateikatalog zum Backup hinzu (Kompression je nach Dateityp)"""
+        mandant_dir = self.data_dir / f'mandant_{mandant_id}'
+        if not mandant_dir.is_dir():
+            # Für Demo: Platzhalter-Datei erstellen
+            placeholder_content = f'Platzhalter für Mandant {mandant_id}'
+            self.compression.write_bytes(zipf, f'files/mandant_{mandant_id}/readme.txt', placeholder_content.encode('utf-8'))
+            return
+
+        # Gleiche Inhalte (laut SHA-256 im Katalog) nur einmal sichern, weitere Pfade verweisen darauf
+        written: Dict[str, str] = {}
+        duplicates: Dict[str, str] = {}
+        for entry in self.catalog.list_files(mandant_id):
+            file_path = self.catalog.absolute_path(mandant_id, entry['path'])
+            if not os.path.exists(file_path):
+                # Seit dem letzten Katalog-Abgleich gelöscht
+                continue
+            if entry['sha256'] in written:
+                duplicates[entry['path']] = written[entry['sha256']]
+                continue
+            written[entry['sha256']] = entry['path']
+            for _ in self.compression.write_file(zipf, file_path, f"files/mandant_{mandant_id}/{entry['path']}"):
+                pass
+        if duplicates:
+            # Außerhalb von files/, damit keine Datei des Mandanten überschrieben wird
+            self.compression.write_bytes(zipf, DUPLICATES_FILE, json.dumps(duplicates, indent=2).encode('utf-8'))
 
     def _restore_database_data(self, db_file_path: Path, mandant_id: int) -> Dict[str, Any]:
         """Stellt Datenbank-Daten wieder her (simuliert)"""
@@ -232,13 +261,28 @@ class BackupService:
             return {'success': False, 'error': str(e)}
 
     def _restore_files(self, extract_dir: Path, mandant_id: int) -> Dict[str, Any]:
-        """Stellt Dateien wieder her (simuliert)"""
+        """Stellt Dateien wieder her (Übernahme in den Speicher simuliert)
+
+        Inhalte, die mehrfach vorkamen, liegen nur einmal im Backup; die weiteren
+        Pfade laut ``duplicates.json`` werden aus dem gesicherten Exemplar ergänzt.
+        """
         try:
-            files_dir = extract_dir / 'files'
-            if files_dir.exists():
-                # Hier würde die echte Datei-Import-Logik erfolgen
-                return {'success': True, 'files_restored': 5}
-            return {'success': True, 'files_restored': 0}
+            files_dir = extract_dir / 'files' / f'mandant_{mandant_id}'
+            if not files_dir.exists():
+                return {'success': True, 'files_restored': 0}
+            duplicates_path = extract_dir / DUPLICATES_FILE
+            if duplicates_path.exists():
+                duplicates = json.loads(duplicates_path.read_text(encoding='utf-8'))
+                root = files_dir.resolve()
+                for path, original in duplicates.items():
+                    target = (files_dir / path).resolve()
+                    source = (files_dir / original).resolve()
+                    if root not in target.parents or root not in source.parents:
+                        raise ValueError(f'Unzulässiger Pfad in {DUPLICATES_FILE}: {path}')
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copyfile(source, target)
+            # Hier würde die echte Datei-Import-Logik erfolgen
+            return {'success': True, 'files_restored': sum(1 for path in files_dir.rglob('*') if path.is_file())}
 
         except Exception as e:
             return {'success': False, 'error': str(e)}
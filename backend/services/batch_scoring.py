@@ -0,0 +1,146 @@
+from collections import Counter
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from backend.services.ai_classification import AIClassificationService
+
+
+def _import_numpy():
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("numpy ist nicht installiert. Installieren Sie es mit: pip install numpy")
+    return np
+
+
+class TermMatrix(NamedTuple):
+    """Dünn besetzte Dokument-Term-Matrix im CSR-Format (nur Terme mit Treffern)
+
+    Die Terme von Dokument ``i`` stehen in ``indices[indptr[i]:indptr[i + 1]]``.
+    Gespeichert wird nur die Anwesenheit: die Bewertung zählt jeden Term einmal,
+    unabhängig von der Trefferzahl (wie der Einzel-Pfad).
+    """
+    indptr: Any
+    indices: Any
+    shape: tuple
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def row_ids(self):
+        """Dokumentnummer je gespeichertem Eintrag"""
+        np = _import_numpy()
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+
+class BatchScoringEngine:
+    """Vektorisierte Genre-/Schwierigkeits-Klassifikation für viele Dokumente
+
+    Jedes Dokument wird zu einem Term-Count-Vektor über die Schlüsselwörter aus
+    ``genre_keywords``, ``difficulty_indicators`` und ``instrument_keywords``
+    (plus den Komplexitäts-Indikatoren für den Schwierigkeits-Fallback). Eine
+    Multiplikation der dünn besetzten Dokument-Term-Matrix (CSR, Speicher wächst
+    mit der Zahl der Treffer, nicht mit Dokumente x Vokabular) mit der kleinen
+    Kategorie-Matrix bewertet alle Dokumente gegen alle Kategorien;
+    die Ergebnisse entsprechen ``_classify_genre``, ``_classify_difficulty`` und
+    ``_extract_instruments`` des ``AIClassificationService``.
+    """
+
+    def __init__(self, service: Optional[AIClassificationService] = None):
+        np = _import_numpy()
+        self.np = np
+        self.service = service or AIClassificationService(cache_path=None)
+
+        # Vokabular in stabiler Reihenfolge (Instrumente zuerst, in Tabellenreihenfolge)
+        self.instruments: List[str] = []
+        for keywords in self.service.instrument_keywords.values():
+            for keyword in keywords:
+                if keyword not in self.instruments:
+                    self.instruments.append(keyword)
+        terms = list(self.instruments)
+        for table in (self.service.genre_keywords, self.service.difficulty_indicators):
+            for keywords in table.values():
+                terms.extend(keywords)
+        terms.extend(self.service.complex_indicators)
+        self.terms = list(dict.fromkeys(terms))
+        self.term_index = {term: index for index, term in enumerate(self.terms)}
+
+        # Kategorie-Matrix: Spalten = Genres, Schwierigkeitsgrade, Komplexitäts-Fallback
+        self.genres = list(self.service.genre_keywords)
+        self.difficulties = list(self.service.difficulty_indicators)
+        columns = ([self.service.genre_keywords[g] for g in self.genres]
+                   + [self.service.difficulty_indicators[d] for d in self.difficulties]
+                   + [self.service.complex_indicators])
+        self.category_matrix = np.zeros((len(self.terms), len(columns)), dtype=np.int32)
+        for column, keywords in enumerate(columns):
+            for keyword in keywords:
+                # Mehrfach gelistete Schlüsselwörter zählen mehrfach (wie im Einzel-Pfad)
+                self.category_matrix[self.term_index[keyword], column] += 1
+
+        self._genre_slice = slice(0, len(self.genres))
+        self._difficulty_slice = slice(len(self.genres), len(self.genres) + len(self.difficulties))
+        self._complex_column = len(columns) - 1
+
+    def vectorize(self, hit_counts: Iterable[Counter]) -> TermMatrix:
+        """Baut die dünn besetzte Dokument-Term-Matrix (Dokumente x Terme) aus Treffer-Zählungen"""
+        np = self.np
+        indptr, indices = [0], []
+        for hits in hit_counts:
+            for term, count in hits.items():
+                column = self.term_index.get(term)
+                if column is not None and count:
+                    indices.append(column)
+            indptr.append(len(indices))
+        return TermMatrix(np.array(indptr, dtype=np.int64), np.array(indices, dtype=np.int64),
+                          (len(indptr) - 1, len(self.terms)))
+
+    def score(self, term_matrix: TermMatrix):
+        """Bewertet alle Dokumente gegen alle Kategorien (Dokumente x Kategorien, dicht)
+
+        Jeder gespeicherte Eintrag trägt die Kategorie-Zeile seines Terms bei; die
+        Zeilen eines Dokuments werden in einem Schritt mit ``np.add.reduceat`` summiert.
+        """
+        np = self.np
+        n_docs = term_matrix.shape[0]
+        scores = np.zeros((n_docs, self.category_matrix.shape[1]), dtype=np.int32)
+        # reduceat liefert für leere Abschnitte das Element am Start statt 0: nur Dokumente mit Treffern
+        nonempty = np.diff(term_matrix.indptr) > 0
+        if nonempty.any():
+            contributions = self.category_matrix[term_matrix.indices]
+            scores[nonempty] = np.add.reduceat(contributions, term_matrix.indptr[:-1][nonempty], axis=0)
+        return scores
+
+    def classify_hits(self, hit_counts: Iterable[Counter]) -> List[Dict[str, Any]]:
+        """Klassifiziert Dokumente anhand ihrer Treffer-Zählungen (``KeywordMatcher.count``)"""
+        np = self.np
+        term_matrix = self.vectorize(hit_counts)
+        if not len(term_matrix):
+            return []
+        scores = self.score(term_matrix)
+
+        genre_scores = scores[:, self._genre_slice]
+        genre_names = np.array(self.genres + ['unbekannt'], dtype=object)
+        # argmax liefert bei Gleichstand die erste Kategorie - wie max() über das Dict
+        genre_index = np.where(genre_scores.max(axis=1) > 0, genre_scores.argmax(axis=1), len(self.genres))
+
+        difficulty_scores = scores[:, self._difficulty_slice]
+        complex_scores = scores[:, self._complex_column]
+        fallback = np.where(complex_scores > 3, 'schwer', np.where(complex_scores > 1, 'mittel', 'unbekannt'))
+        difficulty_names = np.array(self.difficulties, dtype=object)
+        difficulty = np.where(difficulty_scores.max(axis=1) > 0,
+                              difficulty_names[difficulty_scores.argmax(axis=1)], fallback.astype(object))
+
+        indptr, indices = term_matrix.indptr.tolist(), term_matrix.indices.tolist()
+        results = []
+        for row, (genre, level) in enumerate(zip(genre_names[genre_index].tolist(), difficulty.tolist())):
+            # Instrumente stehen vorne im Vokabular, in Tabellenreihenfolge
+            present = sorted(column for column in indices[indptr[row]:indptr[row + 1]] if column < len(self.instruments))
+            results.append({
+                'genre': genre,
+                'difficulty': level,
+                'instruments': [self.instruments[column] for column in present][:10]
+            })
+        return results
+
+    def classify_texts(self, texts: Iterable[str]) -> List[Dict[str, Any]]:
+        """Klassifiziert bereits extrahierte (kleingeschriebene) Texte"""
+        return self.classify_hits(self.service.matcher.count(text) for text in texts)
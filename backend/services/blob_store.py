@@ -0,0 +1,224 @@
+"""Inhaltsadressierter Dateispeicher mit Referenzzählung
+
+Jeder Inhalt liegt genau einmal unter ``blobs/<ab>/<cd>/<sha256>``.
+Die Dateien der Mandanten sind Hardlinks darauf: Export, Backup, Suchindex und
+Dateikatalog lesen weiter über die gewohnten Pfade, belegt wird der Inhalt aber
+nur einmal. Jeder Mandanten-Pfad zählt als eine Referenz; fällt die letzte weg,
+wird der Inhalt gelöscht. Ein Mandanten-Pfad darf daher nie in place beschrieben
+werden (das änderte den Inhalt aller Links), sondern wird nur über ``link`` bzw.
+``os.replace`` ersetzt.
+
+Prüfen und Ändern der Zähler samt zugehöriger Dateioperation laufen in einer
+SQLite-Schreibtransaktion (``BEGIN IMMEDIATE``); sie schließt sich auch zwischen
+mehreren Server-Prozessen gegenseitig aus.
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+import time
+import zipfile
+import zlib
+from contextlib import closing, contextmanager
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+
+class BlobStore:
+    def __init__(self, root: str = '/tmp/bestnote_data/blobs', db_path: Optional[str] = None, chunk_size: int = 1024 * 1024):
+        # Muss auf demselben Dateisystem wie die Mandanten-Verzeichnisse liegen (Hardlinks)
+        self.root = root
+        self.db_path = db_path or os.path.join(root, 'blobs.sqlite3')
+        self.chunk_size = chunk_size
+        os.makedirs(root, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS blobs (
+                    sha256 TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    crc32 INTEGER NOT NULL,
+                    refcount INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_blobs_size_crc ON blobs (size, crc32)')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Schreibtransaktion, die ab dem Beginn alle anderen Schreiber sperrt (auch in anderen Prozessen)
+
+        Verknüpfen und Freigeben dürfen sich nicht überschneiden (Löschen bei Zählerstand 0).
+        """
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def refcount(self, sha256: str) -> int:
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT refcount FROM blobs WHERE sha256 = ?', (sha256,)).fetchone()
+        return row['refcount'] if row else 0
+
+    def _candidates(self, size: int, crc32: int) -> Tuple[str, ...]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute('SELECT sha256 FROM blobs WHERE size = ? AND crc32 = ?', (size, crc32)).fetchall()
+        return tuple(row['sha256'] for row in rows if os.path.exists(self.path(row['sha256'])))
+
+    def store(self, source: BinaryIO, target_path: Optional[str] = None) -> Tuple[str, int, bool]:
+        """Übernimmt einen Datenstrom; gibt (SHA-256, Größe, neu geschrieben) zurück
+
+        Der Inhalt wird beim Schreiben in eine temporäre Datei gehasht; ist er schon
+        vorhanden, wird die temporäre Datei verworfen. Mit ``target_path`` wird er
+        im selben Schritt dorthin verlinkt (siehe ``link``).
+        """
+        digest = hashlib.sha256()
+        crc = 0
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(prefix='.incoming_', dir=self.root)
+        try:
+            with os.fdopen(fd, 'wb') as target:
+                for chunk in iter(lambda: source.read(self.chunk_size), b''):
+                    digest.update(chunk)
+                    crc = zlib.crc32(chunk, crc)
+                    size += len(chunk)
+                    target.write(chunk)
+            sha256 = digest.hexdigest()
+            created = self._commit(tmp_path, sha256, size, crc, target_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return sha256, size, created
+
+    def store_zip_member(self, zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo,
+                         target_path: Optional[str] = None) -> Tuple[str, int, bool]:
+        """Übernimmt einen ZIP-Eintrag, ohne bereits vorhandene Inhalte erneut zu schreiben
+
+        CRC-32 und Größe aus dem zentralen Verzeichnis finden mögliche Treffer; nur
+        dann wird der Eintrag zunächst ausschließlich gehasht.
+        """
+        candidates = self._candidates(info.file_size, info.CRC)
+        if candidates:
+            digest = hashlib.sha256()
+            with zip_ref.open(info) as source:
+                for chunk in iter(lambda: source.read(self.chunk_size), b''):
+                    digest.update(chunk)
+            sha256 = digest.hexdigest()
+            if sha256 in candidates:
+                try:
+                    if target_path is not None:
+                        self.link(sha256, target_path)
+                    return sha256, info.file_size, False
+                except FileNotFoundError:
+                    # Inhalt wurde inzwischen mit der letzten Referenz gelöscht: neu ablegen
+                    pass
+        with zip_ref.open(info) as source:
+            return self.store(source, target_path)
+
+    def _commit(self, tmp_path: str, sha256: str, size: int, crc32: int, target_path: Optional[str] = None) -> bool:
+        """Legt den Inhalt ab und verlinkt ihn optional gleich nach ``target_path``
+
+        Ablegen und Zählen der Referenz geschehen in einer Transaktion: ``release``
+        oder ``collect_garbage`` sehen einen neuen Inhalt nie mit Zählerstand 0 und
+        löschen ihn nicht vor dem Verlinken.
+        """
+        target = self.path(sha256)
+        with self._transaction() as conn:
+            created = not os.path.exists(target)
+            if created:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                # Nur ein Hinweis für Prozesse ohne root-Rechte: gegen Schreiben über einen
+                # Mandanten-Pfad schützt der Modus bei Betrieb als root nicht
+                os.chmod(tmp_path, 0o444)
+                os.replace(tmp_path, target)
+            linked = target_path is not None and self._hardlink(sha256, target_path)
+            if created:
+                conn.execute('INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, 0, ?)', (sha256, size, crc32, time.time()))
+            if linked:
+                conn.execute('UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = ?', (sha256,))
+        return created
+
+    def _hardlink(self, sha256: str, target_path: str) -> bool:
+        """Ersetzt ``target_path`` durch einen Hardlink auf den Inhalt (nur innerhalb von ``_transaction``)
+
+        False, wenn die Datei schon auf diesen Inhalt verweist (keine neue Referenz).
+        """
+        blob_path = self.path(sha256)
+        if os.path.exists(target_path) and os.path.samefile(blob_path, target_path):
+            return False
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        tmp_path = f'{target_path}.link'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        os.link(blob_path, tmp_path)
+        os.replace(tmp_path, target_path)
+        return True
+
+    def link(self, sha256: str, target_path: str) -> bool:
+        """Legt ``target_path`` als Hardlink auf den Inhalt an (ersetzt eine vorhandene Datei) und zählt die Referenz
+
+        Gibt False zurück, wenn ``target_path`` bereits auf den Inhalt verweist.
+        """
+        with self._transaction() as conn:
+            linked = self._hardlink(sha256, target_path)
+            if linked:
+                conn.execute('UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = ?', (sha256,))
+        return linked
+
+    def release(self, sha256: str) -> bool:
+        """Gibt eine Referenz frei und löscht den Inhalt bei der letzten; True, wenn gelöscht"""
+        with self._transaction() as conn:
+            row = conn.execute('SELECT refcount FROM blobs WHERE sha256 = ?', (sha256,)).fetchone()
+            if row is None:
+                # Datei stammt nicht aus dem Speicher (z.B. vor der Umstellung abgelegt)
+                return False
+            if row['refcount'] > 1:
+                conn.execute('UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = ?', (sha256,))
+                return False
+            conn.execute('DELETE FROM blobs WHERE sha256 = ?', (sha256,))
+            try:
+                os.remove(self.path(sha256))
+            except FileNotFoundError:
+                pass
+        return True
+
+    def collect_garbage(self) -> Dict[str, int]:
+        """Gleicht die Zähler mit der Zahl der Hardlinks ab und löscht unbenutzte Inhalte
+
+        Fängt Mandanten-Dateien auf, die außerhalb von ``release`` gelöscht wurden.
+        """
+        stats = {'checked': 0, 'corrected': 0, 'removed': 0}
+        with self._transaction() as conn:
+            for row in conn.execute('SELECT sha256, refcount FROM blobs').fetchall():
+                stats['checked'] += 1
+                try:
+                    links = os.stat(self.path(row['sha256'])).st_nlink - 1
+                except FileNotFoundError:
+                    links = 0
+                if links == 0:
+                    conn.execute('DELETE FROM blobs WHERE sha256 = ?', (row['sha256'],))
+                    if os.path.exists(self.path(row['sha256'])):
+                        os.remove(self.path(row['sha256']))
+                    stats['removed'] += 1
+                elif links != row['refcount']:
+                    conn.execute('UPDATE blobs SET refcount = ? WHERE sha256 = ?', (links, row['sha256']))
+                    stats['corrected'] += 1
+        return stats
+
+    def stats(self) -> Dict[str, int]:
+        """Anzahl und Größe der gespeicherten Inhalte sowie die Summe aller Referenzen"""
+        with closing(self._connect()) as conn:
+            blobs, size, references = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(refcount), 0) FROM blobs').fetchone()
+        return {'blobs': blobs, 'size': size, 'references': references}
@@ -0,0 +1,136 @@
+"""Einmaliges Lesen und Prüfen von SoftNote-CSV-Dateien
+
+Die Kopfzeile wird einmal geprüft und auf Spaltenpositionen abgebildet, danach
+liest ``csv.reader`` die Zeilen ohne weitere Kopfzeilen-Logik. Geprüft wird
+blockweise über einen ``TypeAdapter`` für die ganze Liste (ein Aufruf in den
+pydantic-Kern statt einem Modell je Zeile); fehlerhafte Zeilen werden mit
+Zeilennummer gemeldet, der Rest des Blocks wird übernommen.
+"""
+import csv
+from operator import itemgetter
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Type
+
+from pydantic import BaseModel, StringConstraints, TypeAdapter, ValidationError
+from typing_extensions import Annotated, TypedDict
+
+from backend.models import Score
+
+# CSV-Spalte -> Feld des Werks (``models.Score``)
+CSV_COLUMNS = {'Titel': 'title', 'Komponist': 'composer', 'Jahr': 'year', 'Metadaten': 'metadata'}
+REQUIRED_COLUMNS = ('Titel', 'Komponist')
+FIELD_LABELS = {field: column for column, field in CSV_COLUMNS.items()}
+
+RequiredText = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+
+
+def _row_type(model: Type[BaseModel]) -> type:
+    """Zeilentyp für die Prüfung, abgeleitet aus den Feldern des Modells
+
+    Als TypedDict bleibt die Prüfung ein einziger Aufruf je Block und liefert
+    Dicts. Pflichtfelder vom Typ ``str`` dürfen nicht leer sein; die ``id``
+    vergibt der Speicher.
+    """
+    fields = {}
+    for name, field in model.model_fields.items():
+        if name == 'id':
+            continue
+        fields[name] = RequiredText if field.is_required() and field.annotation is str else field.annotation
+    return TypedDict(f'{model.__name__}Row', fields)
+
+
+ScoreRow = _row_type(Score)
+SCORE_ROWS = TypeAdapter(List[ScoreRow])
+
+
+def _error_message(error: Dict[str, Any]) -> str:
+    label = FIELD_LABELS.get(error['loc'][1], str(error['loc'][1])) if len(error['loc']) > 1 else 'Zeile'
+    if error['type'] in ('string_too_short', 'missing'):
+        return f'{label} fehlt'
+    return f"{label}: {error['msg']}"
+
+
+class CsvScoreParser:
+    """Liest Werke aus einer SoftNote-CSV in Blöcken von ``batch_size`` Zeilen"""
+
+    def __init__(self, lines: Iterable[str], batch_size: int = 1000):
+        self.batch_size = batch_size
+        self._reader = csv.reader(lines)
+        header = next(self._reader, None)
+        # Byte-Order-Mark, wenn der Aufrufer nicht mit utf-8-sig dekodiert
+        if header and header[0].startswith('\ufeff'):
+            header[0] = header[0][1:]
+        self.header = header
+        # Spaltenposition je Feld; fehlende optionale Spalten bleiben leer
+        self._columns: List[Tuple[int, str]] = []
+        if header is not None:
+            self._columns = [(index, CSV_COLUMNS[name]) for index, name in enumerate(header) if name in CSV_COLUMNS]
+        self._fields = tuple(field for _, field in self._columns)
+        self._missing = {field: '' for field in CSV_COLUMNS.values() if field not in self._fields}
+        # Gültige Kopfzeilen haben mindestens die beiden Pflichtspalten, itemgetter liefert dann Tupel
+        indices = [index for index, _ in self._columns]
+        self._getter = itemgetter(*indices) if len(indices) > 1 else None
+
+    @property
+    def line_num(self) -> int:
+        """Zuletzt gelesene physische Zeile (mehrzeilige Felder zählen mehrfach)"""
+        return self._reader.line_num
+
+    @property
+    def valid(self) -> bool:
+        """Kopfzeile vorhanden und alle Pflichtspalten enthalten"""
+        return self.header is not None and all(column in self.header for column in REQUIRED_COLUMNS)
+
+    def batches(self) -> Iterator[Tuple[List[Dict[str, str]], List[Dict[str, Any]], int]]:
+        """Liefert je Block (gültige Werke, Fehler mit Zeilennummer, Anzahl gelesener Zeilen)"""
+        if not self.valid:
+            raise ValueError("CSV-Format ungültig oder fehlende Felder.")
+        width = len(self.header)
+        fields, missing, getter = self._fields, self._missing, self._getter
+        rows: List[Dict[str, str]] = []
+        lines: List[int] = []
+        errors: List[Dict[str, Any]] = []
+        count = 0
+        for record in self._reader:
+            if not record:
+                continue
+            count += 1
+            if len(record) > width:
+                errors.append({'line': self._reader.line_num, 'error': 'Zu viele Spalten'})
+            else:
+                if len(record) == width:
+                    row = dict(zip(fields, getter(record)))
+                else:
+                    row = {field: record[index] if index < len(record) else '' for index, field in self._columns}
+                if missing:
+                    row.update(missing)
+                rows.append(row)
+                lines.append(self._reader.line_num)
+            if count == self.batch_size:
+                yield self._validate(rows, lines, errors), errors, count
+                rows, lines, errors, count = [], [], [], 0
+        if count:
+            yield self._validate(rows, lines, errors), errors, count
+
+    @staticmethod
+    def _validate(rows: List[Dict[str, str]], lines: List[int], errors: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        try:
+            return SCORE_ROWS.validate_python(rows)
+        except ValidationError as e:
+            invalid = {}
+            for error in e.errors():
+                invalid.setdefault(error['loc'][0], _error_message(error))
+        errors.extend({'line': lines[index], 'error': message} for index, message in invalid.items())
+        errors.sort(key=lambda error: error['line'])
+        # Die übrigen Zeilen sind gültig, ein zweiter Durchlauf ohne die fehlerhaften
+        return SCORE_ROWS.validate_python([row for index, row in enumerate(rows) if index not in invalid])
+
+    def parse(self) -> Tuple[List[Dict[str, str]], List[Dict[str, Any]], int]:
+        """Alle Zeilen auf einmal: (gültige Werke, Fehler, Anzahl Zeilen)"""
+        scores: List[Dict[str, str]] = []
+        errors: List[Dict[str, Any]] = []
+        total = 0
+        for batch, batch_errors, count in self.batches():
+            scores.extend(batch)
+            errors.extend(batch_errors)
+            total += count
+        return scores, errors, total
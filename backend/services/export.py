@@ -1,10 +1,65 @@
-import zipfile
+import hashlib
+import json
+import re
+import shutil
+import tempfile
+import time
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, BinaryIO, Callable, Iterable, Iterator, Optional, Tuple
 from datetime import datetime
+from backend.services.export_cache import ExportArtifactCache
+from backend.services.export_history import ExportHistory
+from backend.services.file_catalog import FileCatalog
+from backend.services.part_booklets import PartBookletService
+from backend.services.pdf_optimize import PdfScreenOptimizer
+from backend.services.zip_compression import CompressionPolicy
+
+MANIFEST_VERSION = 1
+# Erhöhen, wenn sich der Inhalt generierter Exporte ändert (macht zwischengespeicherte Archive ungültig)
+EXPORT_FORMAT_VERSION = 2
+
+
+def _format_size(size: Optional[int]) -> str:
+    if size is None:
+        return '-'
+    if size < 1024 * 1024:
+        return f'{size / 1024:.1f} KB'
+    return f'{size / (1024 * 1024):.1f} MB'
+
+
+class _ZipStreamBuffer:
+    """Nicht-seekbares Schreibziel für zipfile; sammelt Bytes bis zum nächsten Abholen"""
 
-class ExportService:
     def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ExportService:
+    def __init__(self, data_dir: str = '/tmp/bestnote_data', export_dir: str = '/tmp/bestnote_exports', chunk_size: int = 1024 * 1024,
+                 compression: Optional[CompressionPolicy] = None, history: Optional[ExportHistory] = None,
+                 artifacts: Optional[ExportArtifactCache] = None, catalog: Optional[FileCatalog] = None,
+                 pdf_optimizer: Optional[PdfScreenOptimizer] = None, booklets: Optional[PartBookletService] = None):
+        self.data_dir = data_dir
+        self.export_dir = export_dir
+        self.chunk_size = chunk_size
+        self.compression = compression or CompressionPolicy()
+        self.history = history or ExportHistory(os.path.join(export_dir, 'history.sqlite3'))
+        self.artifacts = artifacts or ExportArtifactCache(os.path.join(export_dir, 'artifacts.sqlite3'))
+        self.catalog = catalog or FileCatalog(data_dir)
+        self.pdf_optimizer = pdf_optimizer or PdfScreenOptimizer(os.path.join(export_dir, 'digital_pdfs'))
+        self.booklets = booklets or PartBookletService(self.catalog)
         self.layouts = {
             'standard': {
                 'name': 'Standard-Layout',
@@ -16,7 +71,7 @@ class ExportService:
             },
             'digital': {
                 'name': 'Digital-Optimiert',
-                'description': 'Für Bildschirmdarstellung optimiert'
+                'description': 'Für Bildschirmdarstellung optimiert (verkleinerte, linearisierte PDFs)'
             }
         }
 
@@ -24,49 +79,255 @@ class ExportService:
         """Gibt verfügbare Layouts zurück"""
         return self.layouts
 
-    def create_export_zip(self, mandant_id: int, layout: str = 'standard', include_pdfs: bool = True, include_metadata: bool = True) -> str:
-        """Erstellt ZIP-Datei für Export im festen Verzeichnis /tmp/bestnote_exports/"""
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        export_dir = f'/tmp/bestnote_export_{mandant_id}_{timestamp}'
-        zip_dir = '/tmp/bestnote_exports'
-        os.makedirs(export_dir, exist_ok=True)
-        os.makedirs(zip_dir, exist_ok=True)
-        zip_filename = f'export_mandant_{mandant_id}_{layout}_{timestamp}.zip'
-        zip_path = os.path.join(zip_dir, zip_filename)
+    def export_filename(self, mandant_id: int, layout: str, delta: bool = False) -> str:
+        """Dateiname eines Exports (mit Zeitstempel); ohne Endung zugleich die Export-ID"""
+        # Mikrosekunden, damit kurz nacheinander gestartete Exporte sich nicht überschreiben
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        kind = f'{layout}_delta' if delta else layout
+        return f'export_mandant_{mandant_id}_{kind}_{timestamp}.zip'
+
+    def export_cache_key(self, mandant_id: int, layout: str, include_pdfs: bool, include_metadata: bool,
+                         since_export: Optional[str] = None) -> str:
+        """Schlüssel für den Archiv-Cache: Optionen plus Fingerabdruck der exportierten Dateien
 
+        Der Fingerabdruck entsteht aus Pfad, Größe, Änderungszeit und Inhalts-Hash der PDFs
+        laut Dateikatalog, ohne das Dateisystem zu lesen.
+        """
+        fingerprint = hashlib.sha256()
+        if include_pdfs:
+            for arcname, _, entry in self._iter_pdf_files(mandant_id):
+                fingerprint.update(f"{arcname}\0{entry['size']}\0{entry['mtime_ns']}\0{entry['sha256']}\n".encode('utf-8'))
+        optimizer_tag = self.pdf_optimizer.cache_tag if layout == 'digital' else None
+        key = json.dumps([EXPORT_FORMAT_VERSION, mandant_id, layout, include_pdfs, include_metadata, since_export,
+                          optimizer_tag, fingerprint.hexdigest()])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def find_cached_export(self, mandant_id: int, layout: str = 'standard', include_pdfs: bool = True,
+                           include_metadata: bool = True, since_export: Optional[str] = None) -> Optional[str]:
+        """Pfad eines identischen, noch vorhandenen Exports oder None"""
+        entry = self.artifacts.get(self.export_cache_key(mandant_id, layout, include_pdfs, include_metadata, since_export))
+        if entry is None or entry['mandant_id'] != mandant_id:
+            return None
+        return entry['path']
+
+    def create_export_zip(self, mandant_id: int, layout: str = 'standard', include_pdfs: bool = True, include_metadata: bool = True,
+                          since_export: Optional[str] = None, filename: Optional[str] = None,
+                          progress: Optional[Callable[[int, int], None]] = None, use_cache: bool = True) -> str:
+        """Erstellt ZIP-Datei für Export im Export-Verzeichnis (Standard: /tmp/bestnote_exports/)
+
+        Mit ``since_export`` entsteht ein Delta-Export: nur neue oder geänderte Dateien
+        seit dem angegebenen Export plus ``deleted.json`` mit den entfernten Pfaden.
+        ``progress(erledigt, gesamt)`` wird nach jeder PDF-Datei aufgerufen. Der Export
+        wird mit Größe und Dauer in der Historie vermerkt. Gibt es bereits ein Archiv mit
+        gleichen Optionen und unveränderten Dateien, wird dessen Pfad zurückgegeben.
+        """
+        started = time.monotonic()
+        base_manifest = self.load_manifest(mandant_id, since_export) if since_export else None
+        cache_key = self.export_cache_key(mandant_id, layout, include_pdfs, include_metadata, since_export)
+        if use_cache:
+            cached = self.artifacts.get(cache_key)
+            if cached is not None and cached['mandant_id'] == mandant_id:
+                self.history.record(mandant_id, cached['export_id'], layout, 'cached', time.monotonic() - started,
+                                    file_size=cached['size'], since_export=since_export)
+                return cached['path']
+
+        os.makedirs(self.export_dir, exist_ok=True)
+        filename = filename or self.export_filename(mandant_id, layout, delta=base_manifest is not None)
+        zip_path = os.path.join(self.export_dir, filename)
+
+        manifest = self._new_manifest(filename, mandant_id, layout, since_export)
+        members = self._iter_members(mandant_id, layout, include_pdfs, include_metadata, manifest, base_manifest, progress)
         try:
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                # Metadaten hinzufügen
-                if include_metadata:
-                    metadata = self._generate_metadata(mandant_id, layout)
-                    metadata_path = os.path.join(export_dir, 'metadata.json')
-                    with open(metadata_path, 'w', encoding='utf-8') as f:
-                        f.write(metadata)
-                    zipf.write(metadata_path, 'metadata.json')
-
-                # Layout-spezifische Dateien hinzufügen
-                if layout == 'standard':
-                    self._add_standard_layout(zipf, export_dir, mandant_id)
-                elif layout == 'compact':
-                    self._add_compact_layout(zipf, export_dir, mandant_id)
-                elif layout == 'digital':
-                    self._add_digital_layout(zipf, export_dir, mandant_id)
-
-                # PDFs hinzufügen (falls verfügbar)
-                if include_pdfs:
-                    self._add_pdf_files(zipf, mandant_id)
-
-            return zip_path
+            with open(zip_path, 'wb') as f:
+                for _ in self._write_zip(f, members, manifest):
+                    pass
+        except BaseException as e:
+            # Keine halbfertigen Archive liegen lassen
+            if os.path.exists(zip_path):
+                os.remove(zip_path)
+            self.history.record(mandant_id, manifest['export_id'], layout, 'failed', time.monotonic() - started,
+                                since_export=since_export, error=str(e) or type(e).__name__)
+            raise
+        self._save_manifest(manifest)
+        self.artifacts.put(cache_key, mandant_id, manifest['export_id'], zip_path)
+        self.history.record(mandant_id, manifest['export_id'], layout, 'completed', time.monotonic() - started,
+                            file_size=os.path.getsize(zip_path), since_export=since_export)
+        return zip_path
+
+    def create_booklet_zip(self, mandant_id: int, program: List[Dict[str, Any]], group_by: str = 'part',
+                           filename: Optional[str] = None,
+                           progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Erstellt je Stimme bzw. Instrument ein Stimmenheft für das Konzertprogramm
 
+        Das ZIP enthält ``stimmen/<Heft>.pdf`` und ``programm.json`` mit Programm,
+        Heftinhalt sowie fehlenden oder nicht lesbaren Stimmen. ``progress(erledigt,
+        gesamt)`` wird nach jedem fertigen Heft aufgerufen.
+        """
+        started = time.monotonic()
+        plan = self.booklets.plan(mandant_id, program, group_by)
+        os.makedirs(self.export_dir, exist_ok=True)
+        filename = filename or self.export_filename(mandant_id, 'booklets')
+        export_id = os.path.splitext(filename)[0]
+        zip_path = os.path.join(self.export_dir, filename)
+        work_dir = tempfile.mkdtemp(prefix='booklets_', dir=self.export_dir)
+        try:
+            booklets = self.booklets.build(plan, work_dir, progress)
+            summary = {
+                'export_id': export_id,
+                'created_at': datetime.now().isoformat(),
+                'group_by': group_by,
+                'program': [piece['title'] for piece in program],
+                'booklets': [
+                    {'name': name, 'file': f"stimmen/{os.path.basename(result['path'])}" if result['path'] else None,
+                     'pages': result['pages'], 'parts': [{'piece': piece, 'part': part} for piece, part, _ in plan['booklets'][name]],
+                     'skipped': result['skipped']}
+                    for name, result in booklets.items()
+                ],
+                'missing': plan['missing'],
+            }
+            with self.compression.open_zip(zip_path) as zipf:
+                for result in booklets.values():
+                    if result['path']:
+                        for _ in self.compression.write_file(zipf, result['path'], f"stimmen/{os.path.basename(result['path'])}",
+                                                             self.chunk_size):
+                            pass
+                self.compression.write_bytes(zipf, 'programm.json',
+                                             json.dumps(summary, indent=2, ensure_ascii=False).encode('utf-8'))
+        except BaseException as e:
+            if os.path.exists(zip_path):
+                os.remove(zip_path)
+            self.history.record(mandant_id, export_id, 'booklets', 'failed', time.monotonic() - started,
+                                error=str(e) or type(e).__name__)
+            raise
         finally:
-            # Aufräumen temporärer Dateien
-            import shutil
-            if os.path.exists(export_dir):
-                shutil.rmtree(export_dir)
+            shutil.rmtree(work_dir, ignore_errors=True)
+        self.history.record(mandant_id, export_id, 'booklets', 'completed', time.monotonic() - started,
+                            file_size=os.path.getsize(zip_path))
+        summary['path'] = zip_path
+        return summary
+
+    def iter_export_zip(self, mandant_id: int, layout: str = 'standard', include_pdfs: bool = True, include_metadata: bool = True,
+                        since_export: Optional[str] = None, filename: Optional[str] = None) -> Iterator[bytes]:
+        """Erzeugt den Export-ZIP als Byte-Strom (ohne temporäre Dateien)
+
+        Generierte Einträge kommen aus dem Speicher, PDFs werden stückweise aus dem
+        Mandanten-Verzeichnis gelesen. Die Einträge verwenden Data-Deskriptoren, da
+        das Ziel nicht seekbar ist. Das Basis-Manifest eines Delta-Exports wird sofort
+        geladen, damit ein unbekannter Export vor dem ersten Byte auffällt.
+        """
+        base_manifest = self.load_manifest(mandant_id, since_export) if since_export else None
+        filename = filename or self.export_filename(mandant_id, layout, delta=base_manifest is not None)
+        manifest = self._new_manifest(filename, mandant_id, layout, since_export)
+        members = self._iter_members(mandant_id, layout, include_pdfs, include_metadata, manifest, base_manifest)
+        return self._stream_zip(members, manifest)
+
+    def _stream_zip(self, members, manifest: Dict[str, Any]) -> Iterator[bytes]:
+        started = time.monotonic()
+        buffer = _ZipStreamBuffer()
+        size = 0
+        try:
+            for _ in self._write_zip(buffer, members, manifest):
+                data = buffer.drain()
+                if data:
+                    size += len(data)
+                    yield data
+            data = buffer.drain()
+            if data:
+                size += len(data)
+                yield data
+        except BaseException as e:
+            # Auch ein abgebrochener Download (GeneratorExit) landet in der Historie
+            error = 'Download abgebrochen' if isinstance(e, GeneratorExit) else str(e) or type(e).__name__
+            self.history.record(manifest['mandant_id'], manifest['export_id'], manifest['layout'], 'failed',
+                                time.monotonic() - started, since_export=manifest['since_export'], error=error)
+            raise
+        self._save_manifest(manifest)
+        self.history.record(manifest['mandant_id'], manifest['export_id'], manifest['layout'], 'completed',
+                            time.monotonic() - started, file_size=size, since_export=manifest['since_export'])
+
+    def _write_zip(self, target: BinaryIO, members: Iterable[Tuple[str, Optional[bytes], Optional[str]]],
+                   manifest: Dict[str, Any]) -> Iterator[None]:
+        """Schreibt die Einträge in ``target`` und meldet sich nach jedem geschriebenen Block
 
-    def _generate_metadata(self, mandant_id: int, layout: str) -> str:
+        Dateien werden beim Schreiben gehasht und ins Manifest eingetragen, das als
+        letzter Eintrag ``manifest.json`` folgt.
+        """
+        with self.compression.open_zip(target) as zipf:
+            for arcname, data, source_path in members:
+                if source_path is None:
+                    self.compression.write_bytes(zipf, arcname, data)
+                    yield
+                    continue
+
+                try:
+                    stat = os.stat(source_path)
+                except FileNotFoundError:
+                    # Seit dem letzten Katalog-Abgleich gelöscht
+                    continue
+                hasher = hashlib.sha256()
+                yield from self.compression.write_file(zipf, source_path, arcname, self.chunk_size, hasher)
+                manifest['files'][arcname] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': hasher.hexdigest()}
+
+            manifest['files'] = dict(sorted(manifest['files'].items()))
+            self.compression.write_bytes(zipf, 'manifest.json', json.dumps(manifest, indent=2, ensure_ascii=False).encode('utf-8'))
+            yield
+
+    def _iter_members(self, mandant_id: int, layout: str, include_pdfs: bool, include_metadata: bool,
+                      manifest: Dict[str, Any], base_manifest: Optional[Dict[str, Any]] = None,
+                      progress: Optional[Callable[[int, int], None]] = None) -> Iterator[Tuple[str, Optional[bytes], Optional[str]]]:
+        """Einträge des Exports als (Name im ZIP, Inhalt, Quelldatei)"""
+        # Metadaten hinzufügen
+        if include_metadata:
+            yield 'metadata.json', self._generate_metadata(mandant_id, layout, manifest).encode('utf-8'), None
+
+        # Layout-spezifische Dateien hinzufügen
+        if layout == 'standard':
+            yield from self._standard_layout_members(mandant_id)
+        elif layout == 'compact':
+            yield from self._compact_layout_members(mandant_id)
+        elif layout == 'digital':
+            yield from self._digital_layout_members(mandant_id)
+
+        # PDFs hinzufügen (falls verfügbar), im Digital-Layout bildschirmoptimiert
+        if include_pdfs:
+            optimize = layout == 'digital'
+            if base_manifest is None:
+                yield from self._pdf_members(mandant_id, manifest, optimize, progress)
+            else:
+                yield from self._delta_pdf_members(mandant_id, manifest, base_manifest['files'], optimize, progress)
+
+    def load_manifest(self, mandant_id: int, export_id: str) -> Dict[str, Any]:
+        """Manifest eines früheren Exports des Mandanten laden"""
+        match = re.fullmatch(r'export_mandant_(\d+)_\w+', export_id or '')
+        manifest_path = os.path.join(self.export_dir, 'manifests', f'{export_id}.json')
+        if not match or int(match.group(1)) != mandant_id or not os.path.exists(manifest_path):
+            raise FileNotFoundError(f'Export {export_id} nicht gefunden')
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _new_manifest(self, filename: str, mandant_id: int, layout: str, since_export: Optional[str]) -> Dict[str, Any]:
+        return {
+            'version': MANIFEST_VERSION,
+            'export_id': os.path.splitext(filename)[0],
+            'mandant_id': mandant_id,
+            'layout': layout,
+            'created_at': datetime.now().isoformat(),
+            'since_export': since_export,
+            'files': {},
+            'deleted': [],
+        }
+
+    def _save_manifest(self, manifest: Dict[str, Any]):
+        manifest_dir = os.path.join(self.export_dir, 'manifests')
+        os.makedirs(manifest_dir, exist_ok=True)
+        manifest_path = os.path.join(manifest_dir, f"{manifest['export_id']}.json")
+        tmp_path = f'{manifest_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, manifest_path)
+
+    def _generate_metadata(self, mandant_id: int, layout: str, manifest: Optional[Dict[str, Any]] = None) -> str:
         """Generiert Metadaten für Export"""
-        import json
         metadata = {
             'mandant_id': mandant_id,
             'layout': layout,
@@ -74,80 +335,115 @@ class ExportService:
             'version': '1.0',
             'description': f'BestNote Export für Mandant {mandant_id} mit Layout {layout}'
         }
+        if manifest is not None:
+            metadata['export_id'] = manifest['export_id']
+            metadata['since_export'] = manifest['since_export']
         return json.dumps(metadata, indent=2, ensure_ascii=False)
 
-    def _add_standard_layout(self, zipf: zipfile.ZipFile, export_dir: str, mandant_id: int):
-        """Fügt Standard-Layout-Dateien hinzu"""
-        # Titelseite erstellen
-        title_page = os.path.join(export_dir, 'README.txt')
-        with open(title_page, 'w', encoding='utf-8') as f:
-            f.write(f'BestNote Export - Mandant {mandant_id}\n')
-            f.write('Standard-Layout\n\n')
-            f.write('Dieses Archiv enthält alle Noten und Stimmen.\n')
-        zipf.write(title_page, 'README.txt')
-
-        # Index-Datei
-        index = os.path.join(export_dir, 'index.html')
-        with open(index, 'w', encoding='utf-8') as f:
-            f.write('<html><body><h1>Notenarchiv</h1><p>Index wird hier generiert...</p></body></html>')
-        zipf.write(index, 'index.html')
-
-    def _add_compact_layout(self, zipf: zipfile.ZipFile, export_dir: str, mandant_id: int):
-        """Fügt Kompakt-Layout-Dateien hinzu"""
-        # Minimale README
-        readme = os.path.join(export_dir, 'README.txt')
-        with open(readme, 'w', encoding='utf-8') as f:
-            f.write(f'BestNote Export - Mandant {mandant_id} (Kompakt)\n')
-        zipf.write(readme, 'README.txt')
-
-    def _add_digital_layout(self, zipf: zipfile.ZipFile, export_dir: str, mandant_id: int):
-        """Fügt Digital-optimiertes Layout hinzu"""
-        # Digital-optimierte Index-Datei
-        index = os.path.join(export_dir, 'index.html')
-        with open(index, 'w', encoding='utf-8') as f:
-            f.write('''<html>
+    def _standard_layout_members(self, mandant_id: int):
+        """Standard-Layout: Titelseite und Index"""
+        readme = (f'BestNote Export - Mandant {mandant_id}\n'
+                  'Standard-Layout\n\n'
+                  'Dieses Archiv enthält alle Noten und Stimmen.\n')
+        yield 'README.txt', readme.encode('utf-8'), None
+        yield 'index.html', '<html><body><h1>Notenarchiv</h1><p>Index wird hier generiert...</p></body></html>'.encode('utf-8'), None
+
+    def _compact_layout_members(self, mandant_id: int):
+        """Kompakt-Layout: nur eine minimale README"""
+        yield 'README.txt', f'BestNote Export - Mandant {mandant_id} (Kompakt)\n'.encode('utf-8'), None
+
+    def _digital_layout_members(self, mandant_id: int):
+        """Digital-optimiertes Layout: Index für Bildschirmdarstellung (die PDFs optimiert ``_pdf_members``)"""
+        index = '''<html>
 <head><style>body{font-family:Arial,sans-serif;max-width:800px;margin:0 auto;padding:20px;}</style></head>
 <body><h1>BestNote Digital Archiv</h1><p>Optimiert für Bildschirmdarstellung</p></body>
-</html>''')
-        zipf.write(index, 'index.html')
-
-    def _add_pdf_files(self, zipf: zipfile.ZipFile, mandant_id: int):
-        """Fügt PDF-Dateien aus mandant-spezifischem Verzeichnis hinzu"""
-        # Mandant-spezifisches Verzeichnis für importierte Dateien
-        mandant_dir = f'/tmp/bestnote_data/mandant_{mandant_id}'
-
-        if os.path.exists(mandant_dir):
-            # Alle PDF-Dateien im Mandanten-Verzeichnis finden
-            for root, dirs, files in os.walk(mandant_dir):
-                for file in files:
-                    if file.endswith('.pdf'):
-                        file_path = os.path.join(root, file)
-                        # Relativer Pfad im ZIP
-                        rel_path = os.path.relpath(file_path, mandant_dir)
-                        zipf.write(file_path, f'pdfs/{rel_path}')
+</html>'''
+        yield 'index.html', index.encode('utf-8'), None
+
+    def _iter_pdf_files(self, mandant_id: int) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """PDF-Dateien des Mandanten laut Dateikatalog als (Name im ZIP, Pfad, Katalogeintrag)"""
+        return [(f"pdfs/{entry['path']}", self.catalog.absolute_path(mandant_id, entry['path']), entry)
+                for entry in self.catalog.list_files(mandant_id, ['pdf'])]
+
+    def _pdf_sources(self, pdf_files: List[Tuple[str, str, Dict[str, Any]]], optimize: bool) -> Iterator[str]:
+        """Zu exportierende Datei je PDF: das Original oder die bildschirmoptimierte Fassung"""
+        if optimize:
+            return self.pdf_optimizer.iter_optimized((file_path, entry['sha256']) for _, file_path, entry in pdf_files)
+        return (file_path for _, file_path, _ in pdf_files)
+
+    def _pdf_members(self, mandant_id: int, manifest: Dict[str, Any], optimize: bool = False,
+                     progress: Optional[Callable[[int, int], None]] = None):
+        """PDF-Dateien aus dem mandant-spezifischen Verzeichnis"""
+        if os.path.exists(os.path.join(self.data_dir, f'mandant_{mandant_id}')):
+            pdf_files = self._iter_pdf_files(mandant_id)
+            sources = self._pdf_sources(pdf_files, optimize)
+            for done, ((arcname, _, entry), source_path) in enumerate(zip(pdf_files, sources), 1):
+                yield arcname, None, source_path
+                # Der Schreiber fordert den nächsten Eintrag erst an, wenn dieser fertig ist
+                self._note_source(manifest, arcname, entry, optimize)
+                if progress:
+                    progress(done, len(pdf_files))
         else:
-            # Fallback: Platzhalter-Datei wenn keine PDFs vorhanden
-            placeholder = '/tmp/placeholder.pdf'
-            with open(placeholder, 'w') as f:
-                f.write('PDF Placeholder - keine Dateien gefunden')
-            zipf.write(placeholder, 'pdfs/placeholder.txt')
-
-    def get_export_history(self, mandant_id: int) -> List[Dict[str, Any]]:
-        """Gibt Export-Historie zurück"""
-        # Platzhalter für Export-Historie
+            # Fallback: Platzhalter wenn keine PDFs vorhanden
+            yield 'pdfs/placeholder.txt', b'PDF Placeholder - keine Dateien gefunden', None
+
+    @staticmethod
+    def _note_source(manifest: Dict[str, Any], arcname: str, entry: Dict[str, Any], optimize: bool):
+        """Vermerkt bei optimierten PDFs den Hash der Quelldatei (Grundlage späterer Delta-Exporte)"""
+        if optimize and arcname in manifest['files']:
+            manifest['files'][arcname]['source_sha256'] = entry['sha256']
+
+    def _delta_pdf_members(self, mandant_id: int, manifest: Dict[str, Any], base_files: Dict[str, Dict[str, Any]],
+                           optimize: bool = False, progress: Optional[Callable[[int, int], None]] = None):
+        """Nur neue oder geänderte PDFs; unveränderte wandern direkt ins Manifest
+
+        Verglichen wird der Inhalts-Hash aus dem Dateikatalog mit dem Basis-Manifest,
+        unveränderte Dateien werden dabei nicht gelesen. Optimierte PDFs werden über
+        den Hash ihrer Quelldatei verglichen.
+        """
+        pdf_files = self._iter_pdf_files(mandant_id)
+        changed = []
+        for arcname, file_path, entry in pdf_files:
+            previous = base_files.get(arcname)
+            if previous is None:
+                unchanged = False
+            elif optimize:
+                unchanged = previous.get('source_sha256') == entry['sha256']
+            else:
+                unchanged = 'source_sha256' not in previous and previous['sha256'] == entry['sha256']
+            if unchanged:
+                manifest['files'][arcname] = dict(previous) if optimize else {
+                    'size': entry['size'], 'mtime_ns': entry['mtime_ns'], 'sha256': entry['sha256']}
+            else:
+                changed.append((arcname, file_path, entry))
+
+        done = len(pdf_files) - len(changed)
+        if progress and done:
+            progress(done, len(pdf_files))
+        for (arcname, _, entry), source_path in zip(changed, self._pdf_sources(changed, optimize)):
+            yield arcname, None, source_path
+            self._note_source(manifest, arcname, entry, optimize)
+            done += 1
+            if progress:
+                progress(done, len(pdf_files))
+
+        manifest['deleted'] = sorted(set(base_files) - {arcname for arcname, _, _ in pdf_files})
+        yield 'deleted.json', json.dumps(manifest['deleted'], indent=2, ensure_ascii=False).encode('utf-8'), None
+
+    def get_export_history(self, mandant_id: int, limit: int = 50) -> List[Dict[str, Any]]:
+        """Gibt die Export-Historie des Mandanten zurück (neueste zuerst)"""
         return [
             {
-                'id': 1,
-                'date': '2024-01-15T10:30:00',
-                'layout': 'standard',
-                'file_size': '2.5 MB',
-                'status': 'completed'
-            },
-            {
-                'id': 2,
-                'date': '2024-01-10T14:20:00',
-                'layout': 'compact',
-                'file_size': '1.8 MB',
-                'status': 'completed'
+                'id': entry['id'],
+                'export_id': entry['export_id'],
+                'date': entry['created_at'],
+                'layout': entry['layout'],
+                'since_export': entry['since_export'],
+                'file_size': _format_size(entry['file_size']),
+                'size_bytes': entry['file_size'],
+                'duration_seconds': round(entry['duration_seconds'], 3),
+                'status': entry['status'],
+                'error': entry['error']
             }
-        ]
\ No newline at end of file
+            for entry in self.history.list(mandant_id, limit)
+        ]
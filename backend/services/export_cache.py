@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+
+class ExportArtifactCache:
+    """Cache der fertigen Export-ZIPs mit Speicherbudget (Verzeichnis in SQLite)
+
+    Schlüssel ist ein Hash aus Mandant, Layout, Optionen und dem Fingerabdruck der
+    Mandanten-Dateien. Jedes fertige Archiv wird eingetragen; überschreitet die
+    Summe ``max_bytes``, werden die am längsten nicht genutzten Archive gelöscht.
+    """
+
+    def __init__(self, db_path: str = '/tmp/bestnote_exports/artifacts.sqlite3', max_bytes: int = 2 * 1024 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS export_artifacts (
+                    cache_key TEXT PRIMARY KEY,
+                    mandant_id INTEGER NOT NULL,
+                    export_id TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_export_artifacts_access ON export_artifacts (last_access)')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Liefert das Archiv zum Schlüssel oder None (auch wenn die Datei verschwunden ist)"""
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute('SELECT * FROM export_artifacts WHERE cache_key = ?', (cache_key,)).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(row['path']):
+                conn.execute('DELETE FROM export_artifacts WHERE cache_key = ?', (cache_key,))
+                return None
+            conn.execute('UPDATE export_artifacts SET last_access = ? WHERE cache_key = ?', (time.time(), cache_key))
+        return dict(row)
+
+    def put(self, cache_key: str, mandant_id: int, export_id: str, path: str):
+        """Trägt ein fertiges Archiv ein und hält das Speicherbudget ein"""
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            previous = conn.execute('SELECT path FROM export_artifacts WHERE cache_key = ?', (cache_key,)).fetchone()
+            conn.execute(
+                'INSERT OR REPLACE INTO export_artifacts VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (cache_key, mandant_id, export_id, path, os.path.getsize(path), now, now)
+            )
+            victims = self._evict(conn, keep=cache_key)
+        if previous is not None and previous['path'] != path:
+            victims.append(previous['path'])
+        for victim in victims:
+            try:
+                os.remove(victim)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self, conn: sqlite3.Connection, keep: str) -> List[str]:
+        """Entfernt die am längsten nicht genutzten Einträge und gibt ihre Pfade zurück"""
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM export_artifacts').fetchone()[0]
+        if total <= self.max_bytes:
+            return []
+        excess = total - self.max_bytes
+        victims = []
+        for row in conn.execute('SELECT cache_key, path, size FROM export_artifacts WHERE cache_key != ? ORDER BY last_access',
+                                (keep,)).fetchall():
+            victims.append(row)
+            excess -= row['size']
+            if excess <= 0:
+                break
+        conn.executemany('DELETE FROM export_artifacts WHERE cache_key = ?', [(row['cache_key'],) for row in victims])
+        return [row['path'] for row in victims]
+
+    def stats(self) -> Dict[str, Any]:
+        """Gibt Anzahl und Gesamtgröße der Archive zurück"""
+        with closing(self._connect()) as conn:
+            entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM export_artifacts').fetchone()
+        return {'entries': entries, 'size': size, 'max_bytes': self.max_bytes}
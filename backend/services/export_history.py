@@ -0,0 +1,56 @@
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+class ExportHistory:
+    """Persistente Export-Historie je Mandant (SQLite)"""
+
+    def __init__(self, db_path: str = '/tmp/bestnote_exports/history.sqlite3'):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS export_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    mandant_id INTEGER NOT NULL,
+                    export_id TEXT NOT NULL,
+                    layout TEXT NOT NULL,
+                    since_export TEXT,
+                    status TEXT NOT NULL,
+                    file_size INTEGER,
+                    duration_seconds REAL NOT NULL,
+                    error TEXT,
+                    created_at TEXT NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_export_history_mandant ON export_history (mandant_id, id)')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def record(self, mandant_id: int, export_id: str, layout: str, status: str, duration_seconds: float,
+               file_size: Optional[int] = None, since_export: Optional[str] = None, error: Optional[str] = None) -> int:
+        """Trägt einen beendeten Export ein und gibt die ID des Eintrags zurück"""
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                'INSERT INTO export_history (mandant_id, export_id, layout, since_export, status, file_size, '
+                'duration_seconds, error, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (mandant_id, export_id, layout, since_export, status, file_size, duration_seconds, error,
+                 datetime.now().isoformat(timespec='seconds'))
+            )
+            return cursor.lastrowid
+
+    def list(self, mandant_id: int, limit: int = 50) -> List[Dict[str, Any]]:
+        """Neueste Exporte des Mandanten zuerst"""
+        with closing(self._connect()) as conn, conn:
+            rows = conn.execute(
+                'SELECT * FROM export_history WHERE mandant_id = ? ORDER BY id DESC LIMIT ?',
+                (mandant_id, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
@@ -0,0 +1,212 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+from backend.services.analysis_cache import AnalysisCache
+
+MANDANT_DIR_PATTERN = re.compile(r'mandant_(\d+)')
+
+
+class FileCatalog:
+    """Dateikatalog je Mandant (SQLite): Pfad, Größe, Änderungszeit, Inhalts-Hash, Verknüpfung zu Werk/Stimme
+
+    Import- und Upload-Pfade tragen Dateien sofort ein (``record_file``), der
+    Abgleich (``reconcile``) korrigiert Abweichungen zum Dateisystem. Export,
+    Backup und Speicherstatistik lesen aus dem Katalog statt das Verzeichnis zu
+    durchlaufen. Ein Mandant, der noch nie abgeglichen wurde, wird beim ersten
+    Lesen einmal vollständig abgeglichen.
+    """
+
+    def __init__(self, data_dir: str = '/tmp/bestnote_data', db_path: Optional[str] = None):
+        self.data_dir = data_dir
+        self.db_path = db_path or os.path.join(data_dir, 'file_catalog.sqlite3')
+        self._reconciler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS catalog_files (
+                    mandant_id INTEGER NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    file_type TEXT NOT NULL,
+                    score_id INTEGER,
+                    part_id INTEGER,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (mandant_id, path)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_catalog_files_size ON catalog_files (mandant_id, size)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS catalog_mandants (
+                    mandant_id INTEGER PRIMARY KEY,
+                    reconciled_at REAL NOT NULL
+                )
+            ''')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def mandant_dir(self, mandant_id: int) -> str:
+        return os.path.join(self.data_dir, f'mandant_{int(mandant_id)}')
+
+    def absolute_path(self, mandant_id: int, path: str) -> str:
+        return os.path.join(self.mandant_dir(mandant_id), *path.split('/'))
+
+    @staticmethod
+    def _file_type(path: str) -> str:
+        return os.path.splitext(path)[1].lower().lstrip('.')
+
+    def record_file(self, mandant_id: int, path: str, score_id: Optional[int] = None, part_id: Optional[int] = None,
+                    sha256: Optional[str] = None) -> Dict[str, Any]:
+        """Trägt eine gespeicherte Datei ein oder aktualisiert sie (Pfad relativ zum Mandanten-Verzeichnis)
+
+        Eine bestehende Verknüpfung zu Werk/Stimme bleibt erhalten, wenn keine neue übergeben wird.
+        """
+        path = path.replace(os.sep, '/')
+        file_path = self.absolute_path(mandant_id, path)
+        stat = os.stat(file_path)
+        entry = {
+            'mandant_id': mandant_id, 'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'sha256': sha256 or AnalysisCache.hash_file(file_path), 'file_type': self._file_type(path),
+            'score_id': score_id, 'part_id': part_id, 'updated_at': time.time(),
+        }
+        with closing(self._connect()) as conn, conn:
+            conn.execute('''
+                INSERT INTO catalog_files VALUES (:mandant_id, :path, :size, :mtime_ns, :sha256, :file_type,
+                                                  :score_id, :part_id, :updated_at)
+                ON CONFLICT (mandant_id, path) DO UPDATE SET
+                    size = excluded.size, mtime_ns = excluded.mtime_ns, sha256 = excluded.sha256,
+                    file_type = excluded.file_type, updated_at = excluded.updated_at,
+                    score_id = COALESCE(excluded.score_id, score_id),
+                    part_id = COALESCE(excluded.part_id, part_id)
+            ''', entry)
+        return entry
+
+    def remove_file(self, mandant_id: int, path: str):
+        with closing(self._connect()) as conn, conn:
+            conn.execute('DELETE FROM catalog_files WHERE mandant_id = ? AND path = ?', (mandant_id, path.replace(os.sep, '/')))
+
+    def link_file(self, mandant_id: int, path: str, score_id: Optional[int], part_id: Optional[int] = None) -> bool:
+        """Verknüpft eine Datei mit Werk und Stimme"""
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute('UPDATE catalog_files SET score_id = ?, part_id = ? WHERE mandant_id = ? AND path = ?',
+                                  (score_id, part_id, mandant_id, path))
+            return cursor.rowcount > 0
+
+    def get_file(self, mandant_id: int, path: str) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT * FROM catalog_files WHERE mandant_id = ? AND path = ?', (mandant_id, path)).fetchone()
+        return dict(row) if row else None
+
+    def list_files(self, mandant_id: int, file_types: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Dateien des Mandanten nach Pfad sortiert, optional nach Dateityp (Endung ohne Punkt) gefiltert"""
+        self._ensure_reconciled(mandant_id)
+        query = 'SELECT * FROM catalog_files WHERE mandant_id = ?'
+        params: List[Any] = [mandant_id]
+        if file_types:
+            query += f" AND file_type IN ({', '.join('?' for _ in file_types)})"
+            params.extend(file_types)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(query + ' ORDER BY path', params).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self, mandant_id: int, largest: int = 3) -> Dict[str, Any]:
+        """Speicherbelegung des Mandanten: Gesamtgröße, Anzahl je Dateityp, größte Dateien"""
+        self._ensure_reconciled(mandant_id)
+        with closing(self._connect()) as conn:
+            files, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM catalog_files WHERE mandant_id = ?',
+                                        (mandant_id,)).fetchone()
+            by_type = {row['file_type']: row['count'] for row in conn.execute(
+                'SELECT file_type, COUNT(*) AS count FROM catalog_files WHERE mandant_id = ? GROUP BY file_type',
+                (mandant_id,))}
+            largest_files = [dict(row) for row in conn.execute(
+                'SELECT path, size FROM catalog_files WHERE mandant_id = ? ORDER BY size DESC LIMIT ?',
+                (mandant_id, largest))]
+        return {'files': files, 'total_size': total, 'files_by_type': by_type, 'largest_files': largest_files}
+
+    def _ensure_reconciled(self, mandant_id: int):
+        with closing(self._connect()) as conn:
+            known = conn.execute('SELECT 1 FROM catalog_mandants WHERE mandant_id = ?', (mandant_id,)).fetchone()
+        if known is None:
+            self.reconcile(mandant_id)
+
+    def reconcile(self, mandant_id: int) -> Dict[str, int]:
+        """Gleicht den Katalog mit dem Mandanten-Verzeichnis ab
+
+        Dateien mit unveränderter Größe und Änderungszeit werden nicht erneut gehasht.
+        """
+        mandant_dir = self.mandant_dir(mandant_id)
+        with closing(self._connect()) as conn:
+            known = {row['path']: (row['size'], row['mtime_ns'])
+                     for row in conn.execute('SELECT path, size, mtime_ns FROM catalog_files WHERE mandant_id = ?', (mandant_id,))}
+        stats = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+        seen = set()
+        for root, dirs, files in os.walk(mandant_dir):
+            for file in files:
+                file_path = os.path.join(root, file)
+                path = os.path.relpath(file_path, mandant_dir).replace(os.sep, '/')
+                seen.add(path)
+                try:
+                    stat = os.stat(file_path)
+                    if known.get(path) == (stat.st_size, stat.st_mtime_ns):
+                        stats['unchanged'] += 1
+                        continue
+                    self.record_file(mandant_id, path)
+                except FileNotFoundError:
+                    # Zwischen Auflisten und Lesen gelöscht
+                    seen.discard(path)
+                    continue
+                stats['updated' if path in known else 'added'] += 1
+
+        removed = [(mandant_id, path) for path in known if path not in seen]
+        with closing(self._connect()) as conn, conn:
+            conn.executemany('DELETE FROM catalog_files WHERE mandant_id = ? AND path = ?', removed)
+            conn.execute('INSERT OR REPLACE INTO catalog_mandants VALUES (?, ?)', (mandant_id, time.time()))
+        stats['removed'] = len(removed)
+        return stats
+
+    def reconcile_all(self) -> Dict[int, Dict[str, int]]:
+        """Gleicht alle Mandanten-Verzeichnisse und bereits katalogisierten Mandanten ab"""
+        mandant_ids = set()
+        if os.path.isdir(self.data_dir):
+            for name in os.listdir(self.data_dir):
+                match = MANDANT_DIR_PATTERN.fullmatch(name)
+                if match and os.path.isdir(os.path.join(self.data_dir, name)):
+                    mandant_ids.add(int(match.group(1)))
+        with closing(self._connect()) as conn:
+            mandant_ids.update(row[0] for row in conn.execute('SELECT mandant_id FROM catalog_mandants'))
+        return {mandant_id: self.reconcile(mandant_id) for mandant_id in sorted(mandant_ids)}
+
+    def start_reconciler(self, interval: float = 900.0):
+        """Startet den Abgleich aller Mandanten als Hintergrund-Thread (alle ``interval`` Sekunden)"""
+        if self._reconciler is not None and self._reconciler.is_alive():
+            return
+        self._stop.clear()
+        self._reconciler = threading.Thread(target=self._reconcile_loop, args=(interval,),
+                                            name='file-catalog-reconciler', daemon=True)
+        self._reconciler.start()
+
+    def stop_reconciler(self):
+        self._stop.set()
+        if self._reconciler is not None:
+            self._reconciler.join(timeout=5)
+            self._reconciler = None
+
+    def _reconcile_loop(self, interval: float):
+        while not self._stop.is_set():
+            try:
+                self.reconcile_all()
+            except Exception:
+                # Der nächste Durchlauf versucht es erneut
+                pass
+            self._stop.wait(interval)
@@ -1,36 +1,114 @@
 import io
-import csv
+import posixpath
+import re
+import tempfile
 import zipfile
 import os
-from typing import List, Dict, Any, Optional
-from backend.models import Score, Part, PartFile
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, List, Dict, Any, Optional, Tuple, Union
+from backend.services.ai_classification import AIClassificationService
+from backend.services.blob_store import BlobStore
+from backend.services.csv_import import CsvScoreParser
+from backend.services.file_catalog import FileCatalog
+from backend.services.jobs import Job, JobManager
+from backend.services.part_booklets import part_name_from_path
+from backend.services.score_store import ScoreStore
+from backend.services.search_index import SearchIndexService
+
+# Zeilen je Validierungs- und Schreibblock beim CSV-Import
+CSV_BATCH_SIZE = 1000
+# Höchstzahl einzeln gemeldeter Fehler in der Import-Zusammenfassung
+MAX_REPORTED_ERRORS = 100
+
+# Grenzen für ZIP-Importe, geprüft am zentralen Verzeichnis vor dem Entpacken
+ZIP_MAX_TOTAL_SIZE = 4 * 1024 ** 3
+ZIP_MAX_MEMBERS = 10000
+ZIP_MAX_RATIO = 100
+# Kleine Einträge (Text, XML) dürfen beliebig gut komprimiert sein
+ZIP_RATIO_MIN_SIZE = 1024 * 1024
+ZIP_EXTRACT_WORKERS = 4
+IMPORT_EXTENSIONS = ('.pdf', '.mid', '.xml')
+
+# Vorschau: CSV-Zeilen in der Stichprobe, höchstens gelistete ZIP-Einträge
+PREVIEW_ROWS = 20
+PREVIEW_MAX_ENTRIES = 500
+# Dateityp nach Endung (die Vorschau liest nur das zentrale Verzeichnis, keine Inhalte)
+FILE_TYPES = {'.pdf': 'pdf', '.mid': 'midi', '.midi': 'midi', '.xml': 'musicxml', '.musicxml': 'musicxml',
+              '.mxl': 'musicxml', '.csv': 'csv', '.txt': 'text'}
+_SCORE_NAME = re.compile(r'partitur|score|direktion|dirigent', re.IGNORECASE)
 
 
 class ImportFileService:
     def import_csv(self, csv_content: str, mandant_id: int) -> dict:
-        # Dummy-Implementierung: Zählt Zeilen und gibt sie zurück
-        works = self.parse_csv(csv_content, mandant_id)
-        return {
-            "imported": len(works),
-            "works": works,
-            "warnings": []
-        }
+        return self.import_csv_stream(io.BytesIO(csv_content.encode('utf-8')), mandant_id)
+
+    def import_csv_stream(self, stream: BinaryIO, mandant_id: int, batch_size: int = CSV_BATCH_SIZE) -> Dict[str, Any]:
+        """Importiert eine CSV-Datei zeilenweise aus einem Binärstrom (z.B. der auf Platte gepufferten Upload-Datei)
+
+        Die Zeilen werden blockweise geprüft und je Block in einer Transaktion
+        gespeichert; der Speicherbedarf hängt nur von ``batch_size`` ab.
+        Zurück kommt eine Zusammenfassung mit Zählern und den ersten Fehlern.
+        """
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        try:
+            parser = CsvScoreParser(text, batch_size)
+            summary = {'success': True, 'rows': 0, 'imported': 0, 'skipped': 0, 'batches': 0,
+                       'errors': [], 'errors_truncated': False, 'warnings': []}
+            for scores, errors, count in parser.batches():
+                if scores:
+                    summary['imported'] += self.scores.add_many(mandant_id, scores)
+                summary['skipped'] += len(errors)
+                room = MAX_REPORTED_ERRORS - len(summary['errors'])
+                summary['errors'].extend(errors[:room])
+                summary['errors_truncated'] |= len(errors) > room
+                summary['rows'] += count
+                summary['batches'] += 1
+        finally:
+            # Der Upload gehört dem Aufrufer und bleibt offen
+            text.detach()
+        summary['imported_scores'] = summary['imported']
+        return summary
 
     def import_zip(self, zip_content: bytes, mandant_id: int) -> dict:
-        # Dummy-Implementierung: Listet Dateien im ZIP auf
-        warnings = []
+        fd, zip_path = tempfile.mkstemp(suffix='.zip')
         try:
-            with zipfile.ZipFile(io.BytesIO(zip_content), 'r') as zip_ref:
-                files = zip_ref.namelist()
-        except Exception as e:
-            warnings.append(f"ZIP-Fehler: {str(e)}")
-            files = []
+            with os.fdopen(fd, 'wb') as f:
+                f.write(zip_content)
+            return self.import_zip_file(zip_path, mandant_id)
+        finally:
+            os.remove(zip_path)
+
+    def import_zip_file(self, zip_path: str, mandant_id: int) -> Dict[str, Any]:
+        """Importiert die Noten-Dateien eines ZIP-Archivs auf Platte in den Speicher des Mandanten"""
+        try:
+            extracted_files = self.extract_zip(zip_path, self.catalog.data_dir, mandant_id)
+        except zipfile.BadZipFile as e:
+            raise ValueError(f"ZIP-Fehler: {str(e)}")
+        mandant_dir = self.catalog.mandant_dir(mandant_id)
+        files = [os.path.relpath(file_path, mandant_dir).replace(os.sep, '/') for file_path in extracted_files]
+        index_job = self.index_files(self.catalog.data_dir, mandant_id, extracted_files)
         return {
+            "success": True,
             "imported": len(files),
+            "imported_files": len(files),
             "files": files,
-            "warnings": warnings
+            "index_job_id": index_job.id if index_job else None,
+            "warnings": []
         }
+
     def __init__(self):
+        self.catalog = FileCatalog()
+        # Extraktor mit dem gemeinsamen Analyse-Cache: eine spätere Klassifikation liest den Text nicht erneut
+        self.search_index = SearchIndexService(extractor=AIClassificationService(), catalog=self.catalog)
+        # Volltextindizierung (ggf. mit OCR) läuft nach dem Import im Hintergrund, ein Auftrag zur Zeit
+        self.index_jobs = JobManager(max_workers=1)
+        # Inhalte liegen einmal je SHA-256 neben den Mandanten-Verzeichnissen (Hardlinks)
+        self.blobs = BlobStore(os.path.join(self.catalog.data_dir, 'blobs'))
+        self.scores = ScoreStore()
+        self.zip_max_total_size = ZIP_MAX_TOTAL_SIZE
+        self.zip_max_members = ZIP_MAX_MEMBERS
+        self.zip_max_ratio = ZIP_MAX_RATIO
+        self.zip_extract_workers = ZIP_EXTRACT_WORKERS
         self.mapping = {
             'title': 'Titel',
             'composer': 'Komponist',
@@ -40,85 +118,305 @@ class ImportFileService:
 
     def validate_csv(self, csv_content: str) -> bool:
         try:
-            reader = csv.DictReader(csv_content.splitlines())
-            required_fields = ['Titel', 'Komponist']
-            headers = reader.fieldnames
-            if headers is None:
-                return False
-            return all(field in headers for field in required_fields)
+            return CsvScoreParser(io.StringIO(csv_content, newline='')).valid
         except Exception:
             return False
 
     def parse_csv(self, csv_content: str, mandant_id: Optional[int] = None) -> List[Dict[str, Any]]:
-        reader = csv.DictReader(csv_content.splitlines())
-        scores = []
-        for row in reader:
-            score = Score(
-                title=row.get('Titel', ''),
-                composer=row.get('Komponist', ''),
-                year=row.get('Jahr', ''),
-                metadata=row.get('Metadaten', '')
-            )
-            if mandant_id is not None:
-                score.mandant_id = mandant_id
-            scores.append(score.dict())
+        """Gültige Werke der CSV; fehlerhafte Zeilen werden übersprungen (siehe ``preview_csv``)"""
+        scores, _, _ = CsvScoreParser(io.StringIO(csv_content, newline='')).parse()
+        if mandant_id is not None:
+            for score in scores:
+                score['mandant_id'] = mandant_id
         return scores
 
-    def preview_csv(self, csv_content: str) -> dict:
-        valid = self.validate_csv(csv_content)
-        warnings = []
-        works = []
-        parts = []
-        if valid:
-            works = self.parse_csv(csv_content)
-        else:
-            warnings.append("CSV-Format ungültig oder fehlende Felder.")
+    def preview_csv(self, csv_content: str, sample_rows: int = PREVIEW_ROWS) -> Dict[str, Any]:
+        return self.preview_csv_stream(io.BytesIO(csv_content.encode('utf-8')), sample_rows)
+
+    def preview_csv_stream(self, stream: BinaryIO, sample_rows: int = PREVIEW_ROWS) -> Dict[str, Any]:
+        """Vorschau aus den ersten ``sample_rows`` Zeilen plus schneller Zählung aller Zeilen
+
+        Geprüft werden nur die Stichprobe (Zeilenfehler als Warnungen); die
+        Gesamtzahl kommt aus dem Zählen der Zeilenumbrüche im Binärstrom. Sie ist
+        nur dann geschätzt, wenn die Stichprobe mehrzeilige Felder oder Leerzeilen enthält.
+        """
+        start = stream.tell()
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        try:
+            parser = CsvScoreParser(text, sample_rows)
+            warnings = []
+            works: List[Dict[str, Any]] = []
+            sampled = 0
+            exact = True
+            if parser.valid:
+                works, errors, sampled = next(parser.batches(), ([], [], 0))
+                warnings.extend(f"Zeile {error['line']}: {error['error']}" for error in errors)
+                exact = parser.line_num == sampled + 1
+            else:
+                warnings.append("CSV-Format ungültig oder fehlende Felder.")
+        finally:
+            # Der Strom gehört dem Aufrufer und bleibt offen
+            text.detach()
+
+        stream.seek(start)
+        lines = 0
+        last = b''
+        for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+            lines += chunk.count(b'\n')
+            last = chunk
+        if last and not last.endswith(b'\n'):
+            lines += 1
         return {
+            "type": "csv",
+            "valid": parser.valid,
             "works": works,
-            "parts": parts,
-            "warnings": warnings
+            "parts": [],
+            "warnings": warnings,
+            "sampled_rows": sampled,
+            "total_rows": max(lines - 1, sampled),
+            "total_rows_exact": exact,
         }
 
-    def preview_zip(self, zip_content: bytes) -> dict:
+    def preview_zip(self, zip_content: Union[bytes, str, BinaryIO]) -> Dict[str, Any]:
+        """Vorschau aus dem zentralen Verzeichnis einer ZIP-Datei (Inhalt, Pfad oder Dateiobjekt)
+
+        Gelesen werden nur Namen, Größen und Kompressionsraten, keine Inhalte; die
+        Laufzeit hängt von der Zahl der Einträge ab, nicht von der Größe des
+        Archivs. Werke und Stimmen werden aus der Ordnerstruktur abgeleitet.
+        """
+        if isinstance(zip_content, bytes):
+            zip_content = io.BytesIO(zip_content)
         warnings = []
-        works = []
-        parts = []
         try:
-            with zipfile.ZipFile(io.BytesIO(zip_content), 'r') as zip_ref:
-                files = zip_ref.namelist()
-                # Optional: weitere Logik für ZIP-Inhalt
+            with zipfile.ZipFile(zip_content, 'r') as zip_ref:
+                infos = [info for info in zip_ref.infolist() if not info.is_dir()]
+                try:
+                    self.check_zip_limits(zip_ref)
+                except ValueError as e:
+                    warnings.append(str(e))
         except Exception as e:
-            warnings.append(f"ZIP-Fehler: {str(e)}")
-            files = []
+            return {"type": "zip", "valid": False, "works": [], "parts": [], "warnings": [f"ZIP-Fehler: {str(e)}"],
+                    "error": "Ungültiges ZIP-Format"}
+
+        entries = [self._preview_entry(info) for info in infos]
+        works, parts = self._group_entries(entries)
+        file_types: Dict[str, int] = {}
+        for entry in entries:
+            file_types[entry['type']] = file_types.get(entry['type'], 0) + 1
+        if not parts:
+            warnings.append("Keine PDF-, MIDI- oder XML-Dateien im Archiv")
         return {
+            "type": "zip",
+            "valid": bool(parts),
             "works": works,
-            "parts": parts,
-            "warnings": warnings + [f"Dateien im ZIP: {files}"]
+            "parts": parts[:PREVIEW_MAX_ENTRIES],
+            "warnings": warnings,
+            "files": [entry['name'] for entry in entries[:PREVIEW_MAX_ENTRIES]],
+            "entries": entries[:PREVIEW_MAX_ENTRIES],
+            "entries_truncated": len(entries) > PREVIEW_MAX_ENTRIES,
+            "total_files": len(entries),
+            "importable_files": len(parts),
+            "total_size": sum(entry['size'] for entry in entries),
+            "compressed_size": sum(entry['compressed_size'] for entry in entries),
+            "file_types": file_types,
+        }
+
+    @staticmethod
+    def _preview_entry(info: zipfile.ZipInfo) -> Dict[str, Any]:
+        extension = os.path.splitext(info.filename)[1].lower()
+        return {
+            "name": info.filename,
+            "size": info.file_size,
+            "compressed_size": info.compress_size,
+            "ratio": round(info.file_size / info.compress_size, 1) if info.compress_size else None,
+            "type": FILE_TYPES.get(extension, 'other'),
+            "importable": info.filename.endswith(IMPORT_EXTENSIONS),
         }
 
+    @staticmethod
+    def _group_entries(entries: List[Dict[str, Any]]):
+        """Ordnet importierbare Dateien Werken (Ordner) und Stimmen (Dateiname) zu
+
+        Der Ordner ist das Werk, wie bei den Stimmenheften (``directory``); Dateien
+        mit "Partitur"/"Score" im Namen gelten als Partitur, MIDI-Dateien als Audio.
+        """
+        pieces: Dict[str, Dict[str, Any]] = {}
+        parts = []
+        for entry in entries:
+            if not entry['importable']:
+                continue
+            directory, filename = posixpath.split(entry['name'])
+            title = posixpath.basename(directory) or 'Ohne Ordner'
+            if entry['type'] == 'midi':
+                role = 'midi'
+            elif _SCORE_NAME.search(filename):
+                role = 'score'
+            else:
+                role = 'part'
+            parts.append({"piece": title, "name": part_name_from_path(filename), "file_path": entry['name'],
+                          "type": entry['type'], "role": role})
+            piece = pieces.setdefault(directory, {"title": title, "directory": directory, "files": 0, "parts": 0,
+                                                  "has_score": False, "size": 0})
+            piece['files'] += 1
+            piece['parts'] += role == 'part'
+            piece['has_score'] |= role == 'score'
+            piece['size'] += entry['size']
+        works = sorted(pieces.values(), key=lambda piece: piece['directory'].casefold())
+        return works, parts
+
+    @staticmethod
+    def _member_parts(name: str) -> List[str]:
+        return [part for part in name.replace('\\', '/').split('/') if part not in ('', '.')]
+
+    def check_zip_limits(self, zip_ref: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+        """Prüft Anzahl, Gesamtgröße, Kompressionsrate und Pfade der Einträge; ValueError bei Verstoß
+
+        Grundlage sind nur die Angaben im zentralen Verzeichnis, es wird nichts entpackt.
+        Beim Entpacken liest zipfile nie mehr als die angegebene Größe eines Eintrags.
+        """
+        infos = zip_ref.infolist()
+        if len(infos) > self.zip_max_members:
+            raise ValueError(f"ZIP enthält zu viele Einträge ({len(infos)}, erlaubt {self.zip_max_members})")
+        total_size = 0
+        for info in infos:
+            if info.filename.startswith(('/', '\\')) or '..' in self._member_parts(info.filename):
+                raise ValueError(f"Unzulässiger Pfad im ZIP: {info.filename}")
+            total_size += info.file_size
+            if info.file_size >= ZIP_RATIO_MIN_SIZE and info.file_size > self.zip_max_ratio * max(info.compress_size, 1):
+                raise ValueError(f"Verdächtige Kompressionsrate bei {info.filename} "
+                                 f"({info.file_size // max(info.compress_size, 1)}:1, erlaubt {self.zip_max_ratio}:1)")
+        if total_size > self.zip_max_total_size:
+            raise ValueError(f"ZIP ist entpackt zu groß ({total_size} Bytes, erlaubt {self.zip_max_total_size})")
+        return infos
+
     def extract_zip(self, zip_path: str, extract_to: str, mandant_id: int) -> List[str]:
-        """Extrahiert ZIP-Datei in mandant-spezifisches Verzeichnis"""
+        """Extrahiert ZIP-Datei in mandant-spezifisches Verzeichnis
+
+        Das Archiv wird vorab gegen die Grenzen geprüft. PDF-, MIDI- und XML-Einträge
+        werden parallel entpackt; jeder Worker öffnet das Archiv selbst.
+        """
         # Mandant-spezifisches Verzeichnis erstellen
         mandant_dir = os.path.join(extract_to, f"mandant_{mandant_id}")
         os.makedirs(mandant_dir, exist_ok=True)
-
-        extracted_files = []
+        catalog, blobs = self._storage(extract_to)
 
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            for file_info in zip_ref.filelist:
-                if file_info.filename.endswith(('.pdf', '.mid', '.xml')):
-                    zip_ref.extract(file_info, mandant_dir)
-                    extracted_files.append(os.path.join(mandant_dir, file_info.filename))
+            infos = self.check_zip_limits(zip_ref)
+        members = [info for info in infos if not info.is_dir() and info.filename.endswith(IMPORT_EXTENSIONS)]
+        # Große Einträge zuerst reihum verteilen, damit die Worker ähnlich viel zu tun haben
+        by_size = sorted(members, key=lambda info: info.file_size, reverse=True)
+        workers = max(1, min(self.zip_extract_workers, len(members)))
+        hashes: Dict[str, str] = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='zip-extract') as executor:
+            futures = [executor.submit(self._extract_members, zip_path, by_size[index::workers], mandant_dir,
+                                       mandant_id, catalog, blobs)
+                       for index in range(workers)]
+            for future in futures:
+                hashes.update(future.result())
 
+        extracted_files = [os.path.join(mandant_dir, *self._member_parts(info.filename)) for info in members]
+        for file_path in extracted_files:
+            catalog.record_file(mandant_id, os.path.relpath(file_path, mandant_dir), sha256=hashes[file_path])
         return extracted_files
 
+    def _storage(self, data_dir: str) -> Tuple[FileCatalog, BlobStore]:
+        """Dateikatalog und Inhaltsspeicher für ein Datenverzeichnis"""
+        catalog = self.catalog
+        if os.path.realpath(data_dir) != os.path.realpath(catalog.data_dir):
+            catalog = FileCatalog(data_dir)
+        blobs = self.blobs
+        if os.path.realpath(blobs.root) != os.path.realpath(os.path.join(data_dir, 'blobs')):
+            blobs = BlobStore(os.path.join(data_dir, 'blobs'))
+        return catalog, blobs
+
+    @staticmethod
+    def _linked_to(blobs: BlobStore, file_path: str, sha256: Optional[str]) -> bool:
+        """Ist die Datei ein Hardlink auf den Inhalt (und damit eine gezählte Referenz)?"""
+        blob_path = blobs.path(sha256) if sha256 else None
+        return bool(blob_path) and os.path.exists(file_path) and os.path.exists(blob_path) \
+            and os.path.samefile(file_path, blob_path)
+
+    def _extract_members(self, zip_path: str, members: List[zipfile.ZipInfo], mandant_dir: str, mandant_id: int,
+                         catalog: FileCatalog, blobs: BlobStore) -> Dict[str, str]:
+        """Übernimmt die Einträge in den Inhaltsspeicher und verlinkt sie; gibt Pfad -> SHA-256 zurück
+
+        Unveränderte Dateien (gleicher Inhalt, schon verlinkt) werden nicht angefasst.
+        """
+        hashes = {}
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            for info in members:
+                parts = self._member_parts(info.filename)
+                target = os.path.join(mandant_dir, *parts)
+                previous = catalog.get_file(mandant_id, '/'.join(parts))
+                previous_sha = previous['sha256'] if previous else None
+                previous_linked = self._linked_to(blobs, target, previous_sha)
+                # Ablegen und Verlinken in einem Schritt; ein unveränderter Link bleibt stehen
+                sha256, _, _ = blobs.store_zip_member(zip_ref, info, target)
+                hashes[target] = sha256
+                if previous_linked and previous_sha != sha256:
+                    blobs.release(previous_sha)
+        return hashes
+
+    def delete_file(self, mandant_id: int, path: str) -> bool:
+        """Löscht eine Datei des Mandanten samt Katalog- und Indexeintrag
+
+        Der Inhalt selbst wird erst gelöscht, wenn keine andere Datei mehr darauf verweist.
+        """
+        catalog, blobs = self._storage(self.catalog.data_dir)
+        path = path.replace(os.sep, '/').strip('/')
+        file_path = catalog.absolute_path(mandant_id, path)
+        if not os.path.realpath(file_path).startswith(os.path.realpath(catalog.mandant_dir(mandant_id)) + os.sep):
+            raise ValueError(f"Ungültiger Pfad: {path}")
+        entry = catalog.get_file(mandant_id, path)
+        if entry is None and not os.path.exists(file_path):
+            return False
+        linked = entry is not None and self._linked_to(blobs, file_path, entry['sha256'])
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        catalog.remove_file(mandant_id, path)
+        self.search_index.remove_document(mandant_id, path)
+        if linked:
+            blobs.release(entry['sha256'])
+        return True
+
+    def index_files(self, data_dir: str, mandant_id: int, file_paths: List[str]) -> Optional[Job]:
+        """Reiht die Volltextindizierung der PDFs als Hintergrund-Auftrag ein (None ohne PDFs)"""
+        pdf_paths = [file_path for file_path in file_paths if file_path.endswith('.pdf')]
+        if not pdf_paths:
+            return None
+        search_index = self.search_index
+        if os.path.realpath(data_dir) != os.path.realpath(search_index.data_dir):
+            search_index = SearchIndexService(data_dir, search_index._extractor)
+        mandant_dir = os.path.join(data_dir, f"mandant_{mandant_id}")
+        return self.index_jobs.submit(
+            mandant_id, 'search_index',
+            lambda job: self._index_pdfs(job, search_index, mandant_dir, pdf_paths),
+            total=len(pdf_paths)
+        )
+
+    @staticmethod
+    def _index_pdfs(job: Job, search_index: SearchIndexService, mandant_dir: str, pdf_paths: List[str]) -> Dict[str, int]:
+        stats = {'indexed': 0, 'unchanged': 0, 'errors': 0}
+        for file_path in pdf_paths:
+            file_id = os.path.relpath(file_path, mandant_dir).replace(os.sep, '/')
+            try:
+                stats['indexed' if search_index.index_pdf(job.mandant_id, file_id, file_path) else 'unchanged'] += 1
+            except Exception:
+                # Eine unlesbare Datei hält die übrigen nicht auf
+                stats['errors'] += 1
+            job.advance()
+        return stats
+
     def preview_import(self, file_path: str, mandant_id: Optional[int] = None) -> Dict[str, Any]:
         """Erstellt Vorschau für Import-Datei"""
         if file_path.endswith('.csv'):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            is_valid = self.validate_csv(content)
-            scores = self.parse_csv(content, mandant_id) if is_valid else []
+            with open(file_path, 'r', encoding='utf-8-sig', newline='') as f:
+                parser = CsvScoreParser(f)
+                is_valid = parser.valid
+                scores = parser.parse()[0] if is_valid else []
+            if mandant_id is not None:
+                for score in scores:
+                    score['mandant_id'] = mandant_id
             return {
                 'type': 'csv',
                 'valid': is_valid,
@@ -0,0 +1,215 @@
+import asyncio
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+FINISHED_STATES = ('completed', 'failed')
+
+
+class Job:
+    """Hintergrund-Auftrag mit Fortschritt und Ereignisliste (für Polling und Server-Sent Events)"""
+
+    def __init__(self, mandant_id: int, kind: str, total: int = 0):
+        self.id = uuid.uuid4().hex
+        self.mandant_id = mandant_id
+        self.kind = kind
+        self.status = 'queued'
+        self.total = total
+        self.completed = 0
+        self.results: List[Dict[str, Any]] = []
+        self.result: Optional[Any] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.finished_monotonic: Optional[float] = None
+        self._events: List[Dict[str, Any]] = []
+        self._waiters: List[Any] = []
+        self._lock = threading.Lock()
+
+    def emit(self, event_type: str, data: Dict[str, Any]):
+        """Hängt ein Ereignis an und weckt wartende Abonnenten"""
+        with self._lock:
+            self._events.append({'event': event_type, 'data': data})
+        self._wake()
+
+    def _wake(self):
+        with self._lock:
+            waiters, self._waiters = self._waiters, []
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(waiter.set)
+            except RuntimeError:
+                # Event-Loop bereits geschlossen (Client getrennt)
+                pass
+
+    def advance(self, result: Optional[Dict[str, Any]] = None):
+        """Meldet ein fertiges Teilergebnis (z.B. eine Datei)"""
+        with self._lock:
+            self.completed += 1
+            if result is not None:
+                self.results.append(result)
+            progress = {'completed': self.completed, 'total': self.total, 'result': result}
+        self.emit('progress', progress)
+
+    def set_progress(self, completed: int, total: Optional[int] = None):
+        """Setzt den Fortschritt direkt (für Aufträge ohne einzelne Teilergebnisse)"""
+        with self._lock:
+            self.completed = completed
+            if total is not None:
+                self.total = total
+            progress = {'completed': self.completed, 'total': self.total, 'result': None}
+        self.emit('progress', progress)
+
+    def set_status(self, status: str, error: Optional[str] = None):
+        with self._lock:
+            self.status = status
+            self.error = error
+            if status == 'running':
+                self.started_at = datetime.now().isoformat()
+            elif status in FINISHED_STATES:
+                self.finished_at = datetime.now().isoformat()
+                self.finished_monotonic = time.monotonic()
+            # Statuswechsel und Ereignis atomar, damit Abonnenten das Abschlussereignis sicher erhalten
+            self._events.append({'event': status, 'data': {
+                'status': status, 'completed': self.completed, 'total': self.total, 'error': error
+            }})
+        self._wake()
+
+    def to_dict(self, include_results: bool = True) -> Dict[str, Any]:
+        with self._lock:
+            data = {
+                'job_id': self.id,
+                'mandant_id': self.mandant_id,
+                'kind': self.kind,
+                'status': self.status,
+                'total': self.total,
+                'completed': self.completed,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'error': self.error
+            }
+            if include_results:
+                data['results'] = list(self.results)
+                data['result'] = self.result
+        return data
+
+    async def events(self, start: int = 0) -> AsyncIterator[Dict[str, Any]]:
+        """Liefert alle Ereignisse ab ``start`` und wartet auf neue, bis der Auftrag beendet ist"""
+        loop = asyncio.get_running_loop()
+        index = start
+        while True:
+            waiter = None
+            with self._lock:
+                new_events = self._events[index:]
+                finished = self.status in FINISHED_STATES
+                if not new_events and not finished:
+                    waiter = asyncio.Event()
+                    self._waiters.append((loop, waiter))
+            if new_events:
+                index += len(new_events)
+                for event in new_events:
+                    yield event
+                continue
+            if finished:
+                return
+            await waiter.wait()
+
+
+class JobManager:
+    """Führt Aufträge auf einem begrenzten Thread-Pool außerhalb des Event-Loops aus
+
+    ``max_workers`` begrenzt die gleichzeitig laufenden Aufträge insgesamt,
+    ``max_per_mandant`` zusätzlich je Mandant. Aufträge über dem Mandanten-Limit
+    warten außerhalb des Pools und belegen dort keinen Platz für andere Mandanten.
+    """
+
+    def __init__(self, max_workers: int = 2, retention_seconds: float = 3600, max_per_mandant: Optional[int] = None):
+        self.max_workers = max_workers
+        self.retention_seconds = retention_seconds
+        self.max_per_mandant = max_per_mandant
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bestnote-job')
+        self._jobs: Dict[str, Job] = {}
+        self._active: Dict[int, int] = defaultdict(int)
+        self._waiting: Dict[int, Deque[Tuple[Job, Callable[[Job], Any]]]] = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def submit(self, mandant_id: int, kind: str, func: Callable[[Job], Any], total: int = 0) -> Job:
+        """Reiht einen Auftrag ein; ``func(job)`` läuft im Worker-Thread und meldet Fortschritt über ``job``"""
+        job = Job(mandant_id, kind, total)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+            dispatch = self.max_per_mandant is None or self._active[mandant_id] < self.max_per_mandant
+            if dispatch:
+                self._active[mandant_id] += 1
+            else:
+                self._waiting[mandant_id].append((job, func))
+        job.emit('queued', {'status': 'queued', 'total': total})
+        if dispatch:
+            self._executor.submit(self._run, job, func)
+        return job
+
+    def _run(self, job: Job, func: Callable[[Job], Any]):
+        job.set_status('running')
+        try:
+            job.result = func(job)
+        except Exception as e:
+            job.set_status('failed', str(e))
+        else:
+            job.set_status('completed')
+        finally:
+            self.release(job.mandant_id)
+
+    def acquire(self, mandant_id: int) -> bool:
+        """Belegt einen Platz des Mandanten für Arbeit außerhalb des Pools (z.B. Streaming)
+
+        Gibt False zurück, wenn das Mandanten-Limit erreicht ist; sonst muss der
+        Platz mit ``release`` wieder freigegeben werden.
+        """
+        with self._lock:
+            if self.max_per_mandant is not None and self._active.get(mandant_id, 0) >= self.max_per_mandant:
+                return False
+            self._active[mandant_id] += 1
+        return True
+
+    def release(self, mandant_id: int):
+        """Gibt den Platz des Mandanten frei oder reicht ihn an seinen nächsten wartenden Auftrag weiter"""
+        with self._lock:
+            waiting = self._waiting.get(mandant_id)
+            if waiting:
+                next_job = waiting.popleft()
+            else:
+                next_job = None
+                self._active[mandant_id] -= 1
+                if not self._active[mandant_id]:
+                    del self._active[mandant_id]
+                self._waiting.pop(mandant_id, None)
+        if next_job is not None:
+            self._executor.submit(self._run, *next_job)
+
+    def get(self, job_id: str, mandant_id: int) -> Optional[Job]:
+        """Gibt den Auftrag nur für den besitzenden Mandanten zurück"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.mandant_id != mandant_id:
+            return None
+        return job
+
+    def list_jobs(self, mandant_id: int, kind: Optional[str] = None) -> List[Job]:
+        with self._lock:
+            return [job for job in self._jobs.values()
+                    if job.mandant_id == mandant_id and (kind is None or job.kind == kind)]
+
+    def _prune(self):
+        """Entfernt beendete Aufträge nach Ablauf der Aufbewahrungszeit"""
+        now = time.monotonic()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_monotonic is not None and now - job.finished_monotonic > self.retention_seconds]
+        for job_id in expired:
+            del self._jobs[job_id]
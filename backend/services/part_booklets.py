@@ -0,0 +1,150 @@
+"""Stimmenhefte je Musiker für ein Konzertprogramm
+
+Die Stimmen aller Werke eines Programms werden nach Stimme (``Trompete 1``) oder
+Instrument (``Trompete``) gruppiert und je Gruppe zu einem PDF-Heft mit
+Lesezeichen zusammengefügt. PyMuPDF übernimmt die Seiten unverändert
+(``insert_pdf``), ohne sie neu zu rendern; die Hefte entstehen parallel im
+gemeinsamen Prozess-Pool.
+"""
+import os
+import re
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from backend.services.file_catalog import FileCatalog
+from backend.services.process_pool import SharedProcessPool, process_pool
+
+GROUP_BY = ('part', 'instrument')
+
+# Stimmnummern vor oder nach dem Instrument: "1. Trompete", "Trompete 2", "Posaune II"
+_VOICE_NUMBER = re.compile(r'^\s*(?:\d+|[IVX]+)\.?\s+|\s+(?:\d+|[IVX]+)\.?\s*$', re.IGNORECASE)
+
+
+def part_name_from_path(path: str) -> str:
+    """Stimmname aus dem Dateinamen (``trompete_1.pdf`` -> ``trompete 1``)"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return ' '.join(re.split(r'[\s_]+', stem)).strip()
+
+
+def group_name(part_name: str, group_by: str = 'part') -> str:
+    """Name des Hefts, in das eine Stimme gehört"""
+    name = ' '.join(part_name.split())
+    if group_by == 'instrument':
+        name = _VOICE_NUMBER.sub('', name).strip() or name
+    return name[:1].upper() + name[1:]
+
+
+def booklet_filename(name: str, taken: Optional[Set[str]] = None) -> str:
+    """Dateiname des Hefts; mit ``taken`` (bereits vergebene Namen, kleingeschrieben) eindeutig
+
+    Verschiedene Heftnamen können auf denselben Dateinamen führen ("Trompete/1" und
+    "Trompete_1"); Groß- und Kleinschreibung zählt dabei nicht, wie auf vielen Dateisystemen.
+    """
+    stem = re.sub(r'[^\w\- ]+', '_', name).strip()
+    filename = stem + '.pdf'
+    if taken is not None:
+        index = 1
+        while filename.casefold() in taken:
+            index += 1
+            filename = f'{stem} ({index}).pdf'
+        taken.add(filename.casefold())
+    return filename
+
+
+def _build_booklet(target_path: str, title: str, entries: List[Tuple[str, str, str]], with_parts: bool) -> Dict[str, Any]:
+    """Fügt die Stimmen (Werk, Stimme, Datei) zu einem Heft zusammen; läuft im Worker-Prozess"""
+    import fitz  # PyMuPDF
+
+    toc = []
+    skipped = []
+    current_piece = None
+    with fitz.open() as booklet:
+        for piece, part, file_path in entries:
+            try:
+                with fitz.open(file_path) as source:
+                    if source.page_count == 0:
+                        raise ValueError('keine Seiten')
+                    first_page = booklet.page_count + 1
+                    booklet.insert_pdf(source)
+            except Exception as e:
+                skipped.append({'piece': piece, 'part': part, 'error': str(e) or type(e).__name__})
+                continue
+            # Die Einträge kommen in Programmreihenfolge, Stimmen eines Werks folgen aufeinander
+            if piece != current_piece:
+                toc.append([1, piece, first_page])
+                current_piece = piece
+            if with_parts:
+                toc.append([2, part, first_page])
+        if booklet.page_count == 0:
+            return {'title': title, 'pages': 0, 'skipped': skipped}
+        booklet.set_toc(toc)
+        booklet.set_metadata({'title': title, 'creator': 'BestNote'})
+        booklet.save(target_path, garbage=3, deflate=True)
+        return {'title': title, 'pages': booklet.page_count, 'skipped': skipped}
+
+
+class PartBookletService:
+    def __init__(self, catalog: Optional[FileCatalog] = None, pool: Optional[SharedProcessPool] = None):
+        self.catalog = catalog or FileCatalog()
+        self.pool = pool or process_pool
+
+    def plan(self, mandant_id: int, program: List[Dict[str, Any]], group_by: str = 'part') -> Dict[str, Any]:
+        """Ordnet die Stimmen des Programms den Heften zu
+
+        Jedes Werk im Programm hat einen ``title`` und entweder ein ``directory``
+        (alle PDFs darunter, Stimmname aus dem Dateinamen) oder ausdrücklich
+        ``parts`` mit ``name`` und ``file_path``. Pfade sind relativ zum
+        Mandanten-Verzeichnis; was nicht im Dateikatalog steht, landet in ``missing``.
+        """
+        if group_by not in GROUP_BY:
+            raise ValueError(f'Unbekannte Gruppierung: {group_by}')
+        pdf_files = None
+        groups: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        for piece in program:
+            title = piece['title']
+            if piece.get('parts'):
+                parts = [(part['name'], part['file_path'].strip('/')) for part in piece['parts']]
+            else:
+                if pdf_files is None:
+                    pdf_files = [entry['path'] for entry in self.catalog.list_files(mandant_id, ['pdf'])]
+                prefix = (piece.get('directory') or title).strip('/') + '/'
+                parts = [(part_name_from_path(path), path) for path in pdf_files if path.startswith(prefix)]
+                if not parts:
+                    missing.append({'piece': title, 'part': None, 'file_path': prefix})
+            for part, path in sorted(parts, key=lambda item: item[0].casefold()):
+                if self.catalog.get_file(mandant_id, path) is None:
+                    missing.append({'piece': title, 'part': part, 'file_path': path})
+                    continue
+                name = group_name(part, group_by)
+                group = groups.setdefault(name.casefold(), {'name': name, 'entries': []})
+                group['entries'].append((title, part, self.catalog.absolute_path(mandant_id, path)))
+        return {'group_by': group_by, 'booklets': {group['name']: group['entries'] for group in groups.values()},
+                'missing': missing}
+
+    def build(self, plan: Dict[str, Any], target_dir: str,
+              progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Dict[str, Any]]:
+        """Erzeugt die Hefte parallel in ``target_dir``; gibt je Heft Datei, Seitenzahl und übersprungene Stimmen zurück"""
+        os.makedirs(target_dir, exist_ok=True)
+        with_parts = plan['group_by'] == 'instrument'
+        executor = self.pool.executor()
+        futures = {}
+        taken: Set[str] = set()
+        for name, entries in plan['booklets'].items():
+            target = os.path.join(target_dir, booklet_filename(name, taken))
+            futures[executor.submit(_build_booklet, target, name, entries, with_parts)] = (name, target)
+        results = {}
+        for done, future in enumerate(as_completed(futures), 1):
+            name, target = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                # Abgestürzter Worker: der nächste Auftrag startet einen neuen Pool
+                self.pool.reset(executor)
+                raise
+            result['path'] = target if result['pages'] else None
+            results[name] = result
+            if progress:
+                progress(done, len(futures))
+        return {name: results[name] for name in sorted(results, key=str.casefold)}
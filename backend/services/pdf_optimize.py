@@ -0,0 +1,151 @@
+"""Bildschirm-Optimierung von Stimmen-PDFs für das Export-Layout ``digital``
+
+Eingebettete Bilder (meist eingescannte Notenseiten) werden auf eine Ziel-Auflösung
+verkleinert, danach wird das PDF aufgeräumt (unbenutzte Objekte entfernt, Ströme
+komprimiert) und linearisiert, damit Tablets die erste Seite sofort anzeigen. Die
+Arbeit läuft im gemeinsamen Prozess-Pool; Ergebnisse werden je Inhalts-Hash der
+Quelldatei abgelegt, wiederholte Exporte komprimieren nicht erneut.
+"""
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, Iterator, Optional, Tuple
+
+from backend.services.process_pool import SharedProcessPool, process_pool
+
+# Bei Änderungen an der Optimierung erhöhen, damit abgelegte Ergebnisse verfallen
+OPTIMIZER_VERSION = 1
+
+
+def _optimize_pdf(source_path: str, target_path: str, target_dpi: int, min_scale: float) -> bool:
+    """Schreibt die optimierte Fassung nach ``target_path``; False, wenn sie nicht kleiner wäre
+
+    Läuft im Worker-Prozess. 1-Bit-Bilder (Schwarzweiß-Scans) bleiben unangetastet,
+    da sie als Graustufen größer würden; verkleinerte Bilder werden verlustfrei
+    (Flate) gespeichert, damit Notenlinien scharf bleiben.
+    """
+    import fitz  # PyMuPDF
+
+    with fitz.open(source_path) as doc:
+        done = set()
+        for page in doc:
+            for xref, smask, width, height, bpc, *_ in page.get_images(full=True):
+                if xref in done or bpc == 1:
+                    continue
+                done.add(xref)
+                rects = page.get_image_rects(xref)
+                if not rects:
+                    continue
+                # Größte Darstellung auf der Seite bestimmt die nötige Auflösung (72 Punkt je Zoll)
+                shown = max(max(rect.width, rect.height) for rect in rects) / 72
+                scale = target_dpi * shown / max(width, height)
+                if scale * min_scale > 1:
+                    continue
+                pix = fitz.Pixmap(doc, xref)
+                if smask:
+                    pix = fitz.Pixmap(pix, fitz.Pixmap(doc, smask))
+                if pix.colorspace is None or pix.colorspace.n not in (1, 3):
+                    pix = fitz.Pixmap(fitz.csRGB, pix)
+                small = fitz.Pixmap(pix, max(1, round(width * scale)), max(1, round(height * scale)), None)
+                page.replace_image(xref, pixmap=small)
+        doc.save(target_path, garbage=4, deflate=True, deflate_images=True, deflate_fonts=True, clean=True, linear=True)
+    return os.path.getsize(target_path) < os.path.getsize(source_path)
+
+
+class PdfScreenOptimizer:
+    """Erzeugt bildschirmoptimierte PDFs und legt sie je Inhalts-Hash der Quelle ab
+
+    Lohnt sich die Optimierung nicht (Ergebnis nicht kleiner, PDF nicht lesbar),
+    wird das vermerkt und künftig direkt die Originaldatei verwendet. Fehlt
+    PyMuPDF, wird ebenfalls das Original geliefert.
+    """
+
+    def __init__(self, cache_dir: str = '/tmp/bestnote_exports/digital_pdfs', target_dpi: int = 150,
+                 min_scale: float = 1.5, pool: Optional[SharedProcessPool] = None):
+        self.cache_dir = cache_dir
+        self.target_dpi = target_dpi
+        # Bilder erst ab dieser Überschreitung der Ziel-Auflösung verkleinern
+        self.min_scale = min_scale
+        self.pool = pool or process_pool
+
+    @property
+    def cache_tag(self) -> str:
+        """Kennung der Einstellungen; Teil der abgelegten Dateinamen und des Export-Cache-Schlüssels"""
+        return f'v{OPTIMIZER_VERSION}-{self.target_dpi}dpi-{self.min_scale:g}'
+
+    def _cache_path(self, sha256: str) -> str:
+        return os.path.join(self.cache_dir, sha256[:2], f'{sha256}-{self.cache_tag}.pdf')
+
+    def cached(self, source_path: str, sha256: str) -> Optional[str]:
+        """Pfad der abgelegten Fassung (bzw. des Originals, wenn sich die Optimierung nicht lohnt) oder None"""
+        target = self._cache_path(sha256)
+        if os.path.exists(target):
+            return target
+        if os.path.exists(f'{target}.original'):
+            return source_path
+        return None
+
+    def optimize(self, source_path: str, sha256: str) -> str:
+        """Pfad der bildschirmoptimierten Fassung (blockiert bis zum Ergebnis)"""
+        return next(self.iter_optimized([(source_path, sha256)]))
+
+    def iter_optimized(self, items: Iterable[Tuple[str, str]]) -> Iterator[str]:
+        """Liefert zu (Quelldatei, SHA-256) der Reihe nach den zu exportierenden Pfad
+
+        Nicht abgelegte Dateien werden im Pool optimiert; höchstens zwei Aufträge
+        pro Worker sind gleichzeitig unterwegs, damit der Export früh beginnen kann.
+        """
+        window = deque()
+        try:
+            for source_path, sha256 in items:
+                window.append(self._submit(source_path, sha256))
+                while len(window) > 2 * self.pool.max_workers:
+                    yield self._result(*window.popleft())
+            while window:
+                yield self._result(*window.popleft())
+        finally:
+            # Abgebrochener Export: laufende Aufträge noch ablegen, keine temporären Dateien zurücklassen
+            while window:
+                self._result(*window.popleft())
+
+    def _submit(self, source_path: str, sha256: str):
+        cached = self.cached(source_path, sha256)
+        if cached is not None:
+            return source_path, sha256, cached, None, None, None
+        target = self._cache_path(sha256)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(target))
+        os.close(fd)
+        executor = self.pool.executor()
+        try:
+            future = executor.submit(_optimize_pdf, source_path, tmp_path, self.target_dpi, self.min_scale)
+        except BrokenProcessPool:
+            self.pool.reset(executor)
+            os.remove(tmp_path)
+            return source_path, sha256, source_path, None, None, None
+        return source_path, sha256, None, future, tmp_path, executor
+
+    def _result(self, source_path: str, sha256: str, cached: Optional[str], future, tmp_path: Optional[str],
+                executor: Optional[ProcessPoolExecutor]) -> str:
+        if cached is not None:
+            return cached
+        target = self._cache_path(sha256)
+        try:
+            smaller = future.result()
+        except (ImportError, BrokenProcessPool) as e:
+            # Ohne PyMuPDF bzw. nach einem abgestürzten Worker: Original, ohne Vermerk
+            if isinstance(e, BrokenProcessPool):
+                self.pool.reset(executor)
+            os.remove(tmp_path)
+            return source_path
+        except Exception:
+            # Nicht lesbares PDF: bei gleichem Inhalt nicht erneut versuchen
+            smaller = False
+        if smaller:
+            os.replace(tmp_path, target)
+            return target
+        os.remove(tmp_path)
+        open(f'{target}.original', 'wb').close()
+        return source_path
@@ -0,0 +1,52 @@
+"""Gemeinsamer Prozess-Pool für CPU-lastige PDF-Arbeit (Bildschirm-Optimierung, Stimmenhefte)
+
+Alle Dienste teilen sich einen begrenzten Pool, statt je Dienst einen Worker pro
+CPU zu starten. Er entsteht beim ersten Auftrag und wird beim Herunterfahren der
+App beendet (siehe ``backend/main.py``).
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+PROCESS_POOL_MAX_WORKERS = 4
+
+
+def start_method() -> str:
+    """Startmethode für Worker-Prozesse
+
+    Der Server ist mehrfädig: ``fork`` aus einem laufenden Prozess kann gehaltene
+    Sperren in das Kind kopieren, daher ``forkserver`` (falls verfügbar) oder ``spawn``.
+    """
+    return 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+class SharedProcessPool:
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or min(os.cpu_count() or 1, PROCESS_POOL_MAX_WORKERS)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context(start_method()))
+            return self._executor
+
+    def reset(self, executor: ProcessPoolExecutor):
+        """Verwirft einen abgestürzten Pool (``BrokenProcessPool``); der nächste Auftrag startet einen neuen"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+process_pool = SharedProcessPool()
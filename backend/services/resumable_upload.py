@@ -0,0 +1,271 @@
+"""Fortsetzbare Uploads in Teilstücken (angelehnt an tus.io)
+
+Ein Upload wird mit Dateiname und Gesamtgröße angelegt; danach hängt der Client
+Teilstücke an der jeweils gemeldeten Position an. Nach einem Abbruch fragt er
+die Position ab und macht dort weiter. Teilstücke werden blockweise geschrieben
+und dabei gehasht; erst nach Prüfsumme und ``fsync`` gelten sie als angekommen,
+sonst wird die Datei auf den alten Stand gekürzt. Fertige Uploads können direkt
+importiert werden (währenddessen gesperrt); liegen gebliebene werden nach
+``max_age`` Sekunden ohne Aktivität gelöscht.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+UPLOAD_MAX_LENGTH = 4 * 1024 ** 3
+UPLOAD_MAX_AGE = 24 * 3600
+UPLOAD_EXTENSIONS = ('.csv', '.zip')
+# Algorithmen für die Prüfsumme je Teilstück (Header ``Upload-Checksum``)
+CHECKSUM_ALGORITHMS = ('sha256', 'sha1', 'md5')
+
+
+class ResumableUploadStore:
+    def __init__(self, upload_dir: str = '/tmp/bestnote_uploads', max_length: int = UPLOAD_MAX_LENGTH,
+                 max_age: float = UPLOAD_MAX_AGE):
+        self.upload_dir = upload_dir
+        self.db_path = os.path.join(upload_dir, 'uploads.sqlite3')
+        self.max_length = max_length
+        self.max_age = max_age
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._last_gc = 0.0
+        self._collector: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        os.makedirs(upload_dir, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS uploads (
+                    id TEXT PRIMARY KEY,
+                    mandant_id INTEGER NOT NULL,
+                    filename TEXT NOT NULL,
+                    length INTEGER NOT NULL,
+                    received INTEGER NOT NULL,
+                    completed INTEGER NOT NULL,
+                    importing INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_uploads_updated ON uploads (updated_at)')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def path(self, upload_id: str) -> str:
+        return os.path.join(self.upload_dir, f'{upload_id}.upload')
+
+    def _lock(self, upload_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _info(self, row: sqlite3.Row) -> Dict[str, Any]:
+        info = dict(row)
+        info['offset'] = info.pop('received')
+        info['completed'] = bool(info['completed'])
+        info['importing'] = bool(info['importing'])
+        info['expires_at'] = info['updated_at'] + self.max_age
+        return info
+
+    def create(self, mandant_id: int, filename: str, length: int) -> Dict[str, Any]:
+        """Legt einen leeren Upload an; die Datei wird in voller Größe erst durch die Teilstücke gefüllt"""
+        if not filename.lower().endswith(UPLOAD_EXTENSIONS):
+            raise ValueError("Nicht unterstütztes Dateiformat")
+        if length <= 0:
+            raise ValueError("Upload-Größe muss größer als 0 sein")
+        if length > self.max_length:
+            raise ValueError(f"Upload zu groß: {length} Bytes (erlaubt: {self.max_length})")
+        self.collect_garbage_if_due()
+        upload_id = uuid.uuid4().hex
+        open(self.path(upload_id), 'wb').close()
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute('INSERT INTO uploads (id, mandant_id, filename, length, received, completed, created_at, updated_at) '
+                         'VALUES (?, ?, ?, ?, 0, 0, ?, ?)',
+                         (upload_id, mandant_id, os.path.basename(filename), length, now, now))
+        return self.get(mandant_id, upload_id)
+
+    def get(self, mandant_id: int, upload_id: str) -> Optional[Dict[str, Any]]:
+        """Stand eines Uploads des Mandanten oder None"""
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT * FROM uploads WHERE id = ? AND mandant_id = ?', (upload_id, mandant_id)).fetchone()
+        return self._info(row) if row else None
+
+    def append(self, mandant_id: int, upload_id: str, offset: int, data: Union[bytes, Iterable[bytes]],
+               checksum: Optional[Tuple[str, bytes]] = None) -> Optional[Dict[str, Any]]:
+        """Hängt ein Teilstück an Position ``offset`` an und gibt den neuen Stand zurück
+
+        ``data`` sind Bytes oder eine Folge von Blöcken (z.B. direkt aus dem
+        Request-Body), die nacheinander geschrieben und mit ``checksum``
+        (Algorithmus, Digest) gehasht werden. Stimmt die Prüfsumme nicht, wird das
+        Teilstück verworfen und None zurückgegeben. Die Position muss dem bisherigen
+        Stand entsprechen; so führt ein doppelt gesendetes Teilstück nicht zu doppelten Daten.
+        """
+        if isinstance(data, bytes):
+            data = (data,)
+        digest = None
+        if checksum is not None:
+            if checksum[0] not in CHECKSUM_ALGORITHMS:
+                raise ValueError(f"Nicht unterstützter Prüfsummen-Algorithmus: {checksum[0]}")
+            digest = hashlib.new(checksum[0])
+        with self._lock(upload_id):
+            upload = self.get(mandant_id, upload_id)
+            if upload is None:
+                raise ValueError(f"Upload nicht gefunden: {upload_id}")
+            if upload['completed']:
+                raise ValueError("Upload ist bereits abgeschlossen")
+            if offset != upload['offset']:
+                raise ValueError(f"Offset {offset} passt nicht zum Stand {upload['offset']}")
+            end = offset
+            with open(self.path(upload_id), 'r+b') as target:
+                target.seek(offset)
+                try:
+                    for chunk in data:
+                        end += len(chunk)
+                        if end > upload['length']:
+                            raise ValueError("Teilstück überschreitet die angekündigte Upload-Größe")
+                        target.write(chunk)
+                        if digest is not None:
+                            digest.update(chunk)
+                except BaseException:
+                    # Abgebrochene Übertragung: nichts von diesem Teilstück bleibt stehen
+                    target.truncate(offset)
+                    raise
+                if digest is not None and digest.digest() != checksum[1]:
+                    target.truncate(offset)
+                    return None
+                target.flush()
+                # Erst nach fsync gilt das Teilstück als angekommen
+                os.fsync(target.fileno())
+            with closing(self._connect()) as conn, conn:
+                conn.execute('UPDATE uploads SET received = ?, updated_at = ? WHERE id = ?',
+                             (end, time.time(), upload_id))
+        return self.get(mandant_id, upload_id)
+
+    def complete(self, mandant_id: int, upload_id: str, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """Schließt einen vollständig übertragenen Upload ab, optional mit SHA-256 der ganzen Datei"""
+        with self._lock(upload_id):
+            upload = self.get(mandant_id, upload_id)
+            if upload is None:
+                raise ValueError(f"Upload nicht gefunden: {upload_id}")
+            if upload['offset'] != upload['length']:
+                raise ValueError(f"Upload unvollständig: {upload['offset']} von {upload['length']} Bytes")
+            if sha256 is not None:
+                digest = hashlib.sha256()
+                with open(self.path(upload_id), 'rb') as source:
+                    for chunk in iter(lambda: source.read(1024 * 1024), b''):
+                        digest.update(chunk)
+                if digest.hexdigest() != sha256.lower():
+                    raise ValueError("SHA-256 der Datei stimmt nicht")
+            with closing(self._connect()) as conn, conn:
+                conn.execute('UPDATE uploads SET completed = 1, updated_at = ? WHERE id = ?', (time.time(), upload_id))
+        return self.get(mandant_id, upload_id)
+
+    def begin_import(self, mandant_id: int, upload_id: str) -> Dict[str, Any]:
+        """Sperrt einen abgeschlossenen Upload für den Import
+
+        Ein zweiter Import, ``delete`` und die Speicherbereinigung lassen ihn bis
+        ``end_import`` in Ruhe.
+        """
+        with self._lock(upload_id):
+            upload = self.get(mandant_id, upload_id)
+            if upload is None:
+                raise ValueError(f"Upload nicht gefunden: {upload_id}")
+            if not upload['completed']:
+                raise ValueError("Upload ist noch nicht abgeschlossen")
+            if upload['importing']:
+                raise ValueError("Upload wird bereits importiert")
+            with closing(self._connect()) as conn, conn:
+                conn.execute('UPDATE uploads SET importing = 1, updated_at = ? WHERE id = ?', (time.time(), upload_id))
+        return self.get(mandant_id, upload_id)
+
+    def end_import(self, mandant_id: int, upload_id: str, success: bool):
+        """Nach erfolgreichem Import wird der Upload gelöscht, sonst für einen neuen Versuch freigegeben"""
+        if success:
+            self._delete(mandant_id, upload_id, force=True)
+            return
+        with self._lock(upload_id):
+            with closing(self._connect()) as conn, conn:
+                conn.execute('UPDATE uploads SET importing = 0, updated_at = ? WHERE id = ? AND mandant_id = ?',
+                             (time.time(), upload_id, mandant_id))
+
+    def delete(self, mandant_id: int, upload_id: str) -> bool:
+        """Löscht einen Upload; ValueError, solange er importiert wird"""
+        return self._delete(mandant_id, upload_id)
+
+    def _is_stale(self, upload: Dict[str, Any], cutoff: float) -> bool:
+        # Gesperrte Uploads (Import läuft) erst nach der doppelten Zeit, falls der importierende Prozess abgebrochen ist
+        return upload['updated_at'] < (cutoff - self.max_age if upload['importing'] else cutoff)
+
+    def _delete(self, mandant_id: int, upload_id: str, force: bool = False, cutoff: Optional[float] = None) -> bool:
+        """Löscht den Upload; mit ``cutoff`` nur, wenn er unter der Sperre noch als liegen geblieben gilt"""
+        with self._lock(upload_id):
+            upload = self.get(mandant_id, upload_id)
+            if upload is not None:
+                if cutoff is not None:
+                    if not self._is_stale(upload, cutoff):
+                        return False
+                elif upload['importing'] and not force:
+                    raise ValueError("Upload wird gerade importiert")
+            with closing(self._connect()) as conn, conn:
+                deleted = conn.execute('DELETE FROM uploads WHERE id = ? AND mandant_id = ?',
+                                       (upload_id, mandant_id)).rowcount > 0
+            if deleted and os.path.exists(self.path(upload_id)):
+                os.remove(self.path(upload_id))
+        with self._locks_guard:
+            self._locks.pop(upload_id, None)
+        return deleted
+
+    def collect_garbage(self, now: Optional[float] = None) -> List[str]:
+        """Löscht Uploads ohne Aktivität seit ``max_age`` Sekunden und verwaiste Dateien; gibt die IDs zurück"""
+        now = time.time() if now is None else now
+        cutoff = now - self.max_age
+        with closing(self._connect()) as conn:
+            stale = [(row['id'], row['mandant_id'])
+                     for row in conn.execute('SELECT id, mandant_id FROM uploads WHERE updated_at < ?', (cutoff,))]
+            known = {row['id'] for row in conn.execute('SELECT id FROM uploads')}
+        removed = [upload_id for upload_id, mandant_id in stale if self._delete(mandant_id, upload_id, cutoff=cutoff)]
+        for name in os.listdir(self.upload_dir):
+            upload_id, ext = os.path.splitext(name)
+            path = os.path.join(self.upload_dir, name)
+            if ext == '.upload' and upload_id not in known and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed.append(upload_id)
+        self._last_gc = now
+        return removed
+
+    def collect_garbage_if_due(self, interval: float = 3600):
+        """Räumt höchstens einmal je ``interval`` Sekunden auf (beim Anlegen neuer Uploads)"""
+        if time.time() - self._last_gc >= interval:
+            self.collect_garbage()
+
+    def start_collector(self, interval: float = 3600.0):
+        """Räumt als Hintergrund-Thread alle ``interval`` Sekunden auf, auch ohne neue Uploads"""
+        if self._collector is not None and self._collector.is_alive():
+            return
+        self._stop.clear()
+        self._collector = threading.Thread(target=self._collect_loop, args=(interval,),
+                                           name='upload-garbage-collector', daemon=True)
+        self._collector.start()
+
+    def stop_collector(self):
+        self._stop.set()
+        if self._collector is not None:
+            self._collector.join(timeout=5)
+            self._collector = None
+
+    def _collect_loop(self, interval: float):
+        while not self._stop.is_set():
+            try:
+                self.collect_garbage_if_due(interval)
+            except Exception:
+                # Der nächste Durchlauf versucht es erneut
+                pass
+            self._stop.wait(interval)
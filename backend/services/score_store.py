@@ -0,0 +1,57 @@
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+
+
+class ScoreStore:
+    """Werke je Mandant (SQLite); Importe schreiben blockweise in einer Transaktion je Block"""
+
+    def __init__(self, db_path: str = '/tmp/bestnote_data/scores.sqlite3'):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS scores (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    mandant_id INTEGER NOT NULL,
+                    title TEXT NOT NULL,
+                    composer TEXT NOT NULL,
+                    year TEXT,
+                    metadata TEXT,
+                    created_at TEXT NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_scores_mandant ON scores (mandant_id, id)')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def add_many(self, mandant_id: int, scores: Iterable[Dict[str, Any]]) -> int:
+        """Speichert mehrere Werke (Felder wie ``Score``) in einer Transaktion und gibt ihre Anzahl zurück"""
+        created_at = datetime.now().isoformat(timespec='seconds')
+        rows = [(mandant_id, score['title'], score['composer'], score.get('year'), score.get('metadata'), created_at)
+                for score in scores]
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                'INSERT INTO scores (mandant_id, title, composer, year, metadata, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+        return len(rows)
+
+    def count(self, mandant_id: int) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute('SELECT COUNT(*) FROM scores WHERE mandant_id = ?', (mandant_id,)).fetchone()[0]
+
+    def list(self, mandant_id: int, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Werke des Mandanten in Import-Reihenfolge"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                'SELECT id, title, composer, year, metadata FROM scores WHERE mandant_id = ? ORDER BY id LIMIT ? OFFSET ?',
+                (mandant_id, limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
@@ -0,0 +1,170 @@
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+from backend.services.ai_classification import AIClassificationService
+from backend.services.analysis_cache import AnalysisCache
+from backend.services.file_catalog import FileCatalog
+
+
+class SearchIndexService:
+    """Volltextindex (SQLite FTS5) über den extrahierten Notentext, eine Datenbank pro Mandant
+
+    Dokumente werden über ihre Datei-ID (relativer Pfad im Mandanten-Verzeichnis)
+    identifiziert. Über den Inhalts-Hash wird erkannt, ob eine Datei bereits
+    aktuell indiziert ist, sodass unveränderte PDFs nicht erneut gelesen werden.
+    """
+
+    def __init__(self, data_dir: str = '/tmp/bestnote_data', extractor: Optional[AIClassificationService] = None,
+                 catalog: Optional[FileCatalog] = None):
+        self.data_dir = data_dir
+        self.index_dir = os.path.join(data_dir, 'search_index')
+        self._extractor = extractor
+        self.catalog = catalog or FileCatalog(data_dir)
+
+    @property
+    def extractor(self) -> AIClassificationService:
+        if self._extractor is None:
+            self._extractor = AIClassificationService(cache_path=None)
+        return self._extractor
+
+    def _connect(self, mandant_id: int) -> sqlite3.Connection:
+        os.makedirs(self.index_dir, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(self.index_dir, f'mandant_{int(mandant_id)}.sqlite3'), timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS documents (
+                file_id TEXT PRIMARY KEY,
+                content_hash TEXT,
+                title TEXT,
+                composer TEXT,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                file_id UNINDEXED, title, composer, content,
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+        ''')
+        return conn
+
+    def is_indexed(self, mandant_id: int, file_id: str, content_hash: str) -> bool:
+        """Prüft, ob die Datei mit diesem Inhalt bereits im Index steht"""
+        with closing(self._connect(mandant_id)) as conn:
+            row = conn.execute('SELECT content_hash FROM documents WHERE file_id = ?', (file_id,)).fetchone()
+        return row is not None and row[0] == content_hash
+
+    def index_document(self, mandant_id: int, file_id: str, content: str, title: Optional[str] = None,
+                       composer: Optional[str] = None, content_hash: Optional[str] = None):
+        """Legt ein Dokument an oder ersetzt es"""
+        with closing(self._connect(mandant_id)) as conn, conn:
+            conn.execute('DELETE FROM documents_fts WHERE file_id = ?', (file_id,))
+            conn.execute('INSERT INTO documents_fts (file_id, title, composer, content) VALUES (?, ?, ?, ?)',
+                         (file_id, title or '', composer or '', content))
+            conn.execute('INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)',
+                         (file_id, content_hash, title, composer, time.time()))
+
+    def remove_document(self, mandant_id: int, file_id: str):
+        with closing(self._connect(mandant_id)) as conn, conn:
+            conn.execute('DELETE FROM documents_fts WHERE file_id = ?', (file_id,))
+            conn.execute('DELETE FROM documents WHERE file_id = ?', (file_id,))
+
+    def index_pdf(self, mandant_id: int, file_id: str, pdf_path: str, title: Optional[str] = None,
+                  composer: Optional[str] = None, content: Optional[str] = None,
+                  content_hash: Optional[str] = None) -> bool:
+        """Indiziert ein PDF, falls es sich seit der letzten Indizierung geändert hat
+
+        ``content`` ist bereits extrahierter Text (z.B. aus der Klassifikation);
+        sonst liest ``analyze_pdf`` des Extraktors den Text und legt die Analyse
+        dabei in dessen Cache ab, sodass eine spätere Klassifikation nicht erneut
+        extrahiert (und OCR ausführt). Gibt True zurück, wenn neu indiziert wurde.
+        """
+        content_hash = content_hash or AnalysisCache.hash_file(pdf_path)
+        if self.is_indexed(mandant_id, file_id, content_hash):
+            if title is not None or composer is not None:
+                with closing(self._connect(mandant_id)) as conn, conn:
+                    conn.execute('UPDATE documents_fts SET title = ?, composer = ? WHERE file_id = ?',
+                                 (title or '', composer or '', file_id))
+                    conn.execute('UPDATE documents SET title = ?, composer = ?, updated_at = ? WHERE file_id = ?',
+                                 (title, composer, time.time(), file_id))
+            return False
+
+        if content is None:
+            # Seitenweise extrahiert und durch das Text-Budget des Extraktors begrenzt
+            analysis = self.extractor.analyze_pdf(pdf_path, include_text=True)
+            if 'error' in analysis:
+                raise ValueError(analysis['error'])
+            content = analysis['text']
+        self.index_document(mandant_id, file_id, content, title, composer, content_hash)
+        return True
+
+    def reindex_mandant(self, mandant_id: int) -> Dict[str, int]:
+        """Gleicht den Index mit allen PDFs des Mandanten laut Dateikatalog ab
+
+        Der Inhalts-Hash stammt aus dem Katalog, unveränderte Dateien werden daher nicht gelesen.
+        """
+        seen = set()
+        stats = {'indexed': 0, 'unchanged': 0, 'removed': 0, 'errors': 0}
+        for entry in self.catalog.list_files(mandant_id, ['pdf']):
+            file_id = entry['path']
+            seen.add(file_id)
+            file_path = self.catalog.absolute_path(mandant_id, file_id)
+            try:
+                indexed = self.index_pdf(mandant_id, file_id, file_path, content_hash=entry['sha256'])
+                stats['indexed' if indexed else 'unchanged'] += 1
+            except Exception:
+                stats['errors'] += 1
+
+        with closing(self._connect(mandant_id)) as conn:
+            indexed = [row[0] for row in conn.execute('SELECT file_id FROM documents')]
+        for file_id in indexed:
+            if file_id not in seen:
+                self.remove_document(mandant_id, file_id)
+                stats['removed'] += 1
+        return stats
+
+    @staticmethod
+    def _build_match_query(query: str) -> str:
+        """Wandelt eine Benutzereingabe in eine sichere FTS5-Abfrage um (alle Wörter, letztes als Präfix)"""
+        terms = [term.replace('"', '""') for term in query.split()]
+        if not terms:
+            return ''
+        parts = [f'"{term}"' for term in terms]
+        parts[-1] += '*'
+        return ' '.join(parts)
+
+    def search(self, mandant_id: int, query: str, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """Rangierte, seitenweise Suche (BM25, Titel und Komponist höher gewichtet)"""
+        match = self._build_match_query(query)
+        result: Dict[str, Any] = {'query': query, 'total': 0, 'page': page, 'page_size': page_size, 'results': []}
+        if not match:
+            return result
+
+        with closing(self._connect(mandant_id)) as conn:
+            result['total'] = conn.execute(
+                'SELECT COUNT(*) FROM documents_fts WHERE documents_fts MATCH ?', (match,)
+            ).fetchone()[0]
+            rows = conn.execute('''
+                SELECT file_id, title, composer,
+                       bm25(documents_fts, 0.0, 10.0, 5.0, 1.0) AS score,
+                       snippet(documents_fts, 3, '<mark>', '</mark>', ' … ', 16)
+                FROM documents_fts
+                WHERE documents_fts MATCH ?
+                ORDER BY score
+                LIMIT ? OFFSET ?
+            ''', (match, page_size, (page - 1) * page_size)).fetchall()
+
+        results: List[Dict[str, Any]] = []
+        for file_id, title, composer, score, snippet in rows:
+            results.append({
+                'file_id': file_id,
+                'title': title or None,
+                'composer': composer or None,
+                'score': -score,
+                'snippet': snippet
+            })
+        result['results'] = results
+        return result
@@ -0,0 +1,64 @@
+"""Kompressions-Richtlinie für ZIP-Archive (Export und Backup)
+
+Bereits komprimierte Formate (PDF, Bilder, ZIP, MIDI) werden nur gespeichert,
+Text und JSON werden mit einstellbarer Stufe komprimiert. Es werden nur
+öffentliche Schnittstellen von ``zipfile`` verwendet: die Stufe gilt für das
+ganze Archiv (``open_zip``), gespeicherte Einträge erhalten eine eigene ``ZipInfo``.
+"""
+import os
+import zipfile
+from typing import BinaryIO, Iterator, Union
+
+# Formate mit eigener Kompression: Deflate bringt hier kaum etwas
+STORED_EXTENSIONS = frozenset({
+    '.pdf', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.zip', '.gz', '.mid', '.midi', '.mp3', '.ogg',
+})
+
+# Ab dieser Größe braucht ein Eintrag ZIP64-Felder (vorab anzugeben, die Größe ist beim Öffnen unbekannt)
+ZIP64_THRESHOLD = (1 << 31) - 1
+
+
+class CompressionPolicy:
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def compress_type(self, arcname: str) -> int:
+        """ZIP_STORED für bereits komprimierte Formate, sonst ZIP_DEFLATED"""
+        if os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS:
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
+    def open_zip(self, target: Union[str, BinaryIO]) -> zipfile.ZipFile:
+        """Neues Archiv zum Schreiben; Deflate mit der Stufe der Richtlinie ist Vorgabe für alle Einträge"""
+        return zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED, compresslevel=self.level)
+
+    def write_bytes(self, zipf: zipfile.ZipFile, arcname: str, data: bytes):
+        """Eintrag aus dem Speicher schreiben"""
+        compress_type = self.compress_type(arcname)
+        zipf.writestr(arcname, data, compress_type=compress_type,
+                      compresslevel=self.level if compress_type == zipfile.ZIP_DEFLATED else None)
+
+    def write_file(self, zipf: zipfile.ZipFile, source_path: str, arcname: str,
+                   chunk_size: int = 1024 * 1024, hasher=None) -> Iterator[None]:
+        """Datei stückweise in das Archiv schreiben; meldet sich nach jedem Block
+
+        Mit ``hasher`` (z.B. ``hashlib.sha256()``) wird der Inhalt beim Schreiben mitgehasht.
+        Komprimierte Einträge übernehmen Verfahren und Stufe des Archivs (siehe ``open_zip``),
+        eine Stufe je ``ZipInfo`` lässt ``zipfile`` erst ab Python 3.13 öffentlich zu.
+        """
+        force_zip64 = os.path.getsize(source_path) > ZIP64_THRESHOLD
+        if self.compress_type(arcname) == zipfile.ZIP_STORED:
+            member = zipfile.ZipInfo.from_file(source_path, arcname)
+            member.compress_type = zipfile.ZIP_STORED
+        else:
+            member = arcname
+
+        with open(source_path, 'rb') as src, zipf.open(member, 'w', force_zip64=force_zip64) as dst:
+            while True:
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                dst.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+                yield
@@ -0,0 +1,24 @@
+import pytest
+
+from backend.auth import create_access_token
+
+
+@pytest.fixture
+def auth():
+    """Authorization-Header für einen Mandanten: ``auth(mandant_id)``"""
+    def headers(mandant_id):
+        token = create_access_token({'mandant_id': mandant_id, 'user_id': 1, 'username': 'test'})
+        return {'Authorization': f'Bearer {token}'}
+    return headers
+
+
+@pytest.fixture
+def pdf_bytes():
+    """Einseitiges PDF mit dem Text: ``pdf_bytes(text)``"""
+    def build(text):
+        import fitz
+        with fitz.open() as doc:
+            page = doc.new_page()
+            page.insert_textbox(page.rect, text)
+            return doc.tobytes()
+    return build
@@ -0,0 +1,223 @@
+import pytest
+
+from backend.services.ai_classification import AIClassificationService, KeywordMatcher
+
+
+@pytest.fixture
+def service():
+    # Ohne persistenten Cache, damit kein Test gespeicherte Ergebnisse anderer Läufe sieht
+    return AIClassificationService(cache_path=None)
+
+def test_keyword_matcher_counts_overlapping_keywords():
+    matcher = KeywordMatcher(['orchester', 'kammerorchester', 'sinfonie', 'sinfonietta'])
+    hits = matcher.count('kammerorchester und sinfonietta, orchester')
+    assert hits['kammerorchester'] == 1
+    assert hits['orchester'] == 2
+    assert hits['sinfonietta'] == 1
+    assert hits['sinfonie'] == 1
+
+def test_keyword_matcher_matches_substring_semantics(service):
+    text = 'symphonie op. 67 für großes orchester, violine und kontrabass, allegro con brio'
+    hits = service.matcher.count(text)
+    for keyword in service.matcher.keywords:
+        assert bool(hits[keyword]) == (keyword in text)
+
+def test_classifiers_share_hits(service):
+    text = 'beethoven sinfonie nr. 5 op. 67 für orchester mit violine, viola und pauke. allegro, andante'
+    hits = service.matcher.count(text)
+    assert service._extract_composer(text, hits) == 'Beethoven'
+    assert service._classify_genre(text, hits) == 'klassisch'
+    assert service._extract_instruments(text, hits) == ['violine', 'viola', 'pauke']
+    assert service._estimate_ensemble_size(text, hits) == 'großes_orchester'
+    assert service._calculate_confidence(text, hits) == service._calculate_confidence(text)
+
+def _make_pdf(path, text):
+    import fitz
+    with fitz.open() as doc:
+        page = doc.new_page()
+        page.insert_text((72, 72), text)
+        doc.save(str(path))
+    return str(path)
+
+def test_batch_analyze_parallel_keeps_input_order(tmp_path, service):
+    text = 'Sinfonie von Beethoven fuer Orchester mit Violine, Viola und Pauke. ' * 3
+    paths = [_make_pdf(tmp_path / f'score_{i}.pdf', text) for i in range(3)]
+    paths.insert(1, str(tmp_path / 'fehlt.pdf'))
+    pool_service = AIClassificationService(pool_size=2, cache_path=None)
+    try:
+        results = pool_service.batch_analyze(paths, parallel=True)
+    finally:
+        pool_service.close()
+    assert [r['file_path'] for r in results] == paths
+    assert results[0]['composer'] == 'Beethoven'
+    assert results == service.batch_analyze(paths)
+
+def test_batch_analyze_parallel_times_out_stuck_files(tmp_path, monkeypatch):
+    import multiprocessing
+    import time
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        pytest.skip('Test benötigt fork-Startmethode')
+
+    def slow_analyze(self, pdf_path, include_text=False):
+        if 'haengt' in pdf_path:
+            time.sleep(60)
+        return {'confidence': 1.0}
+
+    monkeypatch.setattr(AIClassificationService, 'analyze_pdf', slow_analyze)
+    # fork, damit die Worker das gepatchte analyze_pdf erben
+    pool_service = AIClassificationService(pool_size=2, file_timeout=1.0, cache_path=None, mp_context='fork')
+    try:
+        start = time.monotonic()
+        results = pool_service.batch_analyze(['a.pdf', 'haengt.pdf', 'b.pdf', 'c.pdf'], parallel=True)
+        assert time.monotonic() - start < 10
+    finally:
+        pool_service.close()
+    assert [r['confidence'] for r in results] == [1.0, 0, 1.0, 1.0]
+    assert 'Zeitüberschreitung' in results[1]['error']
+
+def test_parallel_batches_use_separate_pools(monkeypatch):
+    import multiprocessing
+    import threading
+    import time
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        pytest.skip('Test benötigt fork-Startmethode')
+
+    def slow_analyze(self, pdf_path, include_text=False):
+        time.sleep(60 if 'haengt' in pdf_path else 1.5 if 'langsam' in pdf_path else 0)
+        return {'confidence': 1.0}
+
+    monkeypatch.setattr(AIClassificationService, 'analyze_pdf', slow_analyze)
+    pool_service = AIClassificationService(pool_size=2, cache_path=None, mp_context='fork')
+    other = {}
+    # Das Zeitlimit der ersten Analyse beendet nur deren Pool, nicht den der zweiten
+    worker = threading.Thread(target=lambda: other.update(
+        results=pool_service.batch_analyze(['langsam.pdf', 'd.pdf'], parallel=True, timeout=30)))
+    try:
+        worker.start()
+        results = pool_service.batch_analyze(['haengt.pdf', 'a.pdf'], parallel=True, timeout=0.5)
+        worker.join(30)
+        # Jede Analyse beendet ihren Pool selbst
+        assert pool_service._pools == set()
+    finally:
+        pool_service.close()
+    assert [r['confidence'] for r in results] == [0, 1.0]
+    assert [r['confidence'] for r in other['results']] == [1.0, 1.0]
+
+def test_analyze_pdf_uses_content_hash_cache(tmp_path, monkeypatch):
+    cached_service = AIClassificationService(cache_path=str(tmp_path / 'cache.sqlite3'))
+    pdf = _make_pdf(tmp_path / 'score.pdf', 'Messe fuer Chor und Orgel von Bach. ' * 5)
+    first = cached_service.analyze_pdf(pdf)
+    copy = tmp_path / 'kopie.pdf'
+    copy.write_bytes((tmp_path / 'score.pdf').read_bytes())
+
+    calls = []
+
+    def counting_extraction(self, pdf_path, ocr_dpi=None, lowercase=True):
+        calls.append(pdf_path)
+        raise AssertionError('Cache-Treffer erwartet')
+
+    # analyze_pdf liest den Text seitenweise über _iter_page_texts
+    monkeypatch.setattr(AIClassificationService, '_iter_page_texts', counting_extraction)
+    assert cached_service.analyze_pdf(str(copy)) == first
+    assert calls == []
+    assert cached_service.cache.stats()['entries'] == 1
+
+    cached_service.rules_version = 'neue-regeln'
+    assert cached_service.invalidate_cache() == 1
+    assert cached_service.cache.stats()['entries'] == 0
+
+def test_analysis_cache_evicts_least_recently_used(tmp_path):
+    from backend.services.analysis_cache import AnalysisCache
+    cache = AnalysisCache(str(tmp_path / 'cache.sqlite3'), max_bytes=250)
+    for i in range(3):
+        cache.put(f'hash{i}', 'v1', {'text': 'x' * 100})
+    assert cache.get('hash0', 'v1') is None
+    assert cache.get('hash2', 'v1') is not None
+    assert cache.stats()['size'] <= 250
+
+def test_ocr_stops_early_when_confident(tmp_path, monkeypatch):
+    import fitz
+    pdf = tmp_path / 'scan.pdf'
+    with fitz.open() as doc:
+        for _ in range(5):
+            doc.new_page()
+        doc.save(str(pdf))
+
+    calls = []
+    confident_page = 'Beethoven Sinfonie Noten Takt Tempo Allegro Andante ' * 30
+
+    def fake_ocr(pytesseract, pix, img):
+        calls.append(img.size)
+        return confident_page
+
+    monkeypatch.setattr(AIClassificationService, '_ocr_image', staticmethod(fake_ocr))
+    ocr_service = AIClassificationService(cache_path=None, ocr_workers=1, ocr_dpi=72)
+    assert ocr_service._ocr_pdf(str(pdf)) == confident_page + '\n'
+    assert calls == [(595, 842)]
+
+    calls.clear()
+    ocr_service.ocr_confidence_threshold = None
+    assert ocr_service._ocr_pdf(str(pdf)) == (confident_page + '\n') * 5
+    assert len(calls) == 5
+
+def test_text_stream_respects_budget_and_head_pages(tmp_path):
+    import fitz
+    pdf = tmp_path / 'sammelband.pdf'
+    with fitz.open() as doc:
+        page = doc.new_page()
+        page.insert_textbox(page.rect, 'Gesammelte Werke fuer Klavier. ' * 10)
+        for _ in range(20):
+            page = doc.new_page()
+            page.insert_textbox(page.rect, 'Walzer und Polka von Mozart mit Violine. ' * 10)
+        doc.save(str(pdf))
+
+    stream_service = AIClassificationService(cache_path=None, max_text_chars=2000, head_pages=1)
+    pages = list(stream_service._iter_page_texts(str(pdf)))
+    assert sum(len(p) for p in pages) == 2000
+    assert all(p == p.lower() for p in pages)
+
+    analysis = stream_service.analyze_pdf(str(pdf))
+    assert analysis['genre'] == 'volksmusik'
+    assert analysis['composer'] is None
+    assert 'violine' in analysis['instruments']
+
+def test_batch_scoring_engine_matches_per_document_path(service):
+    import random
+    from backend.services.batch_scoring import BatchScoringEngine
+    engine = BatchScoringEngine(service)
+    rng = random.Random(5)
+    words = service.matcher.keywords + ['lorem'] * 40
+    texts = [' '.join(rng.choice(words) for _ in range(rng.randint(0, 30))) for _ in range(300)]
+    expected = [{
+        'genre': service._classify_genre(text),
+        'difficulty': service._classify_difficulty(text),
+        'instruments': service._extract_instruments(text)
+    } for text in texts]
+    assert engine.classify_texts(texts) == expected
+    # Dokumente ganz ohne Treffer (reduceat wird übersprungen)
+    assert [r['genre'] for r in engine.classify_texts(['', 'lorem'])] == ['unbekannt', 'unbekannt']
+
+def test_failed_ocr_is_not_cached(tmp_path, monkeypatch):
+    import fitz
+    pdf = tmp_path / 'scan.pdf'
+    with fitz.open() as doc:
+        doc.new_page()
+        doc.save(str(pdf))
+
+    calls = []
+
+    def failing_ocr(self, pdf_path, dpi=None):
+        calls.append(pdf_path)
+        return 'OCR fehlgeschlagen: tesseract nicht gefunden'
+
+    monkeypatch.setattr(AIClassificationService, '_ocr_pdf', failing_ocr)
+    cached_service = AIClassificationService(cache_path=str(tmp_path / 'cache.sqlite3'))
+    cached_service.analyze_pdf(str(pdf))
+    cached_service.analyze_pdf(str(pdf))
+    assert len(calls) == 2
+    assert cached_service.cache.stats()['entries'] == 0
+
+    # Andere OCR-Einstellungen ergeben eine andere Regel-Version
+    assert AIClassificationService(cache_path=None, ocr_dpi=300).rules_version != cached_service.rules_version
+    assert AIClassificationService(cache_path=None, ocr_confidence_threshold=None).rules_version != \
+        cached_service.rules_version
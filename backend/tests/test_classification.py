@@ -0,0 +1,56 @@
+import json
+import time
+from fastapi.testclient import TestClient
+from backend.main import app
+
+client = TestClient(app)
+
+def _wait_for(job_id, headers):
+    for _ in range(100):
+        job = client.get(f'/classification/jobs/{job_id}', headers=headers).json()
+        if job['status'] in ('completed', 'failed'):
+            return job
+        time.sleep(0.1)
+    raise AssertionError('Auftrag nicht beendet')
+
+def test_classification_job_reports_progress(auth, pdf_bytes):
+    headers = auth(1)
+    pdf = pdf_bytes('Messe und Requiem von Mozart fuer Chor und Orchester mit Posaune und Pauke. ' * 5)
+    files = [('files', ('requiem.pdf', pdf, 'application/pdf')), ('files', ('kopie.pdf', pdf, 'application/pdf'))]
+    response = client.post('/classification/jobs', files=files, headers=headers)
+    assert response.status_code == 202
+    job_id = response.json()['job_id']
+    assert response.json()['total'] == 2
+
+    job = _wait_for(job_id, headers)
+    assert job['status'] == 'completed'
+    assert sorted(r['file_path'] for r in job['results']) == ['kopie.pdf', 'requiem.pdf']
+    assert all(r['genre'] == 'kirchenmusik' for r in job['results'])
+
+    stream = client.get(f'/classification/jobs/{job_id}/events', headers=headers)
+    assert stream.headers['content-type'].startswith('text/event-stream')
+    events = [line[len('event: '):] for line in stream.text.splitlines() if line.startswith('event: ')]
+    assert events == ['queued', 'running', 'progress', 'progress', 'completed']
+    last_data = [line for line in stream.text.splitlines() if line.startswith('data: ')][-1]
+    assert json.loads(last_data[len('data: '):])['completed'] == 2
+
+def test_classification_job_is_tenant_scoped(auth, pdf_bytes):
+    pdf = pdf_bytes('Polka')
+    response = client.post('/classification/jobs', files=[('files', ('polka.pdf', pdf, 'application/pdf'))],
+                           headers=auth(1))
+    job_id = response.json()['job_id']
+    assert client.get(f'/classification/jobs/{job_id}', headers=auth(2)).status_code == 404
+
+def test_classification_job_rejects_path_traversal(auth):
+    response = client.post('/classification/jobs', data={'file_ids': ['../mandant_2/geheim.pdf']}, headers=auth(1))
+    assert response.status_code == 400
+
+def test_classification_pools_are_stopped_on_shutdown(monkeypatch):
+    from backend import main
+    from backend.api.routes_classification import classification_service
+    assert main.stop_classification_pools in app.router.on_shutdown
+
+    closed = []
+    monkeypatch.setattr(classification_service, 'close', lambda: closed.append(True))
+    main.stop_classification_pools()
+    assert closed
@@ -0,0 +1,476 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import zlib
+import zipfile
+import pytest
+from fastapi.testclient import TestClient
+from backend.main import app
+from backend.api import routes_dashboard, routes_export
+from backend.services.backup import BackupService
+from backend.services.export import ExportService
+from backend.services.export_cache import ExportArtifactCache
+from backend.services.file_catalog import FileCatalog
+from backend.services.jobs import JobManager
+from backend.services.process_pool import SharedProcessPool
+from backend.services.zip_compression import CompressionPolicy
+
+client = TestClient(app)
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+def test_streaming_export_matches_file_export(tmp_path):
+    data_dir = tmp_path / 'data'
+    _write(data_dir / 'mandant_1' / 'sinfonie' / 'violine.pdf', b'%PDF-1.4 ' + os.urandom(300_000))
+    _write(data_dir / 'mandant_1' / 'marsch.pdf', b'%PDF-1.4 marsch')
+    service = ExportService(str(data_dir), str(tmp_path / 'exports'), chunk_size=64 * 1024)
+
+    chunks = list(service.iter_export_zip(1, 'standard'))
+    assert len(chunks) > 2
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as zipf:
+        assert zipf.testzip() is None
+        names = zipf.namelist()
+        assert names == ['metadata.json', 'README.txt', 'index.html', 'pdfs/marsch.pdf', 'pdfs/sinfonie/violine.pdf', 'manifest.json']
+        streamed_pdf = zipf.read('pdfs/sinfonie/violine.pdf')
+
+    zip_path = service.create_export_zip(1, 'standard')
+    with zipfile.ZipFile(zip_path) as zipf:
+        assert zipf.namelist() == names
+        assert zipf.read('pdfs/sinfonie/violine.pdf') == streamed_pdf
+    assert [name for name in os.listdir(tmp_path / 'exports') if name.endswith('.zip')] == [os.path.basename(zip_path)]
+
+def test_streaming_export_endpoint(tmp_path, monkeypatch, auth):
+    _write(tmp_path / 'mandant_3' / 'stimme.pdf', b'%PDF-1.4 stimme')
+    monkeypatch.setattr(routes_export, 'export_service', ExportService(str(tmp_path), str(tmp_path / 'exports')))
+
+    response = client.post('/export/', json={'layout': 'compact', 'streaming': True}, headers=auth(3))
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/zip'
+    assert 'export_mandant_3_compact_' in response.headers['content-disposition']
+    with zipfile.ZipFile(io.BytesIO(response.content)) as zipf:
+        assert zipf.read('pdfs/stimme.pdf') == b'%PDF-1.4 stimme'
+        assert zipf.read('README.txt').decode('utf-8').startswith('BestNote Export - Mandant 3')
+    # Nur Manifest und Historie bleiben zurück, kein ZIP
+    assert not [name for name in os.listdir(tmp_path / 'exports') if name.endswith('.zip')]
+
+def test_compression_policy_stores_compressed_types_and_deflates_text(tmp_path):
+    data_dir = tmp_path / 'data'
+    text = ''.join(f'Takt {i}: Viola divisi, Horn in F, crescendo\n' for i in range(40_000)).encode('utf-8')
+    _write(data_dir / 'mandant_1' / 'stimmen.pdf', b'%PDF-1.4 ' + os.urandom(50_000))
+    _write(data_dir / 'mandant_1' / 'partitur.txt', text)
+    policy = CompressionPolicy(level=9)
+
+    service = ExportService(str(data_dir), str(tmp_path / 'exports'), compression=policy)
+    with zipfile.ZipFile(io.BytesIO(b''.join(service.iter_export_zip(1, 'compact')))) as zipf:
+        assert zipf.getinfo('pdfs/stimmen.pdf').compress_type == zipfile.ZIP_STORED
+        assert zipf.getinfo('README.txt').compress_type == zipfile.ZIP_DEFLATED
+
+    # Backup enthält alle Dateien; Text wird mit der Stufe der Richtlinie komprimiert
+    result = BackupService(str(tmp_path / 'backups'), str(data_dir), compression=policy).create_backup(1)
+    assert result['success']
+    with zipfile.ZipFile(result['path']) as zipf:
+        assert zipf.testzip() is None
+        assert zipf.getinfo('files/mandant_1/stimmen.pdf').compress_type == zipfile.ZIP_STORED
+        info = zipf.getinfo('files/mandant_1/partitur.txt')
+        assert info.compress_type == zipfile.ZIP_DEFLATED
+        assert info.compress_size < len(text) / 5
+        assert zipf.read(info) == text
+        assert info.compress_size == len(zlib.compress(text, 9)) - 6
+
+def test_delta_export_contains_only_changes(tmp_path):
+    mandant_dir = tmp_path / 'data' / 'mandant_1'
+    _write(mandant_dir / 'bleibt.pdf', b'%PDF bleibt')
+    _write(mandant_dir / 'beruehrt.pdf', b'%PDF beruehrt')
+    _write(mandant_dir / 'geaendert.pdf', b'%PDF alt')
+    _write(mandant_dir / 'geloescht.pdf', b'%PDF weg')
+    service = ExportService(str(tmp_path / 'data'), str(tmp_path / 'exports'))
+
+    full_path = service.create_export_zip(1, 'compact')
+    with zipfile.ZipFile(full_path) as zipf:
+        manifest = json.loads(zipf.read('manifest.json'))
+    assert sorted(manifest['files']) == ['pdfs/beruehrt.pdf', 'pdfs/bleibt.pdf', 'pdfs/geaendert.pdf', 'pdfs/geloescht.pdf']
+    assert manifest['files']['pdfs/bleibt.pdf']['sha256'] == hashlib.sha256(b'%PDF bleibt').hexdigest()
+
+    os.utime(mandant_dir / 'beruehrt.pdf', ns=(0, 10**18))
+    _write(mandant_dir / 'geaendert.pdf', b'%PDF neu')
+    _write(mandant_dir / 'neu' / 'stimme.pdf', b'%PDF stimme')
+    (mandant_dir / 'geloescht.pdf').unlink()
+    # Direkte Änderungen am Dateisystem übernimmt erst der Abgleich in den Katalog
+    assert service.catalog.reconcile(1) == {'added': 1, 'updated': 2, 'removed': 1, 'unchanged': 1}
+
+    delta_path = service.create_export_zip(1, 'compact', since_export=manifest['export_id'])
+    assert '_compact_delta_' in delta_path
+    with zipfile.ZipFile(delta_path) as zipf:
+        assert sorted(n for n in zipf.namelist() if n.startswith('pdfs/')) == ['pdfs/geaendert.pdf', 'pdfs/neu/stimme.pdf']
+        assert json.loads(zipf.read('deleted.json')) == ['pdfs/geloescht.pdf']
+        delta_manifest = json.loads(zipf.read('manifest.json'))
+    assert delta_manifest['since_export'] == manifest['export_id']
+    assert sorted(delta_manifest['files']) == ['pdfs/beruehrt.pdf', 'pdfs/bleibt.pdf', 'pdfs/geaendert.pdf', 'pdfs/neu/stimme.pdf']
+
+    # Fremde oder unbekannte Exporte sind keine gültige Basis
+    with pytest.raises(FileNotFoundError):
+        service.load_manifest(2, manifest['export_id'])
+    with pytest.raises(FileNotFoundError):
+        service.load_manifest(1, '../manifests/x')
+
+def test_streaming_delta_export_endpoint(tmp_path, monkeypatch, auth):
+    _write(tmp_path / 'mandant_4' / 'a.pdf', b'%PDF a')
+    monkeypatch.setattr(routes_export, 'export_service', ExportService(str(tmp_path), str(tmp_path / 'exports')))
+
+    response = client.post('/export/', json={'layout': 'compact', 'streaming': True}, headers=auth(4))
+    export_id = response.headers['x-export-id']
+    _write(tmp_path / 'mandant_4' / 'b.pdf', b'%PDF b')
+    routes_export.export_service.catalog.record_file(4, 'b.pdf')
+
+    response = client.post('/export/', json={'layout': 'compact', 'streaming': True, 'since_export': export_id}, headers=auth(4))
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.content)) as zipf:
+        assert [n for n in zipf.namelist() if n.startswith('pdfs/')] == ['pdfs/b.pdf']
+
+    response = client.post('/export/', json={'layout': 'compact', 'since_export': export_id}, headers=auth(5))
+    assert response.status_code == 404
+
+def test_job_manager_limits_concurrency_per_mandant():
+    manager = JobManager(max_workers=3, max_per_mandant=1)
+    release = threading.Event()
+    running = []
+
+    def work(job):
+        running.append(job.mandant_id)
+        release.wait(5)
+
+    first = manager.submit(1, 'export', work)
+    second = manager.submit(1, 'export', work)
+    other = manager.submit(2, 'export', work)
+    deadline = time.time() + 5
+    while len(running) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    # Mandant 1 hat schon einen laufenden Export, Mandant 2 wird nicht blockiert
+    assert sorted(running) == [1, 2]
+    assert second.status == 'queued'
+
+    release.set()
+    while second.status != 'completed' and time.time() < deadline:
+        time.sleep(0.01)
+    assert [first.status, second.status, other.status] == ['completed', 'completed', 'completed']
+    assert sorted(running) == [1, 1, 2]
+
+def test_streaming_export_counts_against_mandant_limit(tmp_path, monkeypatch, auth):
+    _write(tmp_path / 'mandant_5' / 'stimme.pdf', b'%PDF stimme')
+    manager = JobManager(max_workers=1, max_per_mandant=1)
+    monkeypatch.setattr(routes_export, 'job_manager', manager)
+    monkeypatch.setattr(routes_export, 'export_service', ExportService(str(tmp_path), str(tmp_path / 'exports')))
+
+    assert manager.acquire(5)
+    response = client.post('/export/', json={'layout': 'compact', 'streaming': True}, headers=auth(5))
+    assert response.status_code == 429
+    manager.release(5)
+
+    response = client.post('/export/', json={'layout': 'compact', 'streaming': True}, headers=auth(5))
+    assert response.status_code == 200
+    # Nach dem Download ist der Platz wieder frei
+    assert manager.acquire(5)
+    manager.release(5)
+
+def test_background_export_job_and_history(tmp_path, monkeypatch, auth):
+    for index in range(3):
+        _write(tmp_path / 'mandant_6' / f'stimme_{index}.pdf', b'%PDF stimme')
+    monkeypatch.setattr(routes_export, 'export_service', ExportService(str(tmp_path), str(tmp_path / 'exports')))
+
+    response = client.post('/export/', json={'layout': 'standard'}, headers=auth(6))
+    assert response.status_code == 202
+    data = response.json()
+    # Der Download-Link kommt erst mit dem Ergebnis des fertigen Auftrags
+    assert data['download_url'] is None
+
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        job = client.get(f"/export/jobs/{data['job_id']}", headers=auth(6)).json()
+        if job['status'] in ('completed', 'failed'):
+            break
+        time.sleep(0.02)
+    assert job['status'] == 'completed'
+    assert (job['completed'], job['total']) == (3, 3)
+    assert job['result']['export_id'] == data['export_id']
+    assert job['result']['download_url'] == f"/export/download/{data['filename']}"
+    assert (tmp_path / 'exports' / data['filename']).stat().st_size == job['result']['size']
+
+    assert client.get(f"/export/jobs/{data['job_id']}", headers=auth(7)).status_code == 404
+    history = client.get('/export/history', headers=auth(6)).json()
+    assert [(entry['export_id'], entry['layout'], entry['status'], entry['size_bytes']) for entry in history] == [
+        (data['export_id'], 'standard', 'completed', job['result']['size'])]
+    assert client.get('/export/history', headers=auth(7)).json() == []
+
+def test_export_cache_reuses_identical_exports_and_evicts_lru(tmp_path):
+    mandant_dir = tmp_path / 'data' / 'mandant_1'
+    _write(mandant_dir / 'a.pdf', b'%PDF ' + os.urandom(20_000))
+    artifacts = ExportArtifactCache(str(tmp_path / 'exports' / 'artifacts.sqlite3'), max_bytes=50_000)
+    service = ExportService(str(tmp_path / 'data'), str(tmp_path / 'exports'), artifacts=artifacts)
+
+    standard = service.create_export_zip(1, 'standard')
+    assert service.create_export_zip(1, 'standard') == standard
+    assert service.find_cached_export(1, 'standard') == standard
+    assert service.find_cached_export(2, 'standard') is None
+    assert service.get_export_history(1)[0]['status'] == 'cached'
+
+    compact = service.create_export_zip(1, 'compact')
+    assert compact != standard
+    # Geänderte Datei: neuer Fingerabdruck, neues Archiv
+    _write(mandant_dir / 'a.pdf', b'%PDF ' + os.urandom(20_000))
+    service.find_cached_export(1, 'compact')
+    digital = service.create_export_zip(1, 'digital')
+
+    # Budget 50 kB reicht für zwei Archive: das am längsten ungenutzte (standard) fällt heraus
+    assert not os.path.exists(standard)
+    assert os.path.exists(compact) and os.path.exists(digital)
+    assert artifacts.stats()['entries'] == 2
+    assert service.find_cached_export(1, 'standard') is None
+
+def test_export_endpoint_returns_cached_archive(tmp_path, monkeypatch, auth):
+    _write(tmp_path / 'mandant_8' / 'a.pdf', b'%PDF a')
+    service = ExportService(str(tmp_path), str(tmp_path / 'exports'))
+    monkeypatch.setattr(routes_export, 'export_service', service)
+    zip_path = service.create_export_zip(8, 'compact')
+
+    response = client.post('/export/', json={'layout': 'compact'}, headers=auth(8))
+    assert response.status_code == 200
+    assert response.json()['filename'] == os.path.basename(zip_path)
+    assert response.json()['status'] == 'completed'
+
+    response = client.post('/export/', json={'layout': 'compact', 'streaming': True}, headers=auth(8))
+    assert response.content == open(zip_path, 'rb').read()
+
+def test_archive_download_supports_ranges_and_conditional_requests(tmp_path, monkeypatch, auth):
+    _write(tmp_path / 'mandant_9' / 'gross.pdf', b'%PDF ' + os.urandom(600_000))
+    service = ExportService(str(tmp_path), str(tmp_path / 'exports'))
+    monkeypatch.setattr(routes_export, 'export_service', service)
+    filename = os.path.basename(service.create_export_zip(9, 'compact'))
+    content = (tmp_path / 'exports' / filename).read_bytes()
+    url = f'/export/download/{filename}'
+
+    response = client.get(url, headers=auth(9))
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers['accept-ranges'] == 'bytes'
+    etag, last_modified = response.headers['etag'], response.headers['last-modified']
+
+    # Abgebrochenen Download fortsetzen
+    response = client.get(url, headers={**auth(9), 'Range': 'bytes=1000-', 'If-Range': etag})
+    assert response.status_code == 206
+    assert response.headers['content-range'] == f'bytes 1000-{len(content) - 1}/{len(content)}'
+    assert response.content == content[1000:]
+    response = client.get(url, headers={**auth(9), 'Range': 'bytes=-10'})
+    assert response.content == content[-10:]
+    response = client.get(url, headers={**auth(9), 'Range': 'bytes=0-1', 'If-Range': '"veraltet"'})
+    assert response.status_code == 200 and response.content == content
+    response = client.get(url, headers={**auth(9), 'Range': f'bytes={len(content)}-'})
+    assert response.status_code == 416
+    assert response.headers['content-range'] == f'bytes */{len(content)}'
+
+    assert client.get(url, headers={**auth(9), 'If-None-Match': etag}).status_code == 304
+    assert client.get(url, headers={**auth(9), 'If-Modified-Since': last_modified}).status_code == 304
+    assert client.get(url, headers={**auth(9), 'If-Match': '"anders"'}).status_code == 412
+    response = client.head(url, headers=auth(9))
+    assert response.status_code == 200 and response.headers['content-length'] == str(len(content))
+
+    # Nur der besitzende Mandant darf laden
+    assert client.get(url, headers=auth(10)).status_code == 404
+    assert client.get('/export/download/..%2Fhistory.sqlite3', headers=auth(9)).status_code == 404
+
+def test_backup_download(tmp_path, monkeypatch, auth):
+    backup = BackupService(str(tmp_path / 'backups'), str(tmp_path / 'data'))
+    monkeypatch.setattr(routes_export, 'backup_service', backup)
+    result = backup.create_backup(11)
+    response = client.get(f"/export/download/{result['filename']}", headers={**auth(11), 'Range': 'bytes=0-3'})
+    assert response.status_code == 206
+    assert response.content == b'PK\x03\x04'
+    assert client.get(f"/export/download/{result['filename']}", headers=auth(12)).status_code == 404
+
+def test_backup_stores_duplicates_once_and_restores_them(tmp_path):
+    _write(tmp_path / 'data' / 'mandant_12' / 'marsch' / 'trompete_1.pdf', b'%PDF gleich')
+    _write(tmp_path / 'data' / 'mandant_12' / 'marsch' / 'trompete_2.pdf', b'%PDF gleich')
+    _write(tmp_path / 'data' / 'mandant_12' / 'polka.pdf', b'%PDF anders')
+    backup = BackupService(str(tmp_path / 'backups'), str(tmp_path / 'data'))
+    backup.catalog.reconcile(12)
+    result = backup.create_backup(12)
+    with zipfile.ZipFile(result['path']) as zipf:
+        stored = [name for name in zipf.namelist() if name.startswith('files/')]
+        duplicates = json.loads(zipf.read('duplicates.json'))
+    assert len(stored) == 2 and list(duplicates) == ['marsch/trompete_2.pdf']
+
+    restored = backup.restore_backup(result['path'], 12, {'database': False, 'files': True})
+    assert restored['restore_results']['files_restored']
+    extract_dir = tmp_path / 'restore'
+    with zipfile.ZipFile(result['path']) as zipf:
+        zipf.extractall(extract_dir)
+    assert backup._restore_files(extract_dir, 12) == {'success': True, 'files_restored': 3}
+    assert (extract_dir / 'files' / 'mandant_12' / 'marsch' / 'trompete_2.pdf').read_bytes() == b'%PDF gleich'
+
+def test_file_catalog_reconcile_and_storage_stats(tmp_path, monkeypatch):
+    _write(tmp_path / 'mandant_13' / 'marsch.pdf', b'%PDF ' + b'x' * 2000)
+    _write(tmp_path / 'mandant_13' / 'marsch.mid', b'MThd')
+    catalog = FileCatalog(str(tmp_path))
+    entry = catalog.record_file(13, 'marsch.pdf', score_id=7, part_id=3)
+    assert entry['sha256'] == hashlib.sha256(b'%PDF ' + b'x' * 2000).hexdigest()
+
+    # Erster Lesezugriff gleicht den Mandanten einmal ab, bestehende Verknüpfungen bleiben
+    assert [f['path'] for f in catalog.list_files(13)] == ['marsch.mid', 'marsch.pdf']
+    assert catalog.get_file(13, 'marsch.pdf')['score_id'] == 7
+    _write(tmp_path / 'mandant_13' / 'marsch.mid', b'MThd neu')
+    (tmp_path / 'mandant_13' / 'marsch.pdf').unlink()
+    _write(tmp_path / 'mandant_13' / 'noten' / 'walzer.xml', b'<score/>')
+    assert catalog.reconcile(13) == {'added': 1, 'updated': 1, 'removed': 1, 'unchanged': 0}
+    assert catalog.reconcile_all()[13]['unchanged'] == 2
+    assert [f['path'] for f in catalog.list_files(13, ['xml'])] == ['noten/walzer.xml']
+
+    monkeypatch.setattr(routes_dashboard, 'file_catalog', catalog)
+    stats = client.get('/dashboard/dashboard/13/storage-stats').json()
+    assert stats['files_by_type'] == {'PDF': 0, 'MIDI': 1, 'XML': 1, 'Other': 0}
+    assert stats['total_used'] == '16 B'
+    assert stats['largest_files'][0] == {'name': 'noten/walzer.xml', 'size': '8 B'}
+
+def _scan_pdf(path, size):
+    import fitz
+    # Rauschen lässt sich nicht komprimieren: die Größe hängt nur an der Auflösung
+    pix = fitz.Pixmap(fitz.csGRAY, size, size, os.urandom(size * size), False)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with fitz.open() as doc:
+        doc.new_page(width=595, height=842).insert_image(fitz.Rect(50, 50, 250, 250), pixmap=pix)
+        doc.save(str(path), deflate=True)
+
+def test_digital_layout_optimizes_pdfs_with_cache(tmp_path):
+    fitz = pytest.importorskip('fitz')
+    data_dir = tmp_path / 'data'
+    _scan_pdf(data_dir / 'mandant_1' / 'violine.pdf', 1200)
+    _write(data_dir / 'mandant_1' / 'kaputt.pdf', b'%PDF kein echtes PDF')
+    service = ExportService(str(data_dir), str(tmp_path / 'exports'))
+    pool = SharedProcessPool(max_workers=1)
+    service.pdf_optimizer.pool = pool
+    try:
+        digital = service.create_export_zip(1, 'digital')
+        with zipfile.ZipFile(digital) as zipf:
+            optimized = zipf.read('pdfs/violine.pdf')
+            assert zipf.read('pdfs/kaputt.pdf') == b'%PDF kein echtes PDF'
+            manifest = json.loads(zipf.read('manifest.json'))
+        original = (data_dir / 'mandant_1' / 'violine.pdf').read_bytes()
+        assert len(optimized) < len(original) / 4
+        with fitz.open(stream=optimized, filetype='pdf') as doc:
+            assert doc.is_fast_webaccess
+            assert doc[0].get_images()[0][2] == 417
+        assert manifest['files']['pdfs/violine.pdf']['source_sha256'] == hashlib.sha256(original).hexdigest()
+
+        # Zweiter Export nutzt die abgelegten Fassungen, ohne erneut zu optimieren
+        cached = sorted(p for p in (tmp_path / 'exports' / 'digital_pdfs').rglob('*') if p.is_file())
+        assert sorted(p.suffix for p in cached) == ['.original', '.pdf']
+        mtimes = [p.stat().st_mtime_ns for p in cached]
+        again = service.create_export_zip(1, 'digital', use_cache=False)
+        with zipfile.ZipFile(again) as zipf:
+            assert zipf.read('pdfs/violine.pdf') == optimized
+        assert [p.stat().st_mtime_ns for p in cached] == mtimes
+
+        # Delta: unveränderte Quellen werden nicht erneut exportiert
+        delta = service.create_export_zip(1, 'digital', since_export=manifest['export_id'])
+        with zipfile.ZipFile(delta) as zipf:
+            assert not [n for n in zipf.namelist() if n.startswith('pdfs/')]
+    finally:
+        pool.shutdown()
+
+def test_shared_process_pool_is_bounded_and_stopped_on_shutdown():
+    from backend import main
+    from backend.services.process_pool import PROCESS_POOL_MAX_WORKERS, process_pool
+    assert ExportService().pdf_optimizer.pool is process_pool
+    assert process_pool.max_workers <= PROCESS_POOL_MAX_WORKERS
+    assert main.stop_process_pool in app.router.on_shutdown
+
+    pool = SharedProcessPool(max_workers=1)
+    executor = pool.executor()
+    assert pool.executor() is executor
+    pool.shutdown()
+    assert pool.executor() is not executor
+    pool.shutdown()
+
+def _part_pdf(path, pages, label):
+    import fitz
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with fitz.open() as doc:
+        for page in range(pages):
+            doc.new_page().insert_text((72, 72), f'{label} Seite {page + 1}')
+        doc.save(str(path))
+
+def test_part_booklets_grouped_by_instrument(tmp_path, monkeypatch, auth):
+    fitz = pytest.importorskip('fitz')
+    mandant_dir = tmp_path / 'mandant_14'
+    _part_pdf(mandant_dir / 'marsch' / 'trompete_1.pdf', 2, 'Marsch Trompete 1')
+    _part_pdf(mandant_dir / 'marsch' / 'trompete_2.pdf', 1, 'Marsch Trompete 2')
+    _part_pdf(mandant_dir / 'marsch' / 'tuba.pdf', 1, 'Marsch Tuba')
+    _part_pdf(mandant_dir / 'walzer' / 'Trompete 1.pdf', 3, 'Walzer Trompete 1')
+    _write(mandant_dir / 'walzer' / 'tuba.pdf', b'%PDF kaputt')
+    service = ExportService(str(tmp_path), str(tmp_path / 'exports'))
+    pool = SharedProcessPool(max_workers=2)
+    service.booklets.pool = pool
+    monkeypatch.setattr(routes_export, 'export_service', service)
+    program = [
+        {'title': 'Walzer', 'directory': 'walzer'},
+        {'title': 'Marsch', 'parts': [{'name': 'Trompete 1', 'file_path': 'marsch/trompete_1.pdf'},
+                                      {'name': 'Trompete 2', 'file_path': 'marsch/trompete_2.pdf'},
+                                      {'name': 'Tuba', 'file_path': 'marsch/tuba.pdf'},
+                                      {'name': 'Horn', 'file_path': 'marsch/horn.pdf'}]},
+    ]
+    try:
+        plan = service.booklets.plan(14, program, 'part')
+        assert sorted(plan['booklets']) == ['Trompete 1', 'Trompete 2', 'Tuba']
+        assert [(piece, part) for piece, part, _ in plan['booklets']['Trompete 1']] == [
+            ('Walzer', 'Trompete 1'), ('Marsch', 'Trompete 1')]
+
+        response = client.post('/export/booklets', json={'program': program, 'group_by': 'instrument'}, headers=auth(14))
+        assert response.status_code == 202
+        data = response.json()
+        deadline = time.time() + 20
+        while time.time() < deadline:
+            job = client.get(f"/export/jobs/{data['job_id']}", headers=auth(14)).json()
+            if job['status'] in ('completed', 'failed'):
+                break
+            time.sleep(0.05)
+        assert job['status'] == 'completed', job['error']
+        assert (job['completed'], job['total']) == (2, 2)
+        assert job['result']['missing'] == [{'piece': 'Marsch', 'part': 'Horn', 'file_path': 'marsch/horn.pdf'}]
+
+        with zipfile.ZipFile(tmp_path / 'exports' / data['filename']) as zipf:
+            assert sorted(zipf.namelist()) == ['programm.json', 'stimmen/Trompete.pdf', 'stimmen/Tuba.pdf']
+            summary = json.loads(zipf.read('programm.json'))
+            trompete = zipf.read('stimmen/Trompete.pdf')
+        with fitz.open(stream=trompete, filetype='pdf') as doc:
+            assert doc.page_count == 6
+            assert doc.get_toc() == [[1, 'Walzer', 1], [2, 'Trompete 1', 1], [1, 'Marsch', 4],
+                                     [2, 'Trompete 1', 4], [2, 'Trompete 2', 6]]
+            assert 'Marsch Trompete 2 Seite 1' in doc[5].get_text()
+        tuba = next(b for b in summary['booklets'] if b['name'] == 'Tuba')
+        assert tuba['pages'] == 1 and tuba['skipped'][0]['piece'] == 'Walzer'
+
+        assert client.post('/export/booklets', json={'program': program, 'group_by': 'register'},
+                           headers=auth(14)).status_code == 400
+    finally:
+        pool.shutdown()
+
+def test_booklet_filenames_are_unique(tmp_path):
+    pytest.importorskip('fitz')
+    _part_pdf(tmp_path / 'mandant_15' / 'a.pdf', 1, 'A')
+    _part_pdf(tmp_path / 'mandant_15' / 'b.pdf', 2, 'B')
+    pool = SharedProcessPool(max_workers=1)
+    service = ExportService(str(tmp_path), str(tmp_path / 'exports'))
+    service.booklets.pool = pool
+    service.catalog.reconcile(15)
+    program = [{'title': 'Marsch', 'parts': [{'name': 'Trompete/1', 'file_path': 'a.pdf'},
+                                             {'name': 'Trompete_1', 'file_path': 'b.pdf'}]}]
+    try:
+        results = service.booklets.build(service.booklets.plan(15, program), str(tmp_path / 'hefte'))
+    finally:
+        pool.shutdown()
+    assert {name: (os.path.basename(result['path']), result['pages']) for name, result in results.items()} == {
+        'Trompete/1': ('Trompete_1.pdf', 1), 'Trompete_1': ('Trompete_1 (2).pdf', 2)}
@@ -0,0 +1,353 @@
+import base64
+import hashlib
+import io
+import os
+import shutil
+import sqlite3
+import time
+import zipfile
+from contextlib import closing
+import pytest
+from fastapi.testclient import TestClient
+from backend.main import app
+from backend.api import routes_import
+from backend.models import Score
+from backend.services.blob_store import BlobStore
+from backend.services.csv_import import CSV_COLUMNS, CsvScoreParser, ScoreRow
+from backend.services.file_catalog import FileCatalog
+from backend.services.import_softnote import ImportFileService
+from backend.services.resumable_upload import ResumableUploadStore
+from backend.services.score_store import ScoreStore
+
+client = TestClient(app)
+
+def _csv(rows):
+    lines = ['Titel,Komponist,Jahr,Metadaten'] + rows
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+def test_streaming_csv_import_writes_batches_and_reports_errors(tmp_path):
+    service = ImportFileService()
+    service.scores = ScoreStore(str(tmp_path / 'scores.sqlite3'))
+    rows = [f'Werk {i},Komponist {i},1900,' for i in range(2500)]
+    rows[10] = ',Ohne Titel,1900,'
+    rows[2000] = 'Werk,Komponist,1900,zu,viele'
+    data = b'\xef\xbb\xbf' + _csv(rows)
+
+    summary = service.import_csv_stream(io.BytesIO(data), 1, batch_size=1000)
+    assert (summary['rows'], summary['imported'], summary['skipped'], summary['batches']) == (2500, 2498, 2, 3)
+    # Zeilennummern zählen die Kopfzeile mit
+    assert summary['errors'] == [{'line': 12, 'error': 'Titel fehlt'}, {'line': 2002, 'error': 'Zu viele Spalten'}]
+    assert service.scores.count(1) == 2498 and service.scores.count(2) == 0
+    assert service.scores.list(1, limit=1)[0] == {'id': 1, 'title': 'Werk 0', 'composer': 'Komponist 0',
+                                                  'year': '1900', 'metadata': ''}
+
+def test_single_pass_parser_reports_row_errors_per_batch():
+    content = ('\ufeffKomponist,Titel\n'
+               'Mozart,Zauberflöte\n'
+               'Bach,"Kantate\nBWV 140"\n'
+               ',Ohne Komponist\n'
+               '\n'
+               'Verdi\n'
+               'Brahms,  Ungarischer Tanz  ,zu viel\n')
+    parser = CsvScoreParser(io.StringIO(content, newline=''), batch_size=2)
+    assert parser.valid
+    batches = list(parser.batches())
+    assert [count for _, _, count in batches] == [2, 2, 1]
+    scores, errors, total = CsvScoreParser(io.StringIO(content, newline='')).parse()
+    assert total == 5
+    assert scores == [{'title': 'Zauberflöte', 'composer': 'Mozart', 'year': '', 'metadata': ''},
+                      {'title': 'Kantate\nBWV 140', 'composer': 'Bach', 'year': '', 'metadata': ''}]
+    # Zeilennummern der Datei, auch nach einem mehrzeiligen Feld und einer Leerzeile
+    assert errors == [{'line': 5, 'error': 'Komponist fehlt'}, {'line': 7, 'error': 'Titel fehlt'},
+                      {'line': 8, 'error': 'Zu viele Spalten'}]
+
+    preview = ImportFileService().preview_csv(content)
+    assert len(preview['works']) == 2 and preview['warnings'][0] == 'Zeile 5: Komponist fehlt'
+    assert not CsvScoreParser(io.StringIO('Name,Autor\n')).valid
+    # Geprüft wird gegen die Felder von models.Score (ohne die vom Speicher vergebene id)
+    assert set(ScoreRow.__annotations__) == set(Score.model_fields) - {'id'} == set(CSV_COLUMNS.values())
+
+def test_import_endpoint_returns_summary(tmp_path, monkeypatch, auth):
+    monkeypatch.setattr(routes_import.import_service, 'scores', ScoreStore(str(tmp_path / 'scores.sqlite3')))
+    copies = []
+    copyfileobj = shutil.copyfileobj
+    monkeypatch.setattr(shutil, 'copyfileobj', lambda *args: copies.append(args) or copyfileobj(*args))
+    files = {'file': ('softnote.csv', _csv(['Zauberflöte,Mozart,1791,Oper', 'Ohne Komponist,,,']), 'text/csv')}
+    response = client.post('/import/', files=files, headers=auth(3))
+    assert response.status_code == 200
+    data = response.json()
+    assert (data['success'], data['imported_scores'], data['skipped']) == (True, 1, 1)
+    assert data['errors'] == [{'line': 3, 'error': 'Komponist fehlt'}]
+    assert 'works' not in data
+
+    files = {'file': ('falsch.csv', b'Name;Autor\nx;y\n', 'text/csv')}
+    assert client.post('/import/', files=files, headers=auth(3)).status_code == 400
+
+    # Ab 1 MB puffert Starlette den Upload auf Platte (SpooledTemporaryFile nach dem Überlauf)
+    rows = [f'Walzer {i},Strauss,1867,Tanz' for i in range(40_000)]
+    files = {'file': ('gross.csv', _csv(rows), 'text/csv')}
+    assert len(files['file'][1]) > 1024 * 1024
+    response = client.post('/import/', files=files, headers=auth(3))
+    assert response.status_code == 200
+    assert (response.json()['imported_scores'], response.json()['skipped']) == (40_000, 0)
+    # Jeder Upload wird blockweise in eine temporäre Datei im Upload-Verzeichnis kopiert und danach gelöscht
+    assert [os.path.dirname(target.name) for _, target, _ in copies] == [routes_import.upload_store.upload_dir] * 3
+    assert not any(os.path.exists(target.name) for _, target, _ in copies)
+
+def _zip(members, compression=zipfile.ZIP_DEFLATED):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression) as zipf:
+        for name, data in members.items():
+            zipf.writestr(name, data)
+    return buffer.getvalue()
+
+def test_zip_import_extracts_in_parallel_and_enforces_limits(tmp_path, monkeypatch, auth):
+    service = routes_import.import_service
+    monkeypatch.setattr(service, 'catalog', FileCatalog(str(tmp_path)))
+    members = {f'marsch/stimme_{i}.pdf': b'%PDF ' + bytes([i]) * 5000 for i in range(6)}
+    members.update({'marsch/partitur.xml': b'<score/>', 'marsch/demo.mid': b'MThd', 'liesmich.txt': b'ignoriert'})
+    files = {'file': ('softnote.zip', _zip(members), 'application/zip')}
+    response = client.post('/import/', files=files, headers=auth(15))
+    assert response.status_code == 200
+    data = response.json()
+    assert data['imported_files'] == 8 and 'liesmich.txt' not in data['files']
+    assert (tmp_path / 'mandant_15' / 'marsch' / 'stimme_3.pdf').read_bytes() == members['marsch/stimme_3.pdf']
+    assert not list((tmp_path / 'mandant_15').rglob('*.part'))
+    assert len(service.catalog.list_files(15, ['pdf'])) == 6
+
+    # Zip-Bombe: hohe Kompressionsrate, abgelehnt bevor etwas entpackt wird
+    bomb = {'bombe.pdf': b'\0' * (4 * 1024 * 1024)}
+    response = client.post('/import/', files={'file': ('bombe.zip', _zip(bomb), 'application/zip')}, headers=auth(16))
+    assert response.status_code == 400
+    assert 'Kompressionsrate' in response.json()['detail']
+    assert not (tmp_path / 'mandant_16' / 'bombe.pdf').exists()
+    preview = client.post('/import/preview', files={'file': ('bombe.zip', _zip(bomb), 'application/zip')}, headers=auth(16))
+    assert any('Kompressionsrate' in warning for warning in preview.json()['warnings'])
+
+    monkeypatch.setattr(service, 'zip_max_members', 5)
+    response = client.post('/import/', files=files, headers=auth(16))
+    assert response.status_code == 400 and 'zu viele Einträge' in response.json()['detail']
+    monkeypatch.setattr(service, 'zip_max_members', 100)
+    monkeypatch.setattr(service, 'zip_max_total_size', 1000)
+    response = client.post('/import/', files=files, headers=auth(16))
+    assert response.status_code == 400 and 'zu groß' in response.json()['detail']
+    monkeypatch.setattr(service, 'zip_max_total_size', 10 ** 9)
+    traversal = {'../../flucht.pdf': b'%PDF'}
+    response = client.post('/import/', files={'file': ('x.zip', _zip(traversal), 'application/zip')}, headers=auth(16))
+    assert response.status_code == 400 and 'Unzulässiger Pfad' in response.json()['detail']
+    assert not (tmp_path / 'mandant_16').exists() or not list((tmp_path / 'mandant_16').rglob('*'))
+    response = client.post('/import/', files={'file': ('x.zip', b'kein zip', 'application/zip')}, headers=auth(16))
+    assert response.status_code == 400
+
+
+def test_zip_import_stores_each_content_once(tmp_path):
+    service = ImportFileService()
+    service.catalog = FileCatalog(str(tmp_path))
+    marsch = b'%PDF marsch ' + b'x' * 4000
+    polka = b'%PDF polka ' + b'y' * 4000
+    first = tmp_path / 'erste.zip'
+    first.write_bytes(_zip({'marsch/trompete_1.pdf': marsch, 'marsch/trompete_2.pdf': marsch, 'polka/tuba.pdf': polka}))
+    service.import_zip_file(str(first), 21)
+    service.import_zip_file(str(first), 22)
+    blobs = service._storage(str(tmp_path))[1]
+    assert blobs.stats() == {'blobs': 2, 'size': len(marsch) + len(polka), 'references': 6}
+    trompete = tmp_path / 'mandant_21' / 'marsch' / 'trompete_1.pdf'
+    assert trompete.read_bytes() == marsch
+    assert trompete.stat().st_ino == (tmp_path / 'mandant_22' / 'marsch' / 'trompete_2.pdf').stat().st_ino
+    sha = service.catalog.get_file(21, 'marsch/trompete_1.pdf')['sha256']
+    assert os.path.samefile(trompete, blobs.path(sha))
+
+    # Erneuter Import: unveränderte Dateien bleiben, geänderte Inhalte geben den alten frei
+    neu = b'%PDF polka neu ' + b'z' * 4000
+    second = tmp_path / 'zweite.zip'
+    second.write_bytes(_zip({'marsch/trompete_1.pdf': marsch, 'polka/tuba.pdf': neu}))
+    inode = trompete.stat().st_ino
+    service.import_zip_file(str(second), 21)
+    assert trompete.stat().st_ino == inode
+    assert blobs.stats() == {'blobs': 3, 'size': len(marsch) + len(polka) + len(neu), 'references': 6}
+
+    # Löschen zählt herunter, der Inhalt verschwindet erst mit der letzten Datei
+    polka_sha = service.catalog.get_file(22, 'polka/tuba.pdf')['sha256']
+    assert service.delete_file(22, 'polka/tuba.pdf')
+    assert not os.path.exists(blobs.path(polka_sha)) and blobs.refcount(polka_sha) == 0
+    for mandant_id, path in [(21, 'marsch/trompete_1.pdf'), (21, 'marsch/trompete_2.pdf'), (22, 'marsch/trompete_1.pdf')]:
+        service.delete_file(mandant_id, path)
+    assert blobs.refcount(sha) == 1 and os.path.exists(blobs.path(sha))
+    assert service.catalog.get_file(21, 'marsch/trompete_1.pdf') is None
+    assert not service.delete_file(21, 'marsch/trompete_1.pdf')
+
+    # Außerhalb des Speichers gelöschte Dateien holt die Speicherbereinigung nach
+    os.remove(tmp_path / 'mandant_22' / 'marsch' / 'trompete_2.pdf')
+    assert blobs.collect_garbage()['removed'] == 1
+    assert not os.path.exists(blobs.path(sha))
+
+def test_blob_store_counts_the_reference_when_storing(tmp_path):
+    blobs = BlobStore(str(tmp_path / 'blobs'))
+    target = tmp_path / 'mandant_1' / 'stimme.pdf'
+    sha, _, created = blobs.store(io.BytesIO(b'%PDF stimme'), str(target))
+    # Ablegen und Verlinken in einem Schritt: nie mit Zählerstand 0 sichtbar
+    assert created and blobs.refcount(sha) == 1 and os.path.samefile(target, blobs.path(sha))
+    assert blobs.collect_garbage()['removed'] == 0
+    # Ein schon bestehender Link zählt nicht doppelt
+    assert not blobs.link(sha, str(target))
+    assert blobs.store(io.BytesIO(b'%PDF stimme'), str(target)) == (sha, 11, False)
+    assert blobs.refcount(sha) == 1
+    # Zähleränderungen sperren die Datenbank auch für andere Prozesse (eigene Verbindung ohne Wartezeit)
+    with blobs._transaction():
+        with closing(sqlite3.connect(blobs.db_path, timeout=0)) as other:
+            with pytest.raises(sqlite3.OperationalError):
+                other.execute('BEGIN IMMEDIATE')
+
+
+def test_resumable_upload_chunks_checksums_and_import(tmp_path, monkeypatch, auth):
+    service = routes_import.import_service
+    monkeypatch.setattr(service, 'catalog', FileCatalog(str(tmp_path / 'daten')))
+    store = ResumableUploadStore(str(tmp_path / 'uploads'))
+    monkeypatch.setattr(routes_import, 'upload_store', store)
+    archive = _zip({f'walzer/stimme_{i}.pdf': b'%PDF ' + bytes([i]) * 3000 for i in range(4)}, zipfile.ZIP_STORED)
+    headers = auth(17)
+
+    response = client.post('/import/uploads', json={'filename': 'gross.zip', 'length': len(archive)}, headers=headers)
+    assert response.status_code == 201
+    upload_id = response.json()['id']
+    assert response.headers['Location'] == f'/import/uploads/{upload_id}'
+
+    def patch(offset, data, checksum=None):
+        chunk_headers = {**headers, 'Upload-Offset': str(offset), 'Content-Type': 'application/offset+octet-stream'}
+        if checksum:
+            chunk_headers['Upload-Checksum'] = checksum
+        return client.patch(f'/import/uploads/{upload_id}', content=data, headers=chunk_headers)
+
+    first = archive[:4000]
+    sha = base64.b64encode(hashlib.sha256(first).digest()).decode()
+    assert patch(0, first, f'sha256 {sha}').headers['Upload-Offset'] == '4000'
+    # Wiederholtes Teilstück nach Verbindungsabbruch, falsche Prüfsumme, noch nicht fertig
+    assert patch(0, first).status_code == 409
+    assert patch(4000, archive[4000:8000], f'sha256 {sha}').status_code == 460
+    assert client.head(f'/import/uploads/{upload_id}', headers=headers).headers['Upload-Offset'] == '4000'
+    assert client.post(f'/import/uploads/{upload_id}/import', headers=headers).status_code == 409
+    assert client.post(f'/import/uploads/{upload_id}/complete', json={}, headers=headers).status_code == 409
+    assert client.head(f'/import/uploads/{upload_id}', headers=auth(18)).status_code == 404
+
+    assert patch(4000, archive[4000:] + b'zu viel').status_code == 413
+    assert patch(4000, archive[4000:]).status_code == 204
+    response = client.post(f'/import/uploads/{upload_id}/complete',
+                           json={'sha256': hashlib.sha256(archive).hexdigest()}, headers=headers)
+    assert response.status_code == 200 and response.json()['completed']
+    # Läuft schon ein Import, wird weder doppelt importiert noch gelöscht
+    store.begin_import(17, upload_id)
+    assert client.post(f'/import/uploads/{upload_id}/import', headers=headers).status_code == 409
+    assert client.delete(f'/import/uploads/{upload_id}', headers=headers).status_code == 409
+    store.end_import(17, upload_id, success=False)
+    response = client.post(f'/import/uploads/{upload_id}/import', headers=headers)
+    assert response.status_code == 200 and response.json()['imported_files'] == 4
+    assert (tmp_path / 'daten' / 'mandant_17' / 'walzer' / 'stimme_2.pdf').exists()
+    assert store.get(17, upload_id) is None and not os.path.exists(store.path(upload_id))
+
+    # Liegen gebliebene Uploads werden nach max_age gelöscht
+    stale = store.create(17, 'abgebrochen.csv', 100)
+    store.append(17, stale['id'], 0, b'Titel,Komponist\n')
+    assert store.collect_garbage(now=time.time() + store.max_age + 1) == [stale['id']]
+    assert not os.path.exists(store.path(stale['id']))
+
+
+def test_resumable_upload_streams_chunks_and_locks_imports(tmp_path):
+    store = ResumableUploadStore(str(tmp_path))
+    upload = store.create(1, 'werke.csv', 12)
+
+    def broken():
+        yield b'Titel,'
+        raise ConnectionError('Client getrennt')
+
+    # Abgebrochene oder falsch geprüfte Teilstücke hinterlassen nichts
+    with pytest.raises(ConnectionError):
+        store.append(1, upload['id'], 0, broken())
+    assert store.append(1, upload['id'], 0, iter([b'Titel,', b'Kompo']), ('sha256', b'falsch')) is None
+    assert store.get(1, upload['id'])['offset'] == 0 and os.path.getsize(store.path(upload['id'])) == 0
+
+    checksum = ('sha256', hashlib.sha256(b'Titel,Kompon').digest())
+    assert store.append(1, upload['id'], 0, iter([b'Titel,', b'Kompon']), checksum)['offset'] == 12
+    store.complete(1, upload['id'])
+    store.begin_import(1, upload['id'])
+    with pytest.raises(ValueError):
+        store.begin_import(1, upload['id'])
+    # Die Speicherbereinigung lässt laufende Importe in Ruhe, nur abgebrochene räumt sie später weg
+    assert store.collect_garbage(now=time.time() + store.max_age + 1) == []
+    assert store.collect_garbage(now=time.time() + 2 * store.max_age + 1) == [upload['id']]
+
+
+def test_upload_collector_runs_without_new_uploads(tmp_path):
+    from backend import main
+    assert main.start_upload_collector in app.router.on_startup
+    assert main.stop_upload_collector in app.router.on_shutdown
+
+    store = ResumableUploadStore(str(tmp_path / 'uploads'), max_age=0)
+    stale = store.create(1, 'alt.zip', 10)
+    # create() hat gerade aufgeräumt; der Hintergrund-Thread übernimmt die folgenden Durchläufe
+    store._last_gc = 0.0
+    store.start_collector(interval=0.05)
+    try:
+        for _ in range(100):
+            if not os.path.exists(store.path(stale['id'])):
+                break
+            time.sleep(0.05)
+    finally:
+        store.stop_collector()
+    assert not os.path.exists(store.path(stale['id']))
+
+def test_preview_reads_central_directory_and_samples_csv(auth):
+    members = {'marsch/partitur.pdf': b'%PDF ' * 2000, 'marsch/trompete_1.pdf': b'%PDF t1', 'marsch/demo.mid': b'MThd',
+               'polka/Tuba.pdf': b'%PDF tuba', 'liesmich.txt': b'hallo'}
+    response = client.post('/import/preview', files={'file': ('noten.zip', _zip(members), 'application/zip')},
+                           headers=auth(19))
+    assert response.status_code == 200
+    data = response.json()
+    assert data['type'] == 'zip' and data['valid'] and data['total_files'] == 5 and data['importable_files'] == 4
+    assert data['file_types'] == {'pdf': 3, 'midi': 1, 'text': 1}
+    partitur = next(entry for entry in data['entries'] if entry['name'] == 'marsch/partitur.pdf')
+    assert partitur['size'] == 10000 and partitur['ratio'] > 10
+    assert [(work['title'], work['files'], work['parts'], work['has_score']) for work in data['works']] == \
+        [('marsch', 3, 1, True), ('polka', 1, 1, False)]
+    assert {part['file_path']: (part['name'], part['role']) for part in data['parts']}['marsch/trompete_1.pdf'] == \
+        ('trompete 1', 'part')
+
+    content = _csv([f'Werk {i},{"Bach" if i != 3 else ""},1720,' for i in range(100)])
+    preview = ImportFileService().preview_csv(content.decode('utf-8'), sample_rows=10)
+    assert len(preview['works']) == 9 and preview['warnings'] == ['Zeile 5: Komponist fehlt']
+    assert preview['sampled_rows'] == 10 and preview['total_rows'] == 100 and preview['total_rows_exact']
+    response = client.post('/import/preview', files={'file': ('werke.csv', content, 'text/csv')},
+                           headers=auth(19))
+    assert response.json()['total_rows'] == 100 and len(response.json()['works']) == 19
+
+    # Auf Platte ausgelagerter Upload (ab 1 MB)
+    content = _csv([f'Walzer {i},Strauss,1867,Tanz' for i in range(40_000)])
+    response = client.post('/import/preview', files={'file': ('gross.csv', content, 'text/csv')}, headers=auth(19))
+    assert response.status_code == 200
+    assert response.json()['total_rows'] == 40_000 and response.json()['total_rows_exact']
+
+
+
+def test_zip_import_indexes_in_background_and_fills_analysis_cache(tmp_path, monkeypatch, pdf_bytes):
+    from backend.services.ai_classification import AIClassificationService
+    from backend.services.analysis_cache import AnalysisCache
+    from backend.services.search_index import SearchIndexService
+    service = ImportFileService()
+    service.catalog = FileCatalog(str(tmp_path))
+    extractor = AIClassificationService(cache_path=str(tmp_path / 'analyse.sqlite3'))
+    service.search_index = SearchIndexService(str(tmp_path), extractor)
+    archive = tmp_path / 'noten.zip'
+    archive.write_bytes(_zip({'messe/sopran.pdf': pdf_bytes('Messe in C, Sopran. Kyrie eleison. ' * 5)}))
+
+    result = service.import_zip_file(str(archive), 23)
+    job = service.index_jobs.get(result['index_job_id'], 23)
+    deadline = time.monotonic() + 30
+    while job.status not in ('completed', 'failed') and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert job.status == 'completed' and job.result == {'indexed': 1, 'unchanged': 0, 'errors': 0}
+    assert service.search_index.search(23, 'kyrie')['total'] == 1
+
+    # Die Klassifikation derselben Datei liest den Text nicht erneut
+    pdf_path = str(tmp_path / 'mandant_23' / 'messe' / 'sopran.pdf')
+    assert extractor.cache.get(AnalysisCache.hash_file(pdf_path), extractor.rules_version) is not None
+    monkeypatch.setattr(AIClassificationService, '_iter_page_texts', lambda *args, **kwargs: iter(()))
+    assert extractor.analyze_pdf(pdf_path)['genre'] == 'kirchenmusik'
@@ -0,0 +1,52 @@
+import fitz
+from fastapi.testclient import TestClient
+from backend.main import app
+from backend.api import routes_search
+from backend.services.search_index import SearchIndexService
+
+client = TestClient(app)
+
+def _write_pdf(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with fitz.open() as doc:
+        page = doc.new_page()
+        page.insert_textbox(page.rect, text)
+        doc.save(str(path))
+
+def test_search_ranks_and_paginates(tmp_path, monkeypatch, auth):
+    service = SearchIndexService(str(tmp_path))
+    mandant_dir = tmp_path / 'mandant_1'
+    _write_pdf(mandant_dir / 'ave.pdf', 'Ave verum corpus, natum de Maria virgine. Chorsatz fuer vier Stimmen. ' * 3)
+    _write_pdf(mandant_dir / 'marsch/radetzky.pdf', 'Radetzky-Marsch, Trio. Verlag Musikhaus Wien, Ausgabe fuer Blasorchester. ' * 3)
+    _write_pdf(tmp_path / 'mandant_2' / 'fremd.pdf', 'Ave Maria fuer Orgel. ' * 10)
+
+    assert service.reindex_mandant(1) == {'indexed': 2, 'unchanged': 0, 'removed': 0, 'errors': 0}
+    assert service.reindex_mandant(1)['unchanged'] == 2
+    service.reindex_mandant(2)
+
+    monkeypatch.setattr(routes_search, 'search_service', service)
+    response = client.get('/search/', params={'q': 'verlag wien'}, headers=auth(1))
+    assert response.status_code == 200
+    data = response.json()
+    assert data['total'] == 1
+    assert data['results'][0]['file_id'] == 'marsch/radetzky.pdf'
+    assert '<mark>' in data['results'][0]['snippet']
+
+    # Präfixsuche, mandantengetrennt
+    data = client.get('/search/', params={'q': 'mari'}, headers=auth(1)).json()
+    assert [hit['file_id'] for hit in data['results']] == ['ave.pdf']
+
+    data = client.get('/search/', params={'q': 'fuer', 'page': 2, 'page_size': 1}, headers=auth(1)).json()
+    assert data['total'] == 2
+    assert len(data['results']) == 1
+
+def test_search_removes_deleted_files(tmp_path):
+    service = SearchIndexService(str(tmp_path))
+    pdf = tmp_path / 'mandant_1' / 'alt.pdf'
+    _write_pdf(pdf, 'Nocturne op. 9 Nr. 2 fuer Klavier. ' * 5)
+    service.reindex_mandant(1)
+    assert service.search(1, 'nocturne')['total'] == 1
+    pdf.unlink()
+    service.catalog.reconcile(1)
+    assert service.reindex_mandant(1)['removed'] == 1
+    assert service.search(1, 'nocturne')['total'] == 0